@@ -0,0 +1,134 @@
+# amfi_nav.py — ingest funds' published NAVs from AMFI into `mf_returns`
+#
+# Reads AMFI's semicolon-separated NAV text format: the daily NAVAll.txt or a
+# NAV history report, from a path or URL. Each fund is mapped to its AMFI
+# scheme code (AMFI_SCHEMES="Motilal Midcap=127042;Other Fund=..."). Each NAV
+# is stored with the day's return against the previous trading day's NAV, so
+# the estimate in portfolio_snapshots can be compared to what the fund actually
+# did. Kept free of pandas so the daily job stays light.
+#
+#   python amfi_nav.py [SOURCE] [--schemes "Fund=code;..."]
+
+import argparse
+import os
+from datetime import datetime
+from typing import NamedTuple
+
+import metrics
+from bhavcopy import open_lines
+from nse_calendar import previous_trading_day
+from snapshot_writer import with_retries
+
+# ---------- Config ----------
+AMFI_NAV_SOURCE = os.getenv("AMFI_NAV_SOURCE", "https://www.amfiindia.com/spages/NAVAll.txt")
+
+
+def parse_schemes(spec: str) -> dict:
+    """{fund: scheme code} from "Fund A=127042;Fund B=118989"."""
+    out = {}
+    for part in (spec or "").split(";"):
+        fund, sep, code = part.rpartition("=")
+        if sep and fund.strip() and code.strip():
+            out[fund.strip()] = code.strip()
+    return out
+
+
+SCHEMES = parse_schemes(os.getenv("AMFI_SCHEMES", ""))
+
+
+class NavPoint(NamedTuple):
+    scheme_code: str
+    date: object   # datetime.date
+    nav: float
+
+
+def read_amfi_nav(source: str, codes=None) -> list:
+    """NavPoints for the scheme codes in `codes` (all when None), sorted by date.
+
+    Section titles, AMC names and blank lines between the data rows are skipped,
+    as are NAVs AMFI publishes as "N.A.".
+    """
+    codes = set(codes) if codes is not None else None
+    col, out = None, []
+    for line in open_lines(source):
+        parts = [p.strip() for p in line.split(";")]
+        if len(parts) < 4:
+            continue
+        if col is None:
+            if parts[0].lower() == "scheme code":
+                header = [p.lower() for p in parts]
+                col = {k: header.index(name) for k, name in
+                       (("code", "scheme code"), ("nav", "net asset value"), ("date", "date"))}
+            continue
+        if not parts[col["code"]].isdigit() or (codes is not None and parts[col["code"]] not in codes):
+            continue
+        try:
+            nav = float(parts[col["nav"]])
+            day = datetime.strptime(parts[col["date"]], "%d-%b-%Y").date()
+        except (ValueError, IndexError):
+            continue
+        out.append(NavPoint(parts[col["code"]], day, nav))
+    if col is None:
+        raise ValueError("Not an AMFI NAV file (no 'Scheme Code;...' header)")
+    return sorted(out, key=lambda p: p.date)
+
+
+def _previous_nav(client, fund: str, before) -> tuple:
+    """(date, nav) of the fund's last stored NAV before `before`, or (None, None)."""
+    with metrics.timed("db"):
+        res = (client.table("mf_returns").select("date,nav").eq("fund", fund)
+               .lt("date", before.isoformat()).order("date", desc=True).limit(1).execute())
+    row = next((r for r in res.data or [] if r.get("nav") is not None), None)
+    return (datetime.fromisoformat(row["date"][:10]).date(), float(row["nav"])) if row else (None, None)
+
+
+def nav_rows(fund: str, points, prev_date=None, prev_nav=None) -> list:
+    """mf_returns rows for one fund's NAVs (sorted by date).
+
+    mf_return (%) is set only when the previous NAV is from the previous
+    trading day, so a gap never shows up as one outsized daily move.
+    """
+    rows = []
+    for p in points:
+        ret = None
+        if prev_nav and prev_date == previous_trading_day(p.date):
+            ret = round((p.nav / prev_nav - 1) * 100, 4)
+        rows.append({"date": p.date.isoformat(), "fund": fund, "scheme_code": p.scheme_code,
+                     "nav": p.nav, "mf_return": ret})
+        prev_date, prev_nav = p.date, p.nav
+    return rows
+
+
+@metrics.timed("db_write")
+def ingest_nav(client, source: str = AMFI_NAV_SOURCE, schemes: dict = None) -> int:
+    """Upsert the NAVs in `source` for every mapped fund in one batched write; returns rows written."""
+    schemes = schemes if schemes is not None else SCHEMES
+    if not schemes:
+        return 0
+    points = read_amfi_nav(source, set(schemes.values()))
+    rows = []
+    for fund, code in schemes.items():
+        mine = [p for p in points if p.scheme_code == code]
+        if mine:
+            rows += nav_rows(fund, mine, *_previous_nav(client, fund, mine[0].date))
+    if rows:
+        with_retries(lambda: client.table("mf_returns").upsert(rows, on_conflict="date,fund").execute())
+    return len(rows)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Load fund NAVs from an AMFI NAV file into mf_returns.")
+    ap.add_argument("source", nargs="?", default=AMFI_NAV_SOURCE, help="NAVAll.txt or NAV history report (path or URL)")
+    ap.add_argument("--schemes", default=os.getenv("AMFI_SCHEMES", ""), help='"Fund name=scheme code;..."')
+    args = ap.parse_args(argv)
+    schemes = parse_schemes(args.schemes)
+    if not schemes:
+        raise SystemExit("❌ No funds mapped to AMFI scheme codes (--schemes or AMFI_SCHEMES)")
+
+    from daily_fetch import get_client
+    n = ingest_nav(get_client(), args.source, schemes)
+    print(f"✅ {n} NAV rows saved for {len(schemes)} funds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# analytics.py — incremental rolling analytics over portfolio_snapshots and history
+#
+# Per fund it tracks compounded cumulative return, drawdown, rolling 5/20/60/250
+# day returns and annualised volatility, and each stock's rolling contribution.
+# Everything is running state (window sums over a ring buffer of the last 250
+# days), so folding in one more trading day costs O(windows), not O(history).
+#
+# The state is persisted next to the history cache, so opening the dashboard
+# doesn't recompute anything. The newest day is kept aside as raw input because
+# it may still be re-saved; it is re-folded only when it changes. If an earlier
+# day changes (e.g. after a backfill), that fund is rebuilt from scratch.
+
+import json
+import math
+import os
+import threading
+from collections import deque
+from pathlib import Path
+from typing import NamedTuple
+
+import pandas as pd
+
+import metrics
+from history_store import CACHE_DIR
+
+WINDOWS = (5, 20, 60, 250)
+TRADING_DAYS = 252          # for annualising volatility
+_KEEP = max(WINDOWS) + 1    # the buffer also holds the value leaving the longest window
+
+_lock = threading.Lock()
+
+
+class Analytics(NamedTuple):
+    series: pd.DataFrame          # date, fund, return, cumulative, drawdown, ret_<W>, vol_<W>
+    contributions: pd.DataFrame   # fund, symbol, contrib_<W>: summed daily contribution (pp)
+
+
+class FundState:
+    """Running aggregates of one fund's daily returns."""
+
+    def __init__(self, d: dict = None):
+        d = d or {}
+        self.n = d.get("n", 0)                    # days folded in
+        self.checksum = d.get("checksum", 0.0)    # sum of their returns, to spot rewritten history
+        self.as_of = d.get("as_of")               # last day folded in (ISO)
+        self.growth = d.get("growth", 1.0)        # value of 1 invested on the first day
+        self.peak = d.get("peak", 1.0)
+        self.max_drawdown = d.get("max_drawdown", 0.0)
+        self.returns = deque(d.get("returns", []), maxlen=_KEEP)
+        # window -> [sum log(1 + r), sum r, sum r²]
+        self.sums = {w: d.get("sums", {}).get(str(w), [0.0, 0.0, 0.0]) for w in WINDOWS}
+        self.contrib = {s: deque(v, maxlen=_KEEP) for s, v in d.get("contrib", {}).items()}
+        self.contrib_sums = {s: {w: v[str(w)] for w in WINDOWS} for s, v in d.get("contrib_sums", {}).items()}
+
+    def to_dict(self) -> dict:
+        return {
+            "n": self.n, "checksum": self.checksum, "as_of": self.as_of,
+            "growth": self.growth, "peak": self.peak, "max_drawdown": self.max_drawdown,
+            "returns": list(self.returns),
+            "sums": {str(w): s for w, s in self.sums.items()},
+            "contrib": {s: list(v) for s, v in self.contrib.items()},
+            "contrib_sums": {s: {str(w): x for w, x in v.items()} for s, v in self.contrib_sums.items()},
+        }
+
+    def copy(self) -> "FundState":
+        return FundState(json.loads(json.dumps(self.to_dict())))
+
+    def push(self, day: str, ret: float, contributions: dict) -> dict:
+        """Fold in one day (return in %, {symbol: contribution pp}); returns its series row."""
+        self.n += 1
+        self.checksum += ret
+        self.as_of = day
+        self.growth *= 1 + ret / 100
+        self.peak = max(self.peak, self.growth)
+        drawdown = (self.growth / self.peak - 1) * 100
+        self.max_drawdown = min(self.max_drawdown, drawdown)
+
+        self.returns.append(ret)
+        row = {"date": day, "return": ret, "cumulative": (self.growth - 1) * 100, "drawdown": drawdown}
+        for w, s in self.sums.items():
+            s[0] += math.log1p(ret / 100)
+            s[1] += ret
+            s[2] += ret * ret
+            if len(self.returns) > w:
+                old = self.returns[-w - 1]
+                s[0] -= math.log1p(old / 100)
+                s[1] -= old
+                s[2] -= old * old
+            full = len(self.returns) >= w
+            row[f"ret_{w}"] = math.expm1(s[0]) * 100 if full else math.nan
+            var = (s[2] - s[1] * s[1] / w) / (w - 1) if full else math.nan
+            row[f"vol_{w}"] = math.sqrt(max(var, 0.0) * TRADING_DAYS) if full else math.nan
+
+        for sym in set(self.contrib) | set(contributions):
+            c = contributions.get(sym, 0.0)
+            buf = self.contrib.setdefault(sym, deque(maxlen=_KEEP))
+            sums = self.contrib_sums.setdefault(sym, {w: 0.0 for w in WINDOWS})
+            buf.append(c)
+            for w in WINDOWS:
+                sums[w] += c
+                if len(buf) > w:
+                    sums[w] -= buf[-w - 1]
+            if sym not in contributions and len(buf) == _KEEP and not any(buf):
+                del self.contrib[sym], self.contrib_sums[sym]   # not held for a whole window
+        return row
+
+
+def _paths(cache_dir: str):
+    d = Path(cache_dir)
+    return d / "analytics_state.json", d / "analytics.parquet"
+
+
+def _day_inputs(snaps: pd.DataFrame, history: pd.DataFrame) -> list:
+    """[(iso date, return, {symbol: contribution})] in date order."""
+    contrib = {}
+    if not history.empty:
+        for day, g in history.groupby("date", sort=False):
+            contrib[day] = dict(zip(g["symbol"], g["contribution"].astype(float).fillna(0.0)))
+    return [(d.date().isoformat(), float(r), contrib.get(d, {}))
+            for d, r in zip(snaps["date"], snaps["portfolio_return"])]
+
+
+def _update_fund(entry: dict, snaps: pd.DataFrame, history: pd.DataFrame):
+    """(new entry, [series rows], first recomputed date or None when nothing changed)."""
+    base = FundState(entry.get("base"))
+    latest = entry.get("latest")   # [iso date, return, {symbol: contribution}], not in base yet
+
+    dates = snaps["date"].dt.strftime("%Y-%m-%d")
+    settled = snaps[dates <= base.as_of] if base.as_of else snaps.iloc[:0]
+    if (len(settled) != base.n or abs(float(settled["portfolio_return"].sum()) - base.checksum) > 1e-6
+            or (latest and latest[0] not in set(dates))):
+        base, latest = FundState(), None   # an earlier day was added, re-saved or removed: rebuild
+        metrics.inc("analytics_rebuild")
+
+    since = latest[0] if latest else base.as_of
+    todo = snaps[dates >= since] if latest else snaps[dates > since] if since else snaps
+    hist = history[history["date"] >= todo["date"].min()] if len(todo) and not history.empty else history.iloc[:0]
+    days = _day_inputs(todo, hist)
+    if not days or [list(d) for d in days] == [latest]:
+        return entry, [], None   # nothing new, or only the newest day re-read unchanged
+
+    # Settle every day but the newest; fold the newest into a throwaway copy
+    rows = [base.push(*d) for d in days[:-1]]
+    rows.append(base.copy().push(*days[-1]))
+    return {"base": base.to_dict(), "latest": list(days[-1])}, rows, days[0][0]
+
+
+def _contributions(entries: dict) -> pd.DataFrame:
+    out = []
+    for fund, entry in entries.items():
+        state = FundState(entry["base"])
+        if entry.get("latest"):
+            state.push(*entry["latest"])
+        for sym, sums in state.contrib_sums.items():
+            out.append({"fund": fund, "symbol": sym, **{f"contrib_{w}": sums[w] for w in WINDOWS}})
+    return pd.DataFrame(out, columns=["fund", "symbol"] + [f"contrib_{w}" for w in WINDOWS])
+
+
+@metrics.timed("analytics")
+def update_analytics(snapshots: pd.DataFrame, history: pd.DataFrame, cache_dir: str = CACHE_DIR) -> Analytics:
+    """Bring the persisted analytics up to date with the snapshot/history frames and return them."""
+    state_path, series_path = _paths(cache_dir)
+    with _lock:
+        try:
+            entries = json.loads(state_path.read_text())
+        except (OSError, ValueError):
+            entries = {}
+        series = pd.read_parquet(series_path) if series_path.exists() and entries else pd.DataFrame()
+
+        changed = False
+        for fund, snaps in (snapshots.groupby("fund", sort=False) if not snapshots.empty else []):
+            fund_hist = history[history["fund"] == fund] if not history.empty else history
+            entry, rows, since = _update_fund(entries.get(fund, {}), snaps, fund_hist)
+            if since is None:
+                continue
+            changed = True
+            entries[fund] = entry
+            if not series.empty:
+                series = series[(series["fund"] != fund) | (series["date"] < pd.Timestamp(since))]
+            fresh = pd.DataFrame(rows).assign(fund=fund)
+            fresh["date"] = pd.to_datetime(fresh["date"])
+            series = fresh if series.empty else pd.concat([series, fresh], ignore_index=True)
+
+        if changed:
+            series = series.sort_values(["fund", "date"]).reset_index(drop=True)
+            state_path.parent.mkdir(parents=True, exist_ok=True)
+            for path, write in ((series_path, lambda p: series.to_parquet(p, index=False)),
+                                (state_path, lambda p: p.write_text(json.dumps(entries)))):
+                tmp = path.with_suffix(".tmp")
+                write(tmp)
+                os.replace(tmp, path)
+        return Analytics(series, _contributions(entries))
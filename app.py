@@ -1,12 +1,28 @@
 # app.py — Supabase version
 import streamlit as st
-import requests, re, time, os
-from bs4 import BeautifulSoup
+import html
+import os
+import time
 import pandas as pd
 import numpy as np
-from datetime import date
-import plotly.express as px
-from supabase import create_client, Client
+from datetime import date, datetime
+from funds import DEFAULT_FUND, MIN_COVERAGE, fund_of
+from portfolio_calc import history_rows, snapshot_return
+from quote_poller import POLL_SECONDS, QuotePoller
+from nse_calendar import IST, is_nse_trading_day, session_bounds
+import metrics
+from metrics import timed
+from history_store import load_history, load_mf_returns, load_snapshots
+from snapshot_writer import save_days
+from period_aggregates import load_period_stocks, load_periods, update_aggregates
+from holdings_table import render_holdings_html
+from analytics import WINDOWS, update_analytics
+from tracking import WINDOWS as TRACKING_WINDOWS, update_tracking
+from return_matrix import update_matrix
+from chart_data import MAX_HEATMAP_COLUMNS, bucket_heatmap, line, record, reports as chart_reports
+from holdings_import import (SECURITY_MASTER, apply_diff, current_rows, diff_holdings,
+                             map_lines, read_disclosure, sheet_names)
+from bhavcopy import load_security_master
 import warnings
 warnings.filterwarnings("ignore")
 import os
@@ -23,10 +39,14 @@ except Exception:
     SUPABASE_URL = os.getenv("SUPABASE_URL")
     SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Heavy imports (supabase, plotly) are deferred to first use so the page starts drawing sooner.
+@st.cache_resource
+def get_client():
+    from supabase import create_client
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
 
 # ---------- UI config ----------
-st.set_page_config(page_title="Motilal Midcap Fund Real Time Returns", page_icon="📈", layout="wide")
+st.set_page_config(page_title="Mutual Fund Real Time Returns", page_icon="📈", layout="wide")
 
 # Premium Dark Theme with Glassmorphism
 st.markdown("""
@@ -353,115 +373,198 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# ---------- Helper: fetch stock return ----------
-@st.cache_data(ttl=300)
-def fetch_stock_return(url: str) -> float:
-    try:
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        r = requests.get(url, headers=headers, timeout=10)
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "lxml")
-        m = re.search(r"[+-]?[0-9]+\.[0-9]+(?=%)", soup.get_text())
-        if m:
-            return float(m.group())
-        m2 = re.search(r"[+-]?[0-9]+(?=\s?%)", soup.get_text())
-        if m2:
-            return float(m2.group())
-        return 0.0
-    except Exception as e:
-        st.markdown(f"""
-        <div style="
-            background: linear-gradient(135deg, rgba(255, 193, 7, 0.1) 0%, rgba(255, 152, 0, 0.05) 100%);
-            border: 1px solid rgba(255, 193, 7, 0.3);
-            border-radius: 12px;
-            padding: 0.75rem 1.25rem;
-            margin: 1rem 0;
-            backdrop-filter: blur(10px);
-            display: flex;
-            align-items: center;
-            gap: 0.75rem;
-        ">
-            <span style="font-size: 1.25rem;">⚠️</span>
-            <span style="color: rgba(255, 255, 255, 0.9); font-weight: 500;">Fetch error for {url}: {e}</span>
-        </div>
-        """, unsafe_allow_html=True)
-        return 0.0
+# ---------- Helpers ----------
+def show_fetch_warning(url: str, e: Exception):
+    st.markdown(f"""
+    <div style="
+        background: linear-gradient(135deg, rgba(255, 193, 7, 0.1) 0%, rgba(255, 152, 0, 0.05) 100%);
+        border: 1px solid rgba(255, 193, 7, 0.3);
+        border-radius: 12px;
+        padding: 0.75rem 1.25rem;
+        margin: 1rem 0;
+        backdrop-filter: blur(10px);
+        display: flex;
+        align-items: center;
+        gap: 0.75rem;
+    ">
+        <span style="font-size: 1.25rem;">⚠️</span>
+        <span style="color: rgba(255, 255, 255, 0.9); font-weight: 500;">Fetch error for {html.escape(url)}: {html.escape(str(e))}</span>
+    </div>
+    """, unsafe_allow_html=True)
 
 # ---------- Supabase CRUD ----------
+# Loaded once per TTL; save_stock / delete_stock invalidate it explicitly.
+@st.cache_data(ttl=300, show_spinner=False)
+@timed("db")
 def load_portfolio_df() -> pd.DataFrame:
-    res = supabase.table("stocks").select("*").execute()
+    res = get_client().table("stocks").select("*").execute()
     df = pd.DataFrame(res.data)
-    if not df.empty:
-        return df.set_index("symbol")
-    return pd.DataFrame(columns=["url", "allocation"])
+    if df.empty:
+        return pd.DataFrame(columns=["fund", "symbol", "url", "allocation"])
+    df["fund"] = [fund_of(r) for r in res.data]
+    return df
 
-def save_stock(symbol, url, allocation):
-    supabase.table("stocks").upsert({"symbol": symbol, "url": url, "allocation": allocation}).execute()
+def list_funds() -> list:
+    funds = sorted(load_portfolio_df()["fund"].unique())
+    return funds or [DEFAULT_FUND]
 
-def delete_stock(symbol):
-    supabase.table("stocks").delete().eq("symbol", symbol).execute()
+@timed("db")
+def load_holdings() -> list:
+    # Called from the poller thread, so it bypasses st.cache_data
+    res = get_client().table("stocks").select("*").execute()
+    return [(fund_of(r), r["symbol"], r["url"], float(r["allocation"])) for r in res.data or []]
 
-def save_daily_snapshot_rows(rows: list, portfolio_return: float):
-    today = date.today().isoformat()  # ✅ Convert to string: "2025-11-12"
+@timed("db")
+def save_stock(fund, symbol, url, allocation):
+    get_client().table("stocks").upsert(
+        {"fund": fund, "symbol": symbol, "url": url, "allocation": allocation},
+        on_conflict="fund,symbol").execute()
+    load_portfolio_df.clear()
+    get_poller().refresh_now()
 
-    # Convert row dates too
-    rows = [
-        {**r, "date": r["date"].isoformat() if isinstance(r["date"], date) else r["date"]}
-        for r in rows
-    ]
+@timed("db")
+def delete_stock(fund, symbol):
+    get_client().table("stocks").delete().eq("fund", fund).eq("symbol", symbol).execute()
+    load_portfolio_df.clear()
+    get_poller().refresh_now()
+
+@st.cache_data(ttl=86400, show_spinner="Loading NSE security master…")
+def load_master(source: str):
+    return load_security_master(source)
+
+def plan_import(upload, sheet, target_fund: str, master_source: str):
+    """Read an uploaded disclosure and diff it against the fund's current holdings."""
+    lines = read_disclosure(upload, name=upload.name, sheet=sheet)
+    current = current_rows(get_client(), target_fund)
+    master = load_master(master_source)
+    mapped, unmapped = map_lines(lines, master, current)
+    return diff_holdings(current, mapped, unmapped, master), unmapped
 
-    # Save to Supabase
-    supabase.table("portfolio_snapshots").upsert({
-        "date": today,
-        "portfolio_return": round(float(portfolio_return),2)
-    }).execute()
+@timed("db")
+def apply_import(target_fund: str, diff):
+    apply_diff(get_client(), target_fund, diff)
+    load_portfolio_df.clear()
+    get_poller().refresh_now()
 
-    supabase.table("history").insert(rows).execute()
+def snapshot_day(at: float):
+    """Trading day a live snapshot taken at `at` belongs to; None before the open or on a non-trading day."""
+    day = datetime.fromtimestamp(at, IST).date()
+    if not is_nse_trading_day(day) or at < session_bounds(day)[0]:
+        return None   # the poller is still showing an earlier session's quotes
+    return day
 
-def save_mf_return(mf_value: float):
-    today = date.today().isoformat()  # ✅ Convert to string before inserting
+def save_daily_snapshot_rows(snap, day: date) -> list:
+    """Save the live result for every fund as `day`'s snapshot in one write.
 
-    supabase.table("mf_returns").upsert({
-        "date": today,
-        "mf_return": float(mf_value)
-    }).execute()
+    Funds with less than MIN_COVERAGE of their allocation freshly priced are
+    skipped, as in the daily job; returns their names.
+    """
+    skipped = [fund for fund, share in snap.coverage.items() if share < MIN_COVERAGE]
+    days = [
+        {"date": day, "fund": fund, "portfolio_return": snapshot_return(r), "rows": history_rows(r, day, fund)}
+        for fund, r in snap.results.items()
+        if len(r.symbols) and fund not in skipped   # never save an empty fund as 0%
+    ]
+    if not days:
+        return skipped
+    save_days(get_client(), days)
+    try:
+        update_aggregates(get_client(), days)
+    except Exception as e:
+        print(f"Period aggregates not updated: {e}")   # the next save recomputes the affected periods
+    load_periods_df.clear()
+    load_analytics.clear()
+    load_tracking.clear()
+    load_matrix.clear()
+    return skipped
 
 def load_snapshots_df() -> pd.DataFrame:
-    res = supabase.table("portfolio_snapshots").select("*").execute()
-    df = pd.DataFrame(res.data or [])
-    if not df.empty:
-        # ✅ Convert date string ("2025-11-12") back to datetime
-        df["date"] = pd.to_datetime(df["date"], errors="coerce")
-        df = df.dropna(subset=["date"]).sort_values("date")
-    return df
+    return load_snapshots(get_client())
 
 def load_history_df() -> pd.DataFrame:
-    res = supabase.table("history").select("*").execute()
-    df = pd.DataFrame(res.data or [])
-    if not df.empty:
-        df["date"] = pd.to_datetime(df["date"], errors="coerce")
-        df = df.dropna(subset=["date"]).sort_values(["date","symbol"])
-    return df
+    return load_history(get_client())
+
+# Folds only days saved since the last call into the persisted running state
+@st.cache_data(ttl=300, show_spinner="Updating history analytics...")
+def load_analytics():
+    return update_analytics(load_snapshots_df(), load_history_df())
+
+# Memory-mapped views: cached as a resource so they are shared, not pickled per session
+@st.cache_resource(ttl=300, show_spinner=False)
+def load_matrix(fund: str):
+    return update_matrix(load_history_df(), fund)
+
+# Month / quarter / year views read the aggregates the daily job maintains
+@st.cache_data(ttl=300, show_spinner=False)
+def load_periods_df(fund: str, period: str) -> pd.DataFrame:
+    return pd.DataFrame(load_periods(get_client(), fund, period))
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_period_stocks_df(fund: str, period: str, start: str) -> pd.DataFrame:
+    return pd.DataFrame(load_period_stocks(get_client(), fund, period, start))
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_tracking() -> pd.DataFrame:
+    return update_tracking(load_snapshots_df(), load_mf_returns(get_client()))
+
+DEBUG = st.query_params.get("debug") == "1" or os.getenv("DASHBOARD_DEBUG") == "1"
+
+def render_debug_panel():
+    """Per-stage latency and per-symbol timing; shown with ?debug=1 or DASHBOARD_DEBUG=1."""
+    report = metrics.registry.report()
+    with st.expander("🔧 Debug: timings"):
+        if report["stages"]:
+            stages = pd.DataFrame(report["stages"]).T.drop(columns="buckets_ms")
+            st.dataframe(stages, use_container_width=True)
+        st.json(report["counters"])
+        if report["symbols"]:
+            st.dataframe(pd.DataFrame(report["symbols"]).T.sort_index(), use_container_width=True)
+        if chart_reports:
+            st.markdown("**Charts** (latest render)")
+            st.dataframe(pd.DataFrame({k: v._asdict() for k, v in chart_reports.items()}).T.sort_index(),
+                         use_container_width=True)
+
+# ---------- Live quotes ----------
+# One poller per server process; every session reads its latest snapshot.
+@st.cache_resource
+def get_poller() -> QuotePoller:
+    poller = QuotePoller(load_holdings)
+    poller.start()
+    return poller
 
 # ---------- App ----------
+funds = list_funds()
+fund = st.sidebar.selectbox("Fund", funds) if len(funds) > 1 else funds[0]
+
 # Custom Header
-st.markdown("""
+st.markdown(f"""
 <div style="text-align: center; padding: 1rem 0 2rem 0;">
-    <h1 style="margin-bottom: 0.5rem;">Motilal Midcap</h1>
+    <h1 style="margin-bottom: 0.5rem;">{html.escape(fund)}</h1>
     <p style="color: rgba(255, 255, 255, 0.6); font-size: 1rem; font-weight: 400;">Real-Time Portfolio Tracking • NSE Holiday-Aware • Powered by Supabase</p>
 </div>
 """, unsafe_allow_html=True)
 
-tab1, tab2 = st.tabs(["📊 Portfolio","⚙️ Manage"])
+tab1, tab_history, tab2 = st.tabs(["📊 Portfolio", "📈 History", "⚙️ Manage"])
 
 # ----------------------------------------------------------------
 # 📊 Portfolio
 # ----------------------------------------------------------------
-with tab1:
-    st.button("🔄 Refresh live data", on_click=lambda: st.rerun())
-    portfolio_df = load_portfolio_df()
+# Each tab is a fragment: widgets inside it rerun only that tab, not the whole script.
+# The Portfolio tab also re-reads the poller's snapshot on a timer.
+@st.fragment(run_every=POLL_SECONDS)
+def render_portfolio(fund: str):
+    poller = get_poller()
+    st.button("🔄 Refresh live data", on_click=poller.refresh_now)
+    snap = poller.snapshot()
+    if snap is None:
+        with st.spinner("Fetching live quotes..."):
+            snap = poller.wait_for_snapshot(timeout=60)
+    if snap is None:
+        st.info("Live quotes are still loading — this view refreshes automatically.")
+        return
 
-    if portfolio_df.empty:
+    result = snap.results.get(fund)
+    if fund not in snap.coverage:   # no holdings at all
         st.markdown("""
         <div style="
             background: rgba(255, 255, 255, 0.02);
@@ -475,30 +578,17 @@ with tab1:
             <span style="color: rgba(255, 255, 255, 0.6); font-weight: 400;">No stocks in portfolio. Add some in the Manage tab.</span>
         </div>
         """, unsafe_allow_html=True)
+    elif len(result.symbols) == 0:
+        for sym, e in snap.errors.items():
+            show_fetch_warning(snap.urls[sym], e)
+        st.warning("None of this fund's holdings could be priced.")
     else:
-        total_alloc = portfolio_df["allocation"].sum()
-        rows, total_weighted = [], 0.0
-        progress = st.progress(0)
-        status = st.empty()
-
-        for i, (sym, r) in enumerate(portfolio_df.iterrows()):
-            status.write(f"Fetching **{sym}**...")
-            ret = fetch_stock_return(r["url"])
-            allocation_val = float(r["allocation"])
-            norm = allocation_val / total_alloc if total_alloc > 0 else 0
-            contrib = ret * norm
-            total_weighted += contrib
-            rows.append({
-                "Stock": sym,
-                "Return": ret,
-                "Weight": allocation_val,
-                "Contribution": contrib
-            })
-            progress.progress((i + 1) / len(portfolio_df))
-            time.sleep(0.05)
-
-        progress.empty()
-        status.markdown("""
+        # Unpriced holdings are missing from `result`, so report from the poll's errors
+        for sym, e in snap.errors.items():
+            show_fetch_warning(snap.urls[sym], e)
+        unpriced = 1 - snap.coverage[fund]
+
+        st.markdown(f"""
         <div style="
             background: linear-gradient(135deg, rgba(0, 229, 255, 0.1) 0%, rgba(0, 184, 212, 0.05) 100%);
             border: 1px solid rgba(0, 229, 255, 0.3);
@@ -511,62 +601,39 @@ with tab1:
             gap: 0.75rem;
         ">
             <span style="font-size: 1.25rem;">✅</span>
-            <span style="color: rgba(255, 255, 255, 0.9); font-weight: 500;">All stocks fetched successfully</span>
+            <span style="color: rgba(255, 255, 255, 0.9); font-weight: 500;">Live quotes as of {datetime.fromtimestamp(snap.at, IST):%H:%M:%S} IST</span>
         </div>
         """, unsafe_allow_html=True)
 
-        df_live = pd.DataFrame(rows).set_index("Stock")
-        
+        df_live = pd.DataFrame({
+            "Return": result.returns,
+            "Weight": result.allocations,
+            "Contribution": result.contributions,
+        }, index=pd.Index(result.symbols, name="Stock"))
+
         # Metrics Row
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("📈 Portfolio Return", f"{total_weighted:+.2f}%")
+            st.metric("📈 Portfolio Return", f"{result.total:+.2f}%")
+            if unpriced > 0:
+                st.caption(f"{unpriced:.0%} of the weight has no fresh quote")
         with col2:
-            green_count = (df_live['Return']>0).sum()
-            st.metric("🟢 Green Stocks", f"{green_count}/{len(df_live)}")
+            st.metric("🟢 Green Stocks", f"{result.green_count}/{len(df_live)}")
         with col3:
             # Best performer
-            best_stock = df_live['Return'].idxmax()
-            best_return = df_live['Return'].max()
+            best_stock, best_return = result.best
             st.metric("🏆 Best Performer", f"{best_stock}", f"{best_return:+.2f}%")
         
 
         df_live = df_live.sort_values(by="Weight", ascending=False)
         
-        # Create custom table using HTML in a container
-        st.markdown("""
-        <div style="
-            background: rgba(26, 31, 58, 0.4);
-            border-radius: 16px;
-            border: 1px solid rgba(0, 229, 255, 0.2);
-            padding: 1rem;
-            margin: 1rem 0;
-        ">
-            <div style="display: grid; grid-template-columns: 2fr 1.5fr 1.5fr 1.5fr; gap: 1rem; padding: 0.75rem 1rem; background: linear-gradient(135deg, rgba(0, 229, 255, 0.2) 0%, rgba(0, 184, 212, 0.15) 100%); border-radius: 8px; margin-bottom: 0.5rem;">
-                <div style="color: #00e5ff; font-weight: 600; text-transform: uppercase; letter-spacing: 0.5px; font-size: 0.85rem;">Stock</div>
-                <div style="color: #00e5ff; font-weight: 600; text-transform: uppercase; letter-spacing: 0.5px; font-size: 0.85rem; text-align: right;">Return</div>
-                <div style="color: #00e5ff; font-weight: 600; text-transform: uppercase; letter-spacing: 0.5px; font-size: 0.85rem; text-align: right;">Weight</div>
-                <div style="color: #00e5ff; font-weight: 600; text-transform: uppercase; letter-spacing: 0.5px; font-size: 0.85rem; text-align: right;">Contribution</div>
-            </div>
-        """, unsafe_allow_html=True)
-        
-        for idx, (stock, row) in enumerate(df_live.iterrows()):
-            return_val = row['Return']
-            return_color = "#00e5ff" if return_val > 0 else "#ff5252"
-            bg_color = "rgba(26, 31, 58, 0.3)" if idx % 2 == 0 else "rgba(26, 31, 58, 0.5)"
-            
-            st.markdown(f"""
-            <div style="display: grid; grid-template-columns: 2fr 1.5fr 1.5fr 1.5fr; gap: 1rem; padding: 0.75rem 1rem; background: {bg_color}; border-radius: 8px; margin-bottom: 0.25rem; transition: all 0.2s ease;" onmouseover="this.style.background='rgba(0, 229, 255, 0.08)'; this.style.transform='scale(1.005)'" onmouseout="this.style.background='{bg_color}'; this.style.transform='scale(1)'">
-                <div style="color: rgba(255, 255, 255, 0.95); font-weight: 500;">{stock}</div>
-                <div style="color: {return_color}; font-weight: 600; text-align: right;">{return_val:+.2f}%</div>
-                <div style="color: rgba(255, 255, 255, 0.9); text-align: right;">{row['Weight']:.2f}%</div>
-                <div style="color: rgba(255, 255, 255, 0.9); text-align: right;">{row['Contribution']:+.3f}%</div>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        st.markdown("</div>", unsafe_allow_html=True)
+        # Whole holdings grid as one payload
+        with timed("render"):
+            st.markdown(render_holdings_html(df_live), unsafe_allow_html=True)
 
         st.subheader("📊 Performance Heatmap")
+        import plotly.express as px
+        t0 = time.perf_counter()
         heat = np.array([df_live["Return"].values])
         fig2 = px.imshow(
             heat, 
@@ -590,39 +657,286 @@ with tab1:
         fig2.update_traces(
             hovertemplate='<b>%{x}</b><br>Return: %{z:+.2f}%<extra></extra>'
         )
-        st.plotly_chart(fig2, use_container_width=True)
-
-        if st.button("💾 Save today's snapshot"):
-            today = date.today()
-            snapshot_rows = [
-                {"date": today, "symbol": r["Stock"], "ret": float(r["Return"]),
-                 "allocation": float(r["Weight"]), "contribution": float(r["Contribution"])}
-                for _, r in df_live.reset_index().iterrows()
-            ]
-            save_daily_snapshot_rows(snapshot_rows, total_weighted)
-            st.markdown("""
-            <div style="
-                background: linear-gradient(135deg, rgba(0, 229, 255, 0.1) 0%, rgba(0, 184, 212, 0.05) 100%);
-                border: 1px solid rgba(0, 229, 255, 0.3);
-                border-radius: 12px;
-                padding: 0.75rem 1.25rem;
-                margin: 1rem 0;
-                backdrop-filter: blur(10px);
-                display: flex;
-                align-items: center;
-                gap: 0.75rem;
-            ">
-                <span style="font-size: 1.25rem;">💾</span>
-                <span style="color: rgba(255, 255, 255, 0.9); font-weight: 500;">Snapshot saved to Supabase successfully</span>
-            </div>
-            """, unsafe_allow_html=True)
+        show_chart("portfolio_heatmap", fig2, t0)
+
+        too_few = snap.coverage[fund] < MIN_COVERAGE   # save_daily_snapshot_rows would skip it
+        if st.button("💾 Save today's snapshot", disabled=too_few,
+                     help=f"Needs at least {MIN_COVERAGE:.0%} of the weight freshly priced" if too_few else None):
+            day = snapshot_day(snap.at)
+            if day is None:
+                st.warning("These quotes are from an earlier session (before today's open, or a weekend/holiday); "
+                           "nothing was saved.")
+            else:
+                skipped = save_daily_snapshot_rows(snap, day)
+                if skipped:
+                    st.warning(f"Less than {MIN_COVERAGE:.0%} of the allocation has a fresh quote for "
+                               f"{', '.join(skipped)}; those funds were not saved.")
+                if len(skipped) < len(snap.coverage):
+                    st.markdown("""
+                    <div style="
+                        background: linear-gradient(135deg, rgba(0, 229, 255, 0.1) 0%, rgba(0, 184, 212, 0.05) 100%);
+                        border: 1px solid rgba(0, 229, 255, 0.3);
+                        border-radius: 12px;
+                        padding: 0.75rem 1.25rem;
+                        margin: 1rem 0;
+                        backdrop-filter: blur(10px);
+                        display: flex;
+                        align-items: center;
+                        gap: 0.75rem;
+                    ">
+                        <span style="font-size: 1.25rem;">💾</span>
+                        <span style="color: rgba(255, 255, 255, 0.9); font-weight: 500;">Snapshot saved to Supabase successfully</span>
+                    </div>
+                    """, unsafe_allow_html=True)
+
+    if DEBUG:
+        render_debug_panel()
+
+# ----------------------------------------------------------------
+# 📈 History
+# ----------------------------------------------------------------
+def _pct(x) -> str:
+    return "—" if pd.isna(x) else f"{x:+.2f}%"
+
+def _dark_layout(fig, height: int):
+    fig.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='rgba(255,255,255,0.9)', family='Inter'),
+        xaxis=dict(showgrid=False),
+        yaxis=dict(gridcolor='rgba(255,255,255,0.08)', ticksuffix='%'),
+        margin=dict(l=20, r=20, t=30, b=20),
+        legend=dict(orientation='h', y=1.1),
+        height=height,
+    )
+    return fig
+
+def show_chart(name: str, fig, started: float):
+    """Send a figure built since `started` (perf_counter), recording its timings (and payload size with ?debug=1)."""
+    built = time.perf_counter()
+    st.plotly_chart(fig, use_container_width=True)
+    record(name, fig, (built - started) * 1000, (time.perf_counter() - built) * 1000, payload=DEBUG)
+
+# Visible range of the History charts, in months (None: everything)
+RANGES = {"3M": 3, "1Y": 12, "3Y": 36, "All": None}
+
+@st.fragment
+def render_history(fund: str):
+    st.subheader("📈 Historical Performance")
+    a = load_analytics()
+    series = a.series[a.series["fund"] == fund] if not a.series.empty else a.series
+    if series.empty:
+        st.markdown("""
+        <div style="
+            background: rgba(255, 255, 255, 0.02);
+            border: 1px solid rgba(255, 255, 255, 0.1);
+            border-radius: 12px;
+            padding: 1rem 1.5rem;
+            margin: 1rem 0;
+            backdrop-filter: blur(10px);
+            text-align: center;
+        ">
+            <span style="color: rgba(255, 255, 255, 0.6); font-weight: 400;">No saved snapshots yet. History appears after the first daily run.</span>
+        </div>
+        """, unsafe_allow_html=True)
+        return
+
+    col_w, col_r = st.columns(2)
+    with col_w:
+        window = st.radio("Rolling window (trading days)", WINDOWS, index=1, horizontal=True,
+                          format_func=lambda w: f"{w}d", key=f"window_{fund}")
+    with col_r:
+        span = st.radio("Range", list(RANGES), index=1, horizontal=True, key=f"range_{fund}")
+    start = series["date"].iloc[-1] - pd.DateOffset(months=RANGES[span]) if RANGES[span] else None
+    last = series.iloc[-1]
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("📈 Cumulative Return", _pct(last["cumulative"]), f"{last['return']:+.2f}% last day")
+    with col2:
+        st.metric("📉 Max Drawdown", _pct(series["drawdown"].min()), f"{last['drawdown']:+.2f}% now",
+                  delta_color="off")
+    with col3:
+        st.metric(f"🔁 {window}d Return", _pct(last[f"ret_{window}"]))
+    with col4:
+        vol = last[f"vol_{window}"]
+        st.metric(f"〰️ {window}d Volatility (ann.)", "—" if pd.isna(vol) else f"{vol:.2f}%")
+
+    import plotly.graph_objects as go
+    t0 = time.perf_counter()
+    fig = go.Figure()
+    fig.add_trace(line(series["date"], series["cumulative"], "Cumulative", start=start,
+                       line=dict(color='#00e5ff', width=2)))
+    fig.add_trace(line(series["date"], series[f"ret_{window}"], f"Rolling {window}d", start=start,
+                       line=dict(color='#ffd54f', width=1.5)))
+    show_chart("history_returns", _dark_layout(fig, 320), t0)
+
+    # min/max keeps every trough, so the deepest drawdown is never smoothed away
+    t0 = time.perf_counter()
+    fig_dd = go.Figure(line(series["date"], series["drawdown"], "Drawdown", method="minmax", start=start,
+                            fill="tozeroy", line=dict(color='#ff5252', width=1)))
+    show_chart("history_drawdown", _dark_layout(fig_dd, 180), t0)
+
+    st.subheader(f"🧩 Contribution by Stock ({window}d)")
+    contrib = a.contributions[a.contributions["fund"] == fund]
+    if not contrib.empty:
+        contrib = contrib.set_index("symbol")[f"contrib_{window}"].sort_values()
+        t0 = time.perf_counter()
+        fig_c = go.Figure(go.Bar(
+            x=contrib.values, y=contrib.index, orientation="h",
+            marker_color=np.where(contrib.values >= 0, '#00e676', '#ff5252'),
+            hovertemplate='<b>%{y}</b><br>%{x:+.2f} pp<extra></extra>',
+        ))
+        fig_c = _dark_layout(fig_c, max(200, 22 * len(contrib)))
+        fig_c.update_layout(xaxis=dict(ticksuffix=' pp', gridcolor='rgba(255,255,255,0.08)'), yaxis=dict(ticksuffix=''))
+        show_chart("history_contribution", fig_c, t0)
+
+    render_periods(fund)
+    render_stock_explorer(fund)
+    render_tracking(fund, start)
+
+PERIOD_LABELS = {"month": "Monthly", "quarter": "Quarterly", "year": "Yearly"}
+
+def _period_name(start: str, period: str) -> str:
+    d = pd.Timestamp(start)
+    if period == "month":
+        return d.strftime("%b %Y")
+    return f"Q{d.quarter} {d.year}" if period == "quarter" else str(d.year)
+
+def render_periods(fund: str):
+    """Month / quarter / year returns, best and worst days and top contributors."""
+    st.subheader("📅 Period Returns")
+    period = st.radio("Period", list(PERIOD_LABELS), horizontal=True, format_func=PERIOD_LABELS.get,
+                      key=f"agg_period_{fund}")
+    try:
+        periods = load_periods_df(fund, period)
+    except Exception as e:
+        st.caption(f"Period aggregates unavailable ({e}). Create the `period_aggregates` table and run "
+                   "`python period_aggregates.py --rebuild START END`.")
+        return
+    if periods.empty:
+        st.caption("No period aggregates yet. The daily job fills them in; "
+                   "`python period_aggregates.py --rebuild START END` builds them for saved history.")
+        return
+    periods = periods.iloc[::-1]
+    names = [_period_name(s, period) for s in periods["period_start"]]
+    st.dataframe(pd.DataFrame({
+        "Period": names,
+        "Return": periods["ret"].map(_pct).values,
+        "Days": periods["days"].values,
+        "Best Day": [f"{d} ({r:+.2f}%)" for d, r in zip(periods["best_day"], periods["best_ret"])],
+        "Worst Day": [f"{d} ({r:+.2f}%)" for d, r in zip(periods["worst_day"], periods["worst_ret"])],
+        "Through": periods["through"].values,
+    }), hide_index=True, use_container_width=True)
+
+    picked = st.selectbox("Contributors in", range(len(names)), format_func=names.__getitem__,
+                          key=f"agg_pick_{fund}_{period}")
+    stocks = load_period_stocks_df(fund, period, periods["period_start"].iloc[picked])
+    if not stocks.empty:
+        st.dataframe(pd.DataFrame({
+            "Stock": stocks["symbol"].values,
+            "Contribution (pp)": stocks["contribution"].round(2).values,
+            "Return": stocks["ret"].map(_pct).values,
+            "Days Held": stocks["days"].values,
+        }), hide_index=True, use_container_width=True)
+
+def render_stock_explorer(fund: str):
+    """Per-stock trends, a date × stock heatmap and top/bottom contributors over any period."""
+    st.subheader("🔍 Stock Explorer")
+    m = load_matrix(fund)
+    if len(m) == 0:
+        st.caption("Per-stock history appears once daily snapshots have been saved.")
+        return
+    days = m.dates.astype(object).tolist()
+    start, end = st.select_slider("Period", options=days, value=(days[max(0, len(days) - 60)], days[-1]),
+                                  format_func=lambda d: d.strftime("%d %b %Y"), key=f"period_{fund}")
+    w = m.window(start, end)
+
+    top, bottom = w.ranking(5)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("**🏆 Top contributors**")
+        st.dataframe(pd.DataFrame(top, columns=["Stock", "Contribution (pp)"]).round(2), hide_index=True,
+                     use_container_width=True)
+    with col2:
+        st.markdown("**🔻 Bottom contributors**")
+        st.dataframe(pd.DataFrame(bottom, columns=["Stock", "Contribution (pp)"]).round(2), hide_index=True,
+                     use_container_width=True)
+
+    import plotly.express as px
+    import plotly.graph_objects as go
+    t0 = time.perf_counter()
+    held = ~np.isnan(w.returns).all(axis=0)
+    order = np.argsort(-w.contributions()[held])
+    symbols = w.symbols[held][order]
+    # Wide periods are shown as weekly/monthly/quarterly compounded returns, so the heatmap
+    # never carries more than MAX_HEATMAP_COLUMNS columns per stock
+    buckets, block, freq = bucket_heatmap(w.dates, np.asarray(w.returns)[:, held][:, order])
+    label = {"D": "Daily", "W": "Weekly", "M": "Monthly", "Q": "Quarterly"}[freq]
+    fig = px.imshow(block.T, x=buckets.astype(object), y=symbols,
+                    color_continuous_scale="RdYlGn", color_continuous_midpoint=0, aspect="auto")
+    fig = _dark_layout(fig, max(200, 18 * len(symbols)))
+    fig.update_layout(yaxis=dict(ticksuffix='', showgrid=False))
+    period = "" if freq == "D" else f" ({label.lower()} from)"
+    fig.update_traces(hovertemplate=f'<b>%{{y}}</b> %{{x|%d %b %Y}}{period}<br>Return: %{{z:+.2f}}%<extra></extra>')
+    if freq != "D":
+        st.caption(f"{label} returns — the period spans more than {MAX_HEATMAP_COLUMNS} trading days.")
+    show_chart("explorer_heatmap", fig, t0)
+
+    picked = st.multiselect("Trend for", symbols.tolist(), default=symbols[:3].tolist(), key=f"trend_{fund}")
+    if picked:
+        t0 = time.perf_counter()
+        fig_t = go.Figure()
+        for sym in picked:
+            fig_t.add_trace(line(w.dates, w.cumulative(sym), sym))
+        show_chart("explorer_trend", _dark_layout(fig_t, 300), t0)
+
+def render_tracking(fund: str, start=None):
+    """Holdings-based estimate vs the fund's published NAV; charts start at `start` (None: all)."""
+    st.subheader("🎯 Estimate vs Actual NAV")
+    tracking = load_tracking()
+    t = tracking[tracking["fund"] == fund] if not tracking.empty else tracking
+    if t.empty:
+        st.caption("No NAV data for this fund yet. Map it to its AMFI scheme code in AMFI_SCHEMES "
+                   "and the daily job will load its NAVs (or run `python amfi_nav.py`).")
+        return
+    w = max(TRACKING_WINDOWS)
+    last = t.iloc[-1]
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Tracking Difference", f"{last['cum_diff']:+.2f}%", f"{last['diff']:+.2f} pp last day",
+                  delta_color="off")
+    with col2:
+        te = last[f"te_{w}"]
+        st.metric(f"Tracking Error ({w}d, ann.)", "—" if pd.isna(te) else f"{te:.2f}%")
+    with col3:
+        corr = last[f"corr_{w}"]
+        st.metric(f"Correlation ({w}d)", "—" if pd.isna(corr) else f"{corr:.2f}")
+    with col4:
+        st.metric("Days Compared", f"{len(t)}")
+
+    import plotly.graph_objects as go
+    t0 = time.perf_counter()
+    fig = go.Figure()
+    fig.add_trace(line(t["date"], t["cum_est"], "Estimate (holdings)", start=start,
+                       line=dict(color='#00e5ff', width=2)))
+    fig.add_trace(line(t["date"], t["cum_actual"], "Actual (NAV)", start=start,
+                       line=dict(color='#b388ff', width=2)))
+    show_chart("tracking_cumulative", _dark_layout(fig, 300), t0)
+
+    t0 = time.perf_counter()
+    fig_te = go.Figure()
+    for win in TRACKING_WINDOWS:
+        fig_te.add_trace(line(t["date"], t[f"te_{win}"], f"Tracking error {win}d", start=start))
+    show_chart("tracking_error", _dark_layout(fig_te, 200), t0)
 
 # ----------------------------------------------------------------
 # ⚙️ Manage Portfolio
 # ----------------------------------------------------------------
-with tab2:
+@st.fragment
+def render_manage(fund: str):
     st.subheader("⚙️ Manage Portfolio")
     with st.form("add_stock_form"):
+        new_fund = st.text_input("Fund", value=fund, help="Type a new name to start another fund")
         c1, c2, c3 = st.columns([1,6,2])
         with c1:
             new_sym = st.text_input("Symbol", placeholder="RELIANCE")
@@ -632,8 +946,8 @@ with tab2:
             new_alloc = st.number_input("Allocation %", min_value=0.01, max_value=100.0, value=1.0, step=0.1)
         add = st.form_submit_button("➕ Add / Update")
         if add:
-            if new_sym and new_url:
-                save_stock(new_sym.upper().strip(), new_url.strip(), float(new_alloc))
+            if new_sym and new_url and new_fund.strip():
+                save_stock(new_fund.strip(), new_sym.upper().strip(), new_url.strip(), float(new_alloc))
                 st.markdown(f"""
                 <div style="
                     background: linear-gradient(135deg, rgba(0, 229, 255, 0.1) 0%, rgba(0, 184, 212, 0.05) 100%);
@@ -647,7 +961,7 @@ with tab2:
                     gap: 0.75rem;
                 ">
                     <span style="font-size: 1.25rem;">✅</span>
-                    <span style="color: rgba(255, 255, 255, 0.9); font-weight: 500;">Saved {new_sym.upper().strip()}</span>
+                    <span style="color: rgba(255, 255, 255, 0.9); font-weight: 500;">Saved {html.escape(new_sym.upper().strip())}</span>
                 </div>
                 """, unsafe_allow_html=True)
                 st.rerun()
@@ -665,22 +979,25 @@ with tab2:
                     gap: 0.75rem;
                 ">
                     <span style="font-size: 1.25rem;">⚠️</span>
-                    <span style="color: rgba(255, 255, 255, 0.9); font-weight: 500;">Please fill symbol and URL</span>
+                    <span style="color: rgba(255, 255, 255, 0.9); font-weight: 500;">Please fill fund, symbol and URL</span>
                 </div>
                 """, unsafe_allow_html=True)
 
+    render_import(fund)
+
     st.subheader("Existing Stocks")
     portfolio_df = load_portfolio_df()
+    portfolio_df = portfolio_df[portfolio_df["fund"] == fund].set_index("symbol")
     if not portfolio_df.empty:
         portfolio_df = portfolio_df.sort_values(by="allocation", ascending=False)
         for sym, r in portfolio_df.iterrows():
             with st.expander(f"{sym} — {r['allocation']:.2f}%"):
-                url_in = st.text_input("URL", value=r["url"], key=f"url_{sym}")
-                alloc_in = st.number_input("Allocation %", value=float(r["allocation"]), key=f"alloc_{sym}")
+                url_in = st.text_input("URL", value=r["url"], key=f"url_{fund}_{sym}")
+                alloc_in = st.number_input("Allocation %", value=float(r["allocation"]), key=f"alloc_{fund}_{sym}")
                 col1, col2 = st.columns(2)
                 with col1:
-                    if st.button("💾 Update", key=f"update_{sym}"):
-                        save_stock(sym, url_in, float(alloc_in))
+                    if st.button("💾 Update", key=f"update_{fund}_{sym}"):
+                        save_stock(fund, sym, url_in, float(alloc_in))
                         st.markdown("""
                         <div style="
                             background: linear-gradient(135deg, rgba(0, 229, 255, 0.1) 0%, rgba(0, 184, 212, 0.05) 100%);
@@ -699,8 +1016,8 @@ with tab2:
                         """, unsafe_allow_html=True)
                         st.rerun()
                 with col2:
-                    if st.button("🗑 Delete", key=f"delete_{sym}"):
-                        delete_stock(sym)
+                    if st.button("🗑 Delete", key=f"delete_{fund}_{sym}"):
+                        delete_stock(fund, sym)
                         st.markdown("""
                         <div style="
                             background: linear-gradient(135deg, rgba(0, 229, 255, 0.1) 0%, rgba(0, 184, 212, 0.05) 100%);
@@ -733,4 +1050,56 @@ with tab2:
         </div>
         """, unsafe_allow_html=True)
 
+def render_import(fund: str):
+    """Replace a fund's holdings from the AMC's monthly portfolio disclosure."""
+    with st.expander("📥 Import from portfolio disclosure"):
+        upload = st.file_uploader("AMC portfolio file (.xlsx or .csv)", type=["xlsx", "csv"], key="import_file")
+        target = st.text_input("Fund", value=fund, key="import_fund")
+        master = st.text_input("NSE security master (EQUITY_L.csv path or URL)", value=SECURITY_MASTER,
+                               key="import_master")
+        if upload is None:
+            st.session_state.pop("import_plan", None)
+            return
+        sheets = sheet_names(upload, upload.name)
+        sheet = st.selectbox("Sheet", sheets, key="import_sheet") if len(sheets) > 1 else None
+        if st.button("🔍 Preview changes", key="import_preview"):
+            try:
+                upload.seek(0)
+                st.session_state["import_plan"] = (target.strip(), *plan_import(upload, sheet, target.strip(), master))
+            except Exception as e:
+                st.session_state.pop("import_plan", None)
+                st.error(f"Could not read the disclosure: {e}")
+
+        plan = st.session_state.get("import_plan")
+        if not plan:
+            return
+        target_fund, diff, unmapped = plan
+        st.caption(f"{target_fund}: {len(diff.inserts)} to add, {len(diff.updates)} to update, "
+                   f"{len(diff.deletes)} to remove, {len(diff.kept)} kept, {diff.unchanged} unchanged")
+        changes = ([{"Change": "add", "Symbol": r["symbol"], "Allocation %": r["allocation"], "Was %": None}
+                    for r in diff.inserts]
+                   + [{"Change": "update", "Symbol": n["symbol"], "Allocation %": n["allocation"],
+                       "Was %": float(o["allocation"])} for o, n in diff.updates]
+                   + [{"Change": "remove", "Symbol": r["symbol"], "Allocation %": None,
+                       "Was %": float(r["allocation"])} for r in diff.deletes])
+        if changes:
+            st.dataframe(pd.DataFrame(changes), hide_index=True, use_container_width=True)
+        if unmapped:
+            st.warning("No NSE symbol found for: " + ", ".join(
+                f"{l.name or l.isin} ({l.weight:.2f}%)" for l in unmapped) + ". Add them by hand if needed.")
+        if diff.kept:
+            st.info("Not removed while those lines are unresolved: "
+                    + ", ".join(r["symbol"] for r in diff.kept) + ".")
+        if not diff.empty and st.button("✅ Apply import", key="import_apply"):
+            apply_import(target_fund, diff)
+            st.session_state.pop("import_plan", None)
+            st.rerun()
+
+with tab1:
+    render_portfolio(fund)
+
+with tab_history:
+    render_history(fund)
 
+with tab2:
+    render_manage(fund)
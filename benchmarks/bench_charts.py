@@ -0,0 +1,62 @@
+# benchmarks/bench_charts.py — History chart payloads: full daily series vs chart_data
+#
+#   python benchmarks/bench_charts.py [--years 1 5 20] [--stocks 50]
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import plotly.express as px
+import plotly.graph_objects as go
+
+from chart_data import bucket_heatmap, line
+
+
+def make_history(days: int, stocks: int):
+    rnd = np.random.default_rng(7)
+    dates = np.busday_offset("2000-01-03", np.arange(days), roll="forward")
+    returns = rnd.normal(0.05, 1.5, (days, stocks)).astype(np.float32)
+    return dates, returns
+
+
+def full_figures(dates, returns) -> list:
+    x = dates.astype("datetime64[ns]")
+    cumulative = (np.cumprod(1 + returns.mean(axis=1) / 100) - 1) * 100
+    trend = go.Figure([go.Scatter(x=x, y=(np.cumprod(1 + returns[:, j] / 100) - 1) * 100) for j in range(3)])
+    return [go.Figure(go.Scatter(x=x, y=cumulative)), trend,
+            px.imshow(returns.T, x=dates.astype(object), aspect="auto")]
+
+
+def reduced_figures(dates, returns) -> list:
+    cumulative = (np.cumprod(1 + returns.mean(axis=1) / 100) - 1) * 100
+    trend = go.Figure([line(dates, (np.cumprod(1 + returns[:, j] / 100) - 1) * 100) for j in range(3)])
+    buckets, block, _ = bucket_heatmap(dates, returns)
+    return [go.Figure(line(dates, cumulative)), trend,
+            px.imshow(block.T, x=buckets.astype(object), aspect="auto")]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--years", type=float, nargs="+", default=[1, 5, 20])
+    ap.add_argument("--stocks", type=int, default=50)
+    args = ap.parse_args()
+
+    print(f"{'years':>6} {'variant':>8} {'build':>10} {'to_json':>10} {'bytes':>12}")
+    for years in args.years:
+        dates, returns = make_history(int(years * 252), args.stocks)
+        for name, fn in (("full", full_figures), ("reduced", reduced_figures)):
+            t0 = time.perf_counter()
+            figs = fn(dates, returns)
+            t1 = time.perf_counter()
+            size = sum(len(f.to_json()) for f in figs)
+            t2 = time.perf_counter()
+            print(f"{years:>6g} {name:>8} {(t1 - t0) * 1e3:>8.1f}ms {(t2 - t1) * 1e3:>8.1f}ms {size:>12,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# benchmarks/bench_extract.py — per-page parse cost: old parsers vs quote_extract
+#
+#   python benchmarks/bench_extract.py                   # synthetic Screener-shaped pages
+#   python benchmarks/bench_extract.py --pages saved/    # directory of saved .html pages
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from quote_extract import extract_quote
+from benchmarks.sample_pages import make_pages
+
+
+def old_app_parse(html: str) -> float:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "lxml")
+    m = re.search(r"[+-]?[0-9]+\.[0-9]+(?=%)", soup.get_text())
+    if m:
+        return float(m.group())
+    m2 = re.search(r"[+-]?[0-9]+(?=\s?%)", soup.get_text())
+    if m2:
+        return float(m2.group())
+    return 0.0
+
+
+def old_daily_parse(text: str) -> float:
+    m = re.search(r"[+-]?[0-9]+\.[0-9]+(?=%)", text)
+    if m:
+        return float(m.group())
+    m2 = re.search(r"[+-]?[0-9]+(?=\s?%)", text)
+    if m2:
+        return float(m2.group())
+    return 0.0
+
+
+def new_parse(html: str) -> float:
+    return extract_quote(html).change_pct
+
+
+def load_pages(args) -> list:
+    if args.pages:
+        return [p.read_text(encoding="utf-8", errors="replace")
+                for p in sorted(Path(args.pages).glob("*.html"))]
+    return [html for html, _, _ in make_pages(args.n).values()]
+
+
+def bench(fn, pages, repeat) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for html in pages:
+            fn(html)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(pages) * 1e6   # µs per page
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", help="directory of saved Screener .html pages")
+    ap.add_argument("--n", type=int, default=50, help="synthetic page count")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    pages = load_pages(args)
+    if not pages:
+        sys.exit("No pages to benchmark.")
+    avg_kb = sum(len(p) for p in pages) / len(pages) / 1024
+    print(f"{len(pages)} pages, avg {avg_kb:.0f} KB")
+
+    contenders = [("quote_extract", new_parse), ("daily regex (old)", old_daily_parse)]
+    try:
+        import bs4, lxml  # noqa: F401
+        contenders.append(("app bs4+lxml (old)", old_app_parse))
+    except ImportError:
+        print("bs4/lxml not installed (pip install -r requirements-dev.txt) — skipping the old app parser")
+
+    base = None
+    for name, fn in contenders:
+        us = bench(fn, pages, args.repeat)
+        base = base or us
+        print(f"{name:<22} {us:>10.1f} µs/page  ({us / base:.1f}x)")
+
+    fell_back = sum(extract_quote(p).fallback for p in pages)
+    if fell_back:
+        print(f"⚠️ {fell_back}/{len(pages)} pages used the fallback heuristic")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# benchmarks/bench_holdings_table.py — holdings grid: per-row st.markdown vs one payload
+#
+#   python benchmarks/bench_holdings_table.py [--sizes 30 300 3000] [--streamlit]
+#
+# Reports build time, number of st.markdown deltas and payload bytes. With
+# --streamlit it also times a full script run of each variant through
+# streamlit.testing's AppTest.
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from holdings_table import render_holdings_html
+
+
+def old_payloads(df_live) -> list:
+    """The pre-refactor markup: header block, one block per row, closing tag."""
+    out = ["""
+        <div style="
+            background: rgba(26, 31, 58, 0.4);
+            border-radius: 16px;
+            border: 1px solid rgba(0, 229, 255, 0.2);
+            padding: 1rem;
+            margin: 1rem 0;
+        ">
+            <div style="display: grid; grid-template-columns: 2fr 1.5fr 1.5fr 1.5fr; gap: 1rem; padding: 0.75rem 1rem; background: linear-gradient(135deg, rgba(0, 229, 255, 0.2) 0%, rgba(0, 184, 212, 0.15) 100%); border-radius: 8px; margin-bottom: 0.5rem;">
+                <div style="color: #00e5ff; font-weight: 600; text-transform: uppercase; letter-spacing: 0.5px; font-size: 0.85rem;">Stock</div>
+                <div style="color: #00e5ff; font-weight: 600; text-transform: uppercase; letter-spacing: 0.5px; font-size: 0.85rem; text-align: right;">Return</div>
+                <div style="color: #00e5ff; font-weight: 600; text-transform: uppercase; letter-spacing: 0.5px; font-size: 0.85rem; text-align: right;">Weight</div>
+                <div style="color: #00e5ff; font-weight: 600; text-transform: uppercase; letter-spacing: 0.5px; font-size: 0.85rem; text-align: right;">Contribution</div>
+            </div>
+        """]
+    for idx, (stock, row) in enumerate(df_live.iterrows()):
+        return_val = row['Return']
+        return_color = "#00e5ff" if return_val > 0 else "#ff5252"
+        bg_color = "rgba(26, 31, 58, 0.3)" if idx % 2 == 0 else "rgba(26, 31, 58, 0.5)"
+        out.append(f"""
+            <div style="display: grid; grid-template-columns: 2fr 1.5fr 1.5fr 1.5fr; gap: 1rem; padding: 0.75rem 1rem; background: {bg_color}; border-radius: 8px; margin-bottom: 0.25rem; transition: all 0.2s ease;" onmouseover="this.style.background='rgba(0, 229, 255, 0.08)'; this.style.transform='scale(1.005)'" onmouseout="this.style.background='{bg_color}'; this.style.transform='scale(1)'">
+                <div style="color: rgba(255, 255, 255, 0.95); font-weight: 500;">{stock}</div>
+                <div style="color: {return_color}; font-weight: 600; text-align: right;">{return_val:+.2f}%</div>
+                <div style="color: rgba(255, 255, 255, 0.9); text-align: right;">{row['Weight']:.2f}%</div>
+                <div style="color: rgba(255, 255, 255, 0.9); text-align: right;">{row['Contribution']:+.3f}%</div>
+            </div>
+            """)
+    out.append("</div>")
+    return out
+
+
+def new_payloads(df_live) -> list:
+    return [render_holdings_html(df_live)]
+
+
+def make_frame(n: int) -> pd.DataFrame:
+    rnd = np.random.default_rng(7)
+    ret = rnd.uniform(-5, 5, n)
+    weight = rnd.uniform(0.1, 5, n)
+    return pd.DataFrame(
+        {"Return": ret, "Weight": weight, "Contribution": ret * weight / weight.sum()},
+        index=pd.Index([f"SYM{i:05d}" for i in range(n)], name="Stock"),
+    ).sort_values("Weight", ascending=False)
+
+
+def _app_script():
+    import sys
+    import streamlit as st
+    sys.path.insert(0, st.session_state["repo"])
+    from benchmarks.bench_holdings_table import make_frame, new_payloads, old_payloads
+    build = new_payloads if st.session_state["mode"] == "new" else old_payloads
+    for payload in build(make_frame(st.session_state["n"])):
+        st.markdown(payload, unsafe_allow_html=True)
+
+
+def time_streamlit(n: int, mode: str) -> float:
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_function(_app_script, default_timeout=600)
+    at.session_state["repo"] = str(Path(__file__).resolve().parent.parent)
+    at.session_state["mode"] = mode
+    at.session_state["n"] = n
+    t0 = time.perf_counter()
+    at.run()
+    return (time.perf_counter() - t0) * 1e3
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[30, 300, 3000])
+    ap.add_argument("--streamlit", action="store_true", help="also time a real script run")
+    args = ap.parse_args()
+
+    print(f"{'holdings':>9} {'variant':>8} {'build':>10} {'deltas':>7} {'bytes':>11}"
+          + (f" {'script run':>11}" if args.streamlit else ""))
+    for n in args.sizes:
+        df = make_frame(n)
+        for name, fn in (("old", old_payloads), ("new", new_payloads)):
+            t0 = time.perf_counter()
+            payloads = fn(df)
+            build_ms = (time.perf_counter() - t0) * 1e3
+            size = sum(len(p.encode("utf-8")) for p in payloads)
+            line = f"{n:>9} {name:>8} {build_ms:>8.2f}ms {len(payloads):>7} {size:>11,}"
+            if args.streamlit:
+                line += f" {time_streamlit(n, name):>9.0f}ms"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# benchmarks/bench_portfolio_calc.py — portfolio_calc vs the old iterrows loops
+#
+#   python benchmarks/bench_portfolio_calc.py [--sizes 50 500 5000] [--funds 5 25]
+#
+# The second table compares grouping the holdings per fund in Python before one
+# compute_portfolio() call each with fund_matrix() + compute_funds(), which makes
+# the same calls over slices of the sparse fund × symbol matrix (each fund holds
+# ~2/3 of the symbols).
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from funds import compute_funds, fund_matrix
+from portfolio_calc import compute_portfolio, history_rows
+
+
+def old_app_loop(portfolio_df, returns):
+    total_alloc = portfolio_df["allocation"].sum()
+    rows, total_weighted = [], 0.0
+    for sym, r in portfolio_df.iterrows():
+        ret = returns[sym]
+        allocation_val = float(r["allocation"])
+        norm = allocation_val / total_alloc if total_alloc > 0 else 0
+        contrib = ret * norm
+        total_weighted += contrib
+        rows.append({"Stock": sym, "Return": ret, "Weight": allocation_val, "Contribution": contrib})
+    df_live = pd.DataFrame(rows).set_index("Stock")
+    return total_weighted, (df_live["Return"] > 0).sum(), df_live["Return"].idxmax()
+
+
+def old_daily_loop(df, returns):
+    total_alloc = df["allocation"].sum()
+    rows, weighted_total_decimal = [], 0.0
+    for _, row in df.iterrows():
+        ret_percent = returns[row["symbol"]]
+        alloc_percent = float(row["allocation"])
+        norm = alloc_percent / total_alloc if total_alloc > 0 else 0.0
+        contrib_decimal = ret_percent / 100.0 * norm
+        weighted_total_decimal += contrib_decimal
+        rows.append({"date": "2025-01-01", "symbol": row["symbol"], "ret": round(ret_percent, 2),
+                     "allocation": alloc_percent, "contribution": round(contrib_decimal * 100, 3)})
+    return round(weighted_total_decimal * 100, 2), rows
+
+
+def new_compute(df, returns):
+    result = compute_portfolio(df["symbol"], [returns[s] for s in df["symbol"]], df["allocation"])
+    return result, history_rows(result, "2025-01-01")
+
+
+def per_fund_loop(holdings, returns):
+    by_fund = {}
+    for fund, sym, alloc in holdings:
+        by_fund.setdefault(fund, []).append((sym, alloc))
+    return {f: compute_portfolio([s for s, _ in h], [returns[s] for s, _ in h], [a for _, a in h])
+            for f, h in by_fund.items()}
+
+
+def matrix_pass(holdings, returns):
+    m = fund_matrix(holdings)
+    return compute_funds(m, [returns[s] for s in m.symbols])
+
+
+def bench(fn, *args, repeat=5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1e3   # ms
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 5000])
+    ap.add_argument("--funds", type=int, nargs="+", default=[5, 25])
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    rnd = np.random.default_rng(7)
+    print(f"{'holdings':>9} {'app loop':>12} {'daily loop':>12} {'vectorized':>12}")
+    for n in args.sizes:
+        symbols = [f"SYM{i:05d}" for i in range(n)]
+        returns = dict(zip(symbols, rnd.uniform(-5, 5, n).round(2).tolist()))
+        df = pd.DataFrame({"symbol": symbols, "allocation": rnd.uniform(0.1, 5, n)})
+        indexed = df.set_index("symbol")
+
+        # Sanity: all three agree on the stored total
+        total_daily, _ = old_daily_loop(df, returns)
+        result, _ = new_compute(df, returns)
+        assert abs(round(result.total, 2) - total_daily) <= 0.01, (result.total, total_daily)
+
+        t_app = bench(old_app_loop, indexed, returns, repeat=args.repeat)
+        t_daily = bench(old_daily_loop, df, returns, repeat=args.repeat)
+        t_new = bench(new_compute, df, returns, repeat=args.repeat)
+        print(f"{n:>9} {t_app:>10.2f}ms {t_daily:>10.2f}ms {t_new:>10.2f}ms")
+
+    print(f"\n{'symbols':>9} {'funds':>6} {'holdings':>9} {'grouped':>12} {'matrix':>12}")
+    for n in args.sizes:
+        symbols = [f"SYM{i:05d}" for i in range(n)]
+        returns = dict(zip(symbols, rnd.uniform(-5, 5, n).round(2).tolist()))
+        for f in args.funds:
+            holdings = [(f"F{k}", s, float(a)) for k in range(f)
+                        for s, a, h in zip(symbols, rnd.uniform(0.1, 5, n), rnd.random(n) < 2 / 3) if h]
+            loop, mat = per_fund_loop(holdings, returns), matrix_pass(holdings, returns)
+            assert all(abs(loop[k].total - mat[k].total) < 1e-9 for k in loop)
+            t_loop = bench(per_fund_loop, holdings, returns, repeat=args.repeat)
+            t_mat = bench(matrix_pass, holdings, returns, repeat=args.repeat)
+            print(f"{n:>9} {f:>6} {len(holdings):>9} {t_loop:>10.2f}ms {t_mat:>10.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# benchmarks/bench_startup.py — cold-start import cost of the daily job and the dashboard
+#
+#   python benchmarks/bench_startup.py [--runs 5] [--top 8]
+#
+# Each target is imported in a fresh interpreter under `python -X importtime`.
+# "daily_fetch" is everything the headless job loads before doing any work;
+# "dashboard" is app.py's module-level code up to st.set_page_config, i.e. what
+# a cold server process imports before the first element is drawn. Streamlit
+# itself is reported separately because the server has it loaded already.
+# Medians over --runs, plus the heaviest top-level packages and the import
+# cost of known heavy dependencies wherever they got pulled in (Streamlit
+# itself loads stub parts of plotly and pyarrow).
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY = ("pandas", "pandas_market_calendars", "plotly", "supabase", "pyarrow", "bs4", "matplotlib")
+
+
+def _dashboard_prelude() -> str:
+    src = (ROOT / "app.py").read_text(encoding="utf-8")
+    cut = src.index("st.set_page_config(")
+    return src[:cut]
+
+
+TARGETS = {
+    "daily_fetch": "import daily_fetch",
+    "dashboard": _dashboard_prelude(),
+}
+
+
+def _importtime(code: str):
+    # Placeholder credentials so older app.py versions that build the client at import still run
+    env = {"SUPABASE_URL": "http://127.0.0.1:54321", "SUPABASE_KEY": "bench", **os.environ}
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    if proc.returncode:
+        raise RuntimeError(proc.stderr[-2000:])
+    top = defaultdict(int)    # root package -> cumulative µs of its top-level imports
+    loaded = {}             # module -> cumulative µs
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue   # header
+        mod = name.strip()
+        loaded[mod] = int(cumulative)
+        if name.startswith(" ") and not name.startswith("  "):   # top-level entry
+            top[mod.split(".")[0]] += int(cumulative)
+    return wall, top, loaded
+
+
+def bench(name: str, code: str, runs: int, n_top: int):
+    _importtime(code)   # warm the bytecode cache
+    walls, totals, tops, loaded = [], [], [], {}
+    for _ in range(runs):
+        wall, top, loaded = _importtime(code)
+        walls.append(wall)
+        totals.append(sum(top.values()))
+        tops.append(top)
+
+    pkgs = {k: statistics.median(t.get(k, 0) for t in tops) for k in set().union(*tops)}
+    print(f"\n{name}")
+    print(f"  process wall  {statistics.median(walls) * 1e3:8.1f} ms (interpreter start included)")
+    print(f"  imports       {statistics.median(totals) / 1e3:8.1f} ms")
+    if "streamlit" in pkgs:
+        print(f"  excl. streamlit {(statistics.median(totals) - pkgs['streamlit']) / 1e3:6.1f} ms")
+    for pkg, us in sorted(pkgs.items(), key=lambda kv: -kv[1])[:n_top]:
+        print(f"    {pkg:<28} {us / 1e3:8.1f} ms")
+    heavy = [f"{h} {loaded[h] / 1e3:.1f} ms" for h in HEAVY if h in loaded]
+    print("  heavy deps loaded: " + (", ".join(heavy) or "none"))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=8)
+    ap.add_argument("--targets", nargs="+", default=list(TARGETS), choices=list(TARGETS))
+    args = ap.parse_args()
+    for name in args.targets:
+        bench(name, TARGETS[name], args.runs, args.top)
+
+
+if __name__ == "__main__":
+    main()
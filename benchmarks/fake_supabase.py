@@ -0,0 +1,213 @@
+# benchmarks/fake_supabase.py — in-memory stand-in for the parts of the Supabase client we use
+#
+# Supports table(...).select/insert/upsert/delete with eq/neq/gt/gte/lt/lte/in_
+# filters (each negatable with .not_, as in postgrest-py), order, range/limit and count="exact", plus the save_daily_snapshots
+# and apply_holdings RPCs. An optional per-call latency makes round trips show
+# up in benchmarks.
+
+import copy
+import threading
+import time
+
+# Primary keys used when upsert() gets no on_conflict
+PRIMARY_KEYS = {
+    "stocks": ("fund", "symbol"),
+    "portfolio_snapshots": ("date", "fund"),
+    "mf_returns": ("date", "fund"),
+    "period_aggregates": ("fund", "period", "period_start", "symbol"),
+}
+
+
+class APIError(Exception):
+    def __init__(self, code, message):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.message = message
+
+
+class Result:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class Query:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.op = "select"
+        self.filters = []
+        self.orders = []
+        self.bounds = None
+        self.count = None
+        self.payload = None
+        self.on_conflict = None
+        self._negate = False
+
+    # ---------- Verbs ----------
+    def select(self, *columns, count=None):
+        self.op, self.count = "select", count
+        return self
+
+    def insert(self, payload):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict=None, **_):
+        self.op, self.payload, self.on_conflict = "upsert", payload, on_conflict
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    # ---------- Modifiers ----------
+    @property
+    def not_(self):
+        """Negate the next filter: .not_.in_("symbol", [...])."""
+        self._negate = True
+        return self
+
+    def _add(self, keep):
+        if self._negate:
+            self._negate, keep = False, (lambda r, f=keep: not f(r))
+        self.filters.append(keep)
+        return self
+
+    def _filter(self, col, pred):
+        return self._add(lambda r: r.get(col) is not None and pred(r.get(col)))
+
+    def eq(self, col, v):
+        return self._add(lambda r: r.get(col) == v)
+
+    def neq(self, col, v):
+        return self._add(lambda r: r.get(col) != v)
+
+    def gt(self, col, v):
+        return self._filter(col, lambda x: x > v)
+
+    def gte(self, col, v):
+        return self._filter(col, lambda x: x >= v)
+
+    def lt(self, col, v):
+        return self._filter(col, lambda x: x < v)
+
+    def lte(self, col, v):
+        return self._filter(col, lambda x: x <= v)
+
+    def in_(self, col, values):
+        values = set(values)
+        return self._add(lambda r: r.get(col) in values)
+
+    def order(self, col, desc=False):
+        self.orders.append((col, desc))
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end)
+        return self
+
+    def limit(self, n):
+        self.bounds = (0, n - 1)
+        return self
+
+    # ---------- Execution ----------
+    def execute(self) -> Result:
+        self.client._round_trip()
+        with self.client._lock:
+            rows = self.client.tables.setdefault(self.table, [])
+            if self.op == "select":
+                out = [r for r in rows if all(f(r) for f in self.filters)]
+                for col, desc in reversed(self.orders):
+                    out.sort(key=lambda r: (r.get(col) is None, r.get(col)), reverse=desc)
+                total = len(out)
+                if self.bounds:
+                    out = out[self.bounds[0]:self.bounds[1] + 1]
+                return Result(copy.deepcopy(out), total if self.count else None)
+            if self.op == "delete":
+                gone = [r for r in rows if all(f(r) for f in self.filters)]
+                rows[:] = [r for r in rows if not all(f(r) for f in self.filters)]
+                return Result(gone)
+            payload = self.payload if isinstance(self.payload, list) else [self.payload]
+            if self.op == "insert":
+                rows.extend(self.client._stamp(dict(r)) for r in payload)
+            else:
+                keys = (self.on_conflict.split(",") if self.on_conflict
+                        else PRIMARY_KEYS.get(self.table, ("id",)))
+                self.client._upsert(rows, payload, keys)
+            return Result(copy.deepcopy(payload))
+
+
+class RPC:
+    def __init__(self, client, name, params):
+        self.client, self.name, self.params = client, name, params
+
+    def execute(self) -> Result:
+        self.client._round_trip()
+        fn = self.client.functions.get(self.name)
+        if fn is None:
+            raise APIError("PGRST202", f"Could not find the function public.{self.name}")
+        with self.client._lock:
+            return Result(fn(self.client, **self.params))
+
+
+def _save_daily_snapshots(client, p_days):
+    history = client.tables.setdefault("history", [])
+    snaps = client.tables.setdefault("portfolio_snapshots", [])
+    for d in p_days:
+        held = {r["symbol"] for r in d["rows"]}
+        history[:] = [r for r in history
+                      if r["date"] != d["date"] or r.get("fund") != d["fund"] or r["symbol"] in held]
+        client._upsert(history, [{**r, "date": d["date"], "fund": d["fund"]} for r in d["rows"]],
+                       ("date", "fund", "symbol"))
+        client._upsert(snaps, [{"date": d["date"], "fund": d["fund"], "portfolio_return": d["portfolio_return"]}],
+                       ("date", "fund"))
+    return None
+
+
+def _apply_holdings(client, p_fund, p_upserts, p_deletes):
+    stocks = client.tables.setdefault("stocks", [])
+    gone = set(p_deletes)
+    stocks[:] = [r for r in stocks if r.get("fund") != p_fund or r["symbol"] not in gone]
+    client._upsert(stocks, [{**r, "fund": p_fund} for r in p_upserts], ("fund", "symbol"))
+    return None
+
+
+class FakeSupabase:
+    def __init__(self, tables=None, latency: float = 0.0, with_rpc: bool = True, stamp_updates: bool = False):
+        self.tables = tables if tables is not None else {}
+        self.latency = latency
+        self.stamp_updates = stamp_updates   # set updated_at on every written row, like the readme's trigger
+        self._clock = 0
+        self.calls = 0
+        self._lock = threading.RLock()
+        self.functions = ({"save_daily_snapshots": _save_daily_snapshots, "apply_holdings": _apply_holdings}
+                          if with_rpc else {})
+
+    def _round_trip(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _stamp(self, row: dict) -> dict:
+        if self.stamp_updates:
+            self._clock += 1
+            row["updated_at"] = f"2000-01-01T00:00:00.{self._clock:06d}+00:00"
+        return row
+
+    def _upsert(self, rows, payload, keys):
+        index = {tuple(r.get(k) for k in keys): i for i, r in enumerate(rows)}
+        for r in payload:
+            k = tuple(r.get(c) for c in keys)
+            if k in index:
+                rows[index[k]] = self._stamp({**rows[index[k]], **r})
+            else:
+                index[k] = len(rows)
+                rows.append(self._stamp(dict(r)))
+
+    def table(self, name) -> Query:
+        return Query(self, name)
+
+    def rpc(self, name, params) -> RPC:
+        return RPC(self, name, params)
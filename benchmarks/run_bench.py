@@ -0,0 +1,195 @@
+# benchmarks/run_bench.py — end-to-end benchmark of the daily job and the dashboard compute path
+#
+#   python benchmarks/run_bench.py [--sizes 30 300 3000] [--latency 0.05 --jitter 0.02]
+#                                  [--funds 1] [--pages DIR] [--db-latency 0.02] [--out FILE] [--compare FILE]
+#
+# Runs offline: company pages come from a local stub server (stub_screener.py)
+# and Supabase is replaced by an in-memory fake (fake_supabase.py). For each
+# size it runs daily_fetch.run() and one QuotePoller.poll() + holdings render,
+# each against an empty quote cache, and records throughput, per-stage
+# p50/p95/p99 from the metrics registry and peak memory. Results are written as
+# JSON to benchmarks/results/; --compare prints the change against an earlier file.
+# With --funds N the symbols are spread over N overlapping funds (each holds
+# about two thirds of them); scrapes should still equal the unique symbol count.
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import daily_fetch
+import metrics
+import quote_cache
+from benchmarks.fake_supabase import FakeSupabase
+from benchmarks.sample_pages import make_pages
+from benchmarks.stub_screener import StubScreener, load_recorded
+from holdings_table import render_holdings_html
+from nse_calendar import previous_trading_day
+from quote_poller import QuotePoller
+
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+STAGES = ("quote", "fetch", "parse", "compute", "db", "db_write", "render")
+
+
+def _pages_for(n: int, recorded: dict) -> dict:
+    """{SYMBOL: html}, cycling recorded pages when there are fewer than n."""
+    if not recorded:
+        return {s: p[0] for s, p in make_pages(n).items()}
+    src = list(recorded.values())
+    return {f"SYM{i:04d}": src[i % len(src)] for i in range(n)}
+
+
+def _holdings(srv: StubScreener, symbols, funds: int = 1) -> list:
+    rng = np.random.default_rng(7)
+    rows = []
+    for f in range(funds):
+        held = np.ones(len(symbols), dtype=bool) if funds == 1 else rng.random(len(symbols)) < 2 / 3
+        alloc = rng.uniform(0.5, 5.0, len(symbols)).round(2)
+        rows += [{"fund": f"Fund {f + 1}", "symbol": s, "url": srv.url_for(s), "allocation": float(a)}
+                 for s, a, h in zip(symbols, alloc, held) if h]
+    return rows
+
+
+@contextlib.contextmanager
+def _fresh_cache():
+    with tempfile.TemporaryDirectory() as tmp:
+        quote_cache._default = quote_cache.QuoteCache(str(Path(tmp) / "quotes.db"))
+        try:
+            yield
+        finally:
+            quote_cache._default = None
+
+
+def _measure(fn, n: int) -> dict:
+    """Run fn() with a clean registry and empty quote cache; collect timings and memory."""
+    metrics.registry.reset()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    with _fresh_cache(), contextlib.redirect_stdout(io.StringIO()):
+        fn()
+    wall = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    report = metrics.registry.report()
+    stages = {k: {m: v[m] for m in ("count", "p50_ms", "p95_ms", "p99_ms", "max_ms")}
+              for k, v in report["stages"].items() if k in STAGES}
+    return {
+        "symbols": n,
+        "wall_s": round(wall, 3),
+        "symbols_per_s": round(n / wall, 2) if wall else None,
+        "stages": stages,
+        "counters": report["counters"],
+        "failures": report["counters"].get("symbol_failures", 0),
+        "peak_traced_mb": round(peak / 2**20, 2),
+    }
+
+
+def bench_size(n: int, args, recorded: dict) -> dict:
+    pages = _pages_for(n, recorded)
+    srv = StubScreener(pages, args.latency, args.jitter).start()
+    try:
+        holdings = _holdings(srv, list(pages), args.funds)
+        day = previous_trading_day(date.today() + timedelta(days=1))
+
+        db = FakeSupabase({"stocks": [dict(h) for h in holdings]}, latency=args.db_latency)
+        run_args = argparse.Namespace(bhavcopy=None, deadline=daily_fetch.FETCH_DEADLINE)
+        daily = _measure(lambda: daily_fetch.run(run_args, db, today=day), n)
+        daily["db_round_trips"] = db.calls
+        daily["history_rows"] = len(db.tables.get("history", []))
+        daily["scrapes"] = srv.hits
+
+        def app_path():
+            poller = QuotePoller(lambda: [(h["fund"], h["symbol"], h["url"], h["allocation"]) for h in holdings])
+            snap = poller.poll()
+            r = next(iter(snap.results.values()))
+            df_live = pd.DataFrame(
+                {"Return": r.returns, "Weight": r.allocations, "Contribution": r.contributions},
+                index=pd.Index(r.symbols, name="Stock"),
+            ).sort_values(by="Weight", ascending=False)
+            with metrics.timed("render"):
+                render_holdings_html(df_live)
+
+        app = _measure(app_path, n)
+        app["scrapes"] = srv.hits - daily["scrapes"]
+        return {"holdings": len(holdings), "daily_fetch": daily, "app_compute": app, "server_hits": srv.hits}
+    finally:
+        srv.shutdown()
+        srv.server_close()
+
+
+def _compare(current: dict, baseline_path: str):
+    base = json.loads(Path(baseline_path).read_text())
+    print(f"\nvs {baseline_path}")
+    for size, phases in current["results"].items():
+        for phase, cur in phases.items():
+            old = base.get("results", {}).get(size, {}).get(phase)
+            if not isinstance(cur, dict) or not old:
+                continue
+            parts = []
+            for key in ("wall_s", "peak_traced_mb"):
+                if old.get(key):
+                    parts.append(f"{key} {(cur[key] / old[key] - 1) * 100:+.1f}%")
+            for stage in ("quote", "db_write"):
+                a, b = cur["stages"].get(stage, {}).get("p95_ms"), old.get("stages", {}).get(stage, {}).get("p95_ms")
+                if a and b:
+                    parts.append(f"{stage} p95 {(a / b - 1) * 100:+.1f}%")
+            print(f"  {size:>5} {phase:<12} " + "  ".join(parts))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[30, 300, 3000])
+    ap.add_argument("--latency", type=float, default=0.05, help="stub server latency per page (s)")
+    ap.add_argument("--jitter", type=float, default=0.02)
+    ap.add_argument("--funds", type=int, default=1, help="number of overlapping funds")
+    ap.add_argument("--db-latency", type=float, default=0.02, help="fake Supabase latency per call (s)")
+    ap.add_argument("--pages", help="directory of recorded <SYMBOL>.html pages")
+    ap.add_argument("--out", help="JSON output (default benchmarks/results/bench-<timestamp>.json)")
+    ap.add_argument("--compare", help="earlier results JSON to diff against")
+    args = ap.parse_args()
+
+    metrics.SAMPLE_WINDOW = max(metrics.SAMPLE_WINDOW, 2 * max(args.sizes))
+    recorded = load_recorded(args.pages) if args.pages else {}
+
+    out = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "results": {},
+    }
+    print(f"{'size':>5} {'phase':<12} {'wall s':>8} {'sym/s':>8} {'quote p50':>10} {'p95':>8} {'p99':>8} {'peak MB':>8}")
+    for n in args.sizes:
+        res = bench_size(n, args, recorded)
+        out["results"][str(n)] = res
+        for phase in ("daily_fetch", "app_compute"):
+            r = res[phase]
+            q = r["stages"].get("quote", {})
+            print(f"{n:>5} {phase:<12} {r['wall_s']:>8.2f} {r['symbols_per_s']:>8.1f} "
+                  f"{q.get('p50_ms') or 0:>10.1f} {q.get('p95_ms') or 0:>8.1f} {q.get('p99_ms') or 0:>8.1f} "
+                  f"{r['peak_traced_mb']:>8.1f}")
+    out["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    path = Path(args.out) if args.out else RESULTS_DIR / f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(out, indent=2))
+    print(f"\nMax RSS {out['max_rss_mb']} MB; results written to {path}")
+    if args.compare:
+        _compare(out, args.compare)
+
+
+if __name__ == "__main__":
+    main()
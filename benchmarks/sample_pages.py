@@ -0,0 +1,74 @@
+# benchmarks/sample_pages.py — Screener-shaped company pages for offline benchmarks
+#
+# Real saved pages can be used instead by pointing the benchmarks at a directory
+# of .html files; these stand-ins only reproduce the markup the extractor anchors
+# on, padded with ratio/results tables so the quote sits in a realistically sized page.
+
+import random
+
+
+def render_company_page(symbol: str, price: float, change_pct: float, table_rows: int = 120) -> str:
+    direction = "up" if change_pct >= 0 else "down"
+    ratios = "\n".join(
+        f'<li class="flex flex-space-between"><span class="name">Ratio {i}</span>'
+        f'<span class="nowrap value"><span class="number">{i * 1.7:,.2f}</span> %</span></li>'
+        for i in range(12)
+    )
+    rows = "\n".join(
+        "<tr>" + f'<td class="text">Line {r}</td>'
+        + "".join(f"<td>{(r * 13 + c * 7) % 997:,}</td>" for c in range(12))
+        + f"<td>{(r % 40) - 20}%</td></tr>"
+        for r in range(table_rows)
+    )
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+  <meta charset="UTF-8">
+  <title>{symbol} share price | About {symbol} | Key Insights - Screener</title>
+  <link rel="stylesheet" href="/static/CACHE/css/output.css">
+  <script>window.ga = window.ga || function(){{}}; /* 50% sampled */</script>
+</head>
+<body class="light flex-column">
+  <nav class="u-full-width"><a href="/">Screener</a></nav>
+  <main class="flex-grow container">
+    <div class="card card-large" id="top">
+      <div class="flex flex-space-between flex-gap-8">
+        <h1 class="h2 shrink-text">{symbol} Ltd</h1>
+        <div class="font-size-18 strong line-height-14">
+          <div class="flex flex-align-center">
+            <span>₹ {price:,.2f}</span>
+            <span class="font-size-12 {direction} margin-left-4">
+              <i class="icon-circle-{direction}"></i>
+              {change_pct:.2f}%
+            </span>
+          </div>
+          <div class="ink-600 font-size-11 font-weight-500">17 Oct - close price</div>
+        </div>
+      </div>
+      <ul id="top-ratios">
+{ratios}
+      </ul>
+    </div>
+    <section id="quarters" class="card card-large">
+      <table class="data-table responsive-text-nowrap">
+        <tbody>
+{rows}
+        </tbody>
+      </table>
+    </section>
+  </main>
+</body>
+</html>
+"""
+
+
+def make_pages(n: int, seed: int = 7) -> dict:
+    """Return {symbol: (html, price, change_pct)} for n synthetic symbols."""
+    rnd = random.Random(seed)
+    pages = {}
+    for i in range(n):
+        sym = f"SYM{i:04d}"
+        price = round(rnd.uniform(50, 5000), 2)
+        pct = round(rnd.uniform(-5, 5), 2)
+        pages[sym] = (render_company_page(sym, price, pct), price, pct)
+    return pages
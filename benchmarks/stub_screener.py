@@ -0,0 +1,94 @@
+# benchmarks/stub_screener.py — local stand-in for screener.in company pages
+#
+#   python benchmarks/stub_screener.py --symbols 300 --latency 0.05 --jitter 0.02
+#
+# Serves /company/<SYMBOL>/ from a directory of recorded pages (<SYMBOL>.html)
+# or from Screener-shaped synthetic pages, after a configurable delay.
+
+import argparse
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.sample_pages import make_pages
+
+
+class StubScreener(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, pages: dict, latency: float = 0.05, jitter: float = 0.02, port: int = 0):
+        """pages: {SYMBOL: html}"""
+        self.pages = {k.upper(): v.encode("utf-8") for k, v in pages.items()}
+        self.latency = latency
+        self.jitter = jitter
+        self.hits = 0
+        self._lock = threading.Lock()
+        super().__init__(("127.0.0.1", port), _Handler)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def url_for(self, symbol: str) -> str:
+        return f"{self.base_url}/company/{symbol}/"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, like the real site
+
+    def do_GET(self):
+        srv = self.server
+        with srv._lock:
+            srv.hits += 1
+        delay = srv.latency + random.uniform(-srv.jitter, srv.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        parts = [p for p in self.path.split("/") if p]
+        body = srv.pages.get(parts[1].upper()) if len(parts) >= 2 and parts[0] == "company" else None
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def load_recorded(directory: str) -> dict:
+    return {p.stem.upper(): p.read_text(encoding="utf-8", errors="replace")
+            for p in Path(directory).glob("*.html")}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", help="directory of recorded <SYMBOL>.html pages")
+    ap.add_argument("--symbols", type=int, default=30, help="synthetic symbol count")
+    ap.add_argument("--latency", type=float, default=0.05)
+    ap.add_argument("--jitter", type=float, default=0.02)
+    ap.add_argument("--port", type=int, default=8765)
+    args = ap.parse_args()
+
+    pages = load_recorded(args.pages) if args.pages else {s: p[0] for s, p in make_pages(args.symbols).items()}
+    srv = StubScreener(pages, args.latency, args.jitter, args.port)
+    print(f"Serving {len(pages)} pages at {srv.base_url}/company/<SYMBOL>/")
+    srv.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# bhavcopy.py — end-of-day quotes for every holding from one NSE bhavcopy file
+#
+# Understands the three cash-market layouts NSE has published:
+#   legacy   cm<DD><MON><YYYY>bhav.csv(.zip)        SYMBOL, SERIES, CLOSE, PREVCLOSE, TIMESTAMP
+#   full     sec_bhavdata_full_<DDMMYYYY>.csv       SYMBOL, SERIES, CLOSE_PRICE, PREV_CLOSE, DATE1
+#   UDiFF    BhavCopy_NSE_CM_0_0_0_<YYYYMMDD>_F_0000.csv(.zip)
+#                                                   TckrSymb, SctySrs, ClsPric, PrvsClsgPric, TradDt
+# The source can be a local path or an http(s) URL (e.g. a locally served copy).
+# load_security_master() reads NSE's EQUITY_L.csv (or a UDiFF bhavcopy) to map
+# ISINs and company names to NSE symbols for the holdings importer.
+
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+
+from quote_extract import Quote
+
+_COLUMNS = {
+    "symbol": ("SYMBOL", "TckrSymb"),
+    "series": ("SERIES", "SctySrs"),
+    "close": ("CLOSE", "CLOSE_PRICE", "ClsPric"),
+    "prev_close": ("PREVCLOSE", "PREV_CLOSE", "PrvsClsgPric"),
+    "date": ("TIMESTAMP", "DATE1", "TradDt"),
+    "isin": ("ISIN", "ISIN NUMBER"),
+    "name": ("NAME OF COMPANY", "FinInstrmNm"),
+}
+_DATE_FORMATS = ("%d-%b-%Y", "%Y-%m-%d", "%d-%m-%Y", "%d%b%Y")
+# Equity series in order of preference when a symbol trades in several
+_SERIES_RANK = {"EQ": 0, "BE": 1, "BZ": 2, "SM": 3, "ST": 4}
+_SLUG_RE = re.compile(r"/company/([^/]+)/?")
+_NAME_NOISE_RE = re.compile(r"\b(LIMITED|LTD)\b|[^A-Z0-9 ]")
+
+
+def nse_symbol_candidates(symbol: str, url: str = "") -> list:
+    """Tickers to look up for a holding: its symbol, then the Screener URL slug."""
+    out = [symbol.strip().upper()]
+    m = _SLUG_RE.search(url or "")
+    if m and m.group(1).upper() not in out:
+        out.append(m.group(1).upper())
+    return out
+
+
+def normalise_name(name: str) -> str:
+    """Company name reduced for matching: "Info Edge (India) Ltd." -> "INFO EDGE INDIA"."""
+    s = name.upper().replace("&", " AND ")
+    return " ".join(_NAME_NOISE_RE.sub(" ", s).split())
+
+
+def _header_columns(header: list) -> dict:
+    return {key: next((header.index(n) for n in names if n in header), None)
+            for key, names in _COLUMNS.items()}
+
+
+def _parse_date(s: str):
+    s = s.strip()
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            pass
+    return None
+
+
+def open_lines(source: str):
+    """Yield text lines of a file (path or URL), unzipping if needed; URLs are streamed."""
+    if source.startswith(("http://", "https://")):
+        from fetch_client import get_session
+        r = get_session().get(source, timeout=60, stream=True)
+        r.raise_for_status()
+        if source.endswith(".zip"):
+            data = io.BytesIO(r.content)   # zip needs a seekable file
+        else:
+            for line in r.iter_lines(decode_unicode=True):
+                yield line
+            return
+    else:
+        if not source.endswith(".zip"):
+            with open(source, encoding="utf-8-sig", newline="") as f:
+                yield from f
+            return
+        data = source
+
+    with zipfile.ZipFile(data) as zf:
+        name = next(n for n in zf.namelist() if n.lower().endswith(".csv"))
+        with zf.open(name) as raw:
+            yield from io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+
+
+def load_bhavcopy(source: str, wanted=None):
+    """Stream-parse a bhavcopy into (trade_date, {symbol: Quote}).
+
+    Only symbols in `wanted` are kept when it is given. Percent change is
+    1.23 meaning 1.23%, computed from close and previous close.
+    """
+    wanted = {s.upper() for s in wanted} if wanted else None
+    reader = csv.reader(open_lines(source))
+    header = [h.strip().lstrip("\ufeff") for h in next(reader)]
+    col = _header_columns(header)
+    missing = [k for k in ("symbol", "close", "prev_close") if col[k] is None]
+    if missing:
+        raise ValueError(f"Unrecognised bhavcopy header, missing {missing}: {header}")
+
+    trade_date, best = None, {}
+    for row in reader:
+        if not row:
+            continue
+        sym = row[col["symbol"]].strip().upper()
+        if wanted is not None and sym not in wanted:
+            continue
+        series = row[col["series"]].strip().upper() if col["series"] is not None else "EQ"
+        rank = _SERIES_RANK.get(series)
+        if rank is None or (sym in best and best[sym][0] <= rank):
+            continue
+        try:
+            close = float(row[col["close"]])
+            prev = float(row[col["prev_close"]])
+        except ValueError:
+            continue
+        if trade_date is None and col["date"] is not None:
+            trade_date = _parse_date(row[col["date"]])
+        pct = round((close / prev - 1) * 100, 2) if prev else 0.0
+        best[sym] = (rank, Quote(close, prev, pct))
+
+    return trade_date, {sym: q for sym, (_, q) in best.items()}
+
+
+def quotes_for_holdings(source: str, holdings, expect_date: date = None) -> dict:
+    """Map {holding symbol: Quote} for [(symbol, url), ...] covered by the file.
+
+    Returns {} when the file is for a different trading day than `expect_date`.
+    """
+    holdings = list(holdings)
+    candidates = {sym: nse_symbol_candidates(sym, url) for sym, url in holdings}
+    wanted = {c for cands in candidates.values() for c in cands}
+    trade_date, quotes = load_bhavcopy(source, wanted)
+    if expect_date and trade_date and trade_date != expect_date:
+        print(f"Bhavcopy is for {trade_date}, not {expect_date}; ignoring it.")
+        return {}
+    out = {}
+    for sym, cands in candidates.items():
+        q = next((quotes[c] for c in cands if c in quotes), None)
+        if q is not None:
+            out[sym] = q
+    return out
+
+
+def load_security_master(source: str):
+    """({isin: symbol}, {normalised company name: symbol}) from EQUITY_L.csv or a UDiFF bhavcopy.
+
+    When an ISIN trades in several series the equity series wins.
+    """
+    reader = csv.reader(open_lines(source))
+    header = [h.strip().lstrip("\ufeff") for h in next(reader)]
+    col = _header_columns(header)
+    if col["symbol"] is None or col["isin"] is None:
+        raise ValueError(f"Unrecognised security master header: {header}")
+
+    by_isin, by_name = {}, {}
+    for row in reader:
+        if not row:
+            continue
+        series = row[col["series"]].strip().upper() if col["series"] is not None else "EQ"
+        rank = _SERIES_RANK.get(series)
+        if rank is None:
+            continue
+        sym = row[col["symbol"]].strip().upper()
+        isin = row[col["isin"]].strip().upper()
+        if isin not in by_isin or rank < by_isin[isin][0]:
+            by_isin[isin] = (rank, sym)
+        if col["name"] is not None:
+            by_name.setdefault(normalise_name(row[col["name"]]), sym)
+    return {i: sym for i, (_, sym) in by_isin.items()}, by_name
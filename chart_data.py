@@ -0,0 +1,173 @@
+# chart_data.py — server-side reduction of chart data before it reaches the browser
+#
+# Line series are cut to the visible range, then downsampled to at most
+# CHART_MAX_POINTS per trace. LTTB is the default; min/max per bucket is used
+# where extremes must survive, e.g. drawdowns. A trace that still carries more
+# than CHART_GL_THRESHOLD points is drawn with WebGL (scattergl). Heatmaps wider
+# than CHART_MAX_HEATMAP_COLUMNS trading days are bucketed into weekly, monthly or
+# quarterly compounded returns. So a figure's JSON stays about the same size
+# whatever the history length. record() keeps each chart's point count and
+# build/render time for the debug panel, plus its payload bytes when asked
+# (serialising the figure again costs about as much as rendering it).
+
+import os
+import threading
+from typing import NamedTuple
+
+import numpy as np
+
+import metrics
+
+# ---------- Config ----------
+MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "800"))          # per line trace
+GL_THRESHOLD = int(os.getenv("CHART_GL_THRESHOLD", "500"))      # points per trace before switching to WebGL
+MAX_HEATMAP_COLUMNS = int(os.getenv("CHART_MAX_HEATMAP_COLUMNS", "120"))
+
+
+# ---------- Downsampling ----------
+def _numeric(x: np.ndarray) -> np.ndarray:
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[ns]").astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+
+def lttb_indices(x, y, n: int) -> np.ndarray:
+    """Indices of the n points Largest-Triangle-Three-Buckets keeps (first and last always)."""
+    size = len(y)
+    if n >= size or n < 3:
+        return np.arange(size)
+    x, y = _numeric(np.asarray(x)), np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, size - 1, n - 1).astype(np.intp)   # n - 2 buckets between the end points
+    # Centroid of each bucket (plus the last point), the third corner of every triangle
+    counts = np.diff(np.r_[edges, size])
+    cx = np.add.reduceat(x, edges) / counts
+    cy = np.add.reduceat(y, edges) / counts
+    out = np.empty(n, dtype=np.intp)
+    out[0], out[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        xa, ya = x[a], y[a]
+        area = np.abs((xa - cx[i + 1]) * (y[lo:hi] - ya) - (xa - x[lo:hi]) * (cy[i + 1] - ya))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def minmax_indices(y, n: int) -> np.ndarray:
+    """Indices of the end points and each bucket's minimum and maximum ((n - 2) // 2 buckets), in order."""
+    size = len(y)
+    if n >= size or n < 4:
+        return np.arange(size)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(0, size, (n - 2) // 2 + 1).astype(np.intp)
+    keep = [0, size - 1]
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi > lo:
+            keep += [lo + int(np.argmin(y[lo:hi])), lo + int(np.argmax(y[lo:hi]))]
+    return np.unique(keep)
+
+
+def visible(x, start=None, end=None) -> slice:
+    """Slice of the sorted x values within [start, end]."""
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        start = np.datetime64(start, "ns") if start is not None else None
+        end = np.datetime64(end, "ns") if end is not None else None
+        x = x.astype("datetime64[ns]")
+    lo = np.searchsorted(x, start) if start is not None else 0
+    hi = np.searchsorted(x, end, side="right") if end is not None else len(x)
+    return slice(lo, hi)
+
+
+def downsample(x, y, n: int = MAX_POINTS, method: str = "lttb", start=None, end=None):
+    """(x, y) cut to [start, end], without NaNs, reduced to at most n points."""
+    x, y = np.asarray(x), np.asarray(y, dtype=np.float64)
+    window = visible(x, start, end)
+    x, y = x[window], y[window]
+    ok = ~np.isnan(y)
+    if not ok.all():
+        x, y = x[ok], y[ok]
+    idx = minmax_indices(y, n) if method == "minmax" else lttb_indices(x, y, n)
+    if len(idx) < len(y):
+        metrics.inc("chart_points_dropped", len(y) - len(idx))
+        x, y = x[idx], y[idx]
+    return x, y
+
+
+def _compact(x: np.ndarray, y: np.ndarray):
+    """Smaller JSON: whole-day timestamps as "YYYY-MM-DD", values as float32 (base64 in the figure)."""
+    if np.issubdtype(x.dtype, np.datetime64):
+        ns = x.astype("datetime64[ns]")
+        if not (ns.astype(np.int64) % 86_400_000_000_000).any():
+            x = np.datetime_as_string(ns, unit="D")
+    return x, y.astype(np.float32)
+
+
+def line(x, y, name: str = None, method: str = "lttb", start=None, end=None, n: int = MAX_POINTS, **kwargs):
+    """A Scatter trace of the downsampled series; Scattergl when it still has many points."""
+    import plotly.graph_objects as go
+    x, y = _compact(*downsample(x, y, n, method, start, end))
+    trace = go.Scattergl if len(x) > GL_THRESHOLD else go.Scatter
+    return trace(x=x, y=y, name=name, **kwargs)
+
+
+# ---------- Heatmaps ----------
+def _bucket_keys(days: np.ndarray):
+    d = days.astype(np.int64)   # days since 1970-01-01, a Thursday
+    yield "W", (d + 3) // 7     # ISO weeks, starting Monday
+    months = days.astype("datetime64[M]").astype(np.int64)
+    yield "M", months
+    yield "Q", months // 3
+
+
+def bucket_heatmap(dates, block, max_columns: int = MAX_HEATMAP_COLUMNS):
+    """(bucket start dates, (B, S) compounded % return per bucket, "D"/"W"/"M"/"Q").
+
+    block is (days, symbols) daily % returns, NaN where not held; a bucket is
+    NaN only if the stock wasn't held on any of its days.
+    """
+    days = np.asarray(dates, dtype="datetime64[D]")
+    if len(days) <= max_columns:
+        return days, np.asarray(block), "D"
+    for freq, keys in _bucket_keys(days):
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        if len(starts) <= max_columns:
+            break
+    r = np.asarray(block, dtype=np.float64)
+    held = ~np.isnan(r)
+    logs = np.add.reduceat(np.where(held, np.log1p(np.where(held, r, 0.0) / 100), 0.0), starts, axis=0)
+    counts = np.add.reduceat(held, starts, axis=0)
+    return days[starts], np.where(counts > 0, np.expm1(logs) * 100, np.nan), freq
+
+
+# ---------- Reporting ----------
+class ChartReport(NamedTuple):
+    traces: int
+    points: int           # x/y points or heatmap cells sent
+    webgl: bool
+    payload_bytes: int    # figure JSON; None unless measured
+    build_ms: float       # data reduction + figure construction
+    render_ms: float      # handing the figure to Streamlit (serialisation)
+
+
+reports = {}   # chart name -> latest ChartReport, for the debug panel
+_reports_lock = threading.Lock()
+
+
+def record(name: str, fig, build_ms: float, render_ms: float, payload: bool = False) -> ChartReport:
+    """Keep a chart's report; `payload` also measures its JSON size (only worth it when debugging)."""
+    points = 0
+    for t in fig.data:
+        z = getattr(t, "z", None)
+        points += int(np.size(z)) if z is not None else len(t.x if t.x is not None else [])
+    size = len(fig.to_json()) if payload else None
+    rep = ChartReport(len(fig.data), points, any(t.type == "scattergl" for t in fig.data), size,
+                      round(build_ms, 2), round(render_ms, 2))
+    metrics.registry.observe("chart_build", build_ms)
+    metrics.registry.observe("chart_render", render_ms)
+    if size is not None:
+        metrics.inc("chart_bytes", size)
+    with _reports_lock:
+        reports[name] = rep
+    return rep
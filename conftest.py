@@ -0,0 +1,96 @@
+# conftest.py — shared pytest fixtures: a fake Supabase holding a few funds' saved days
+#
+# Tests run against benchmarks/fake_supabase.py and write their caches under
+# pytest's tmp_path. The NSE calendar index goes to a per-session temp file.
+# `history_edit` is each way saved history changes between two loads; the
+# incremental caches are checked against a rebuild for every one of them.
+
+from datetime import date
+from typing import NamedTuple
+
+import numpy as np
+import pytest
+
+import nse_calendar
+from benchmarks.fake_supabase import FakeSupabase
+from history_store import load_table
+from portfolio_calc import compute_portfolio, history_rows, snapshot_return
+from snapshot_writer import save_days
+
+FUNDS = ("Alpha Fund", "Beta Fund")
+SYMBOLS = [f"S{i:02d}" for i in range(12)]
+
+
+@pytest.fixture(scope="session", autouse=True)
+def calendar(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(nse_calendar, "INDEX_PATH", str(tmp_path_factory.mktemp("calendar") / "nse_trading_days.json"))
+        mp.setattr(nse_calendar, "_index", None)
+        yield
+
+
+@pytest.fixture(scope="session")
+def trading_days(calendar) -> list:
+    """A bit over a year of NSE trading days, enough to fill the longest rolling window."""
+    return nse_calendar.trading_days_between(date(2023, 1, 2), date(2024, 3, 28))
+
+
+def make_day(day: date, fund: str, seed: int = 0) -> dict:
+    """A day dict for save_days(): random returns for a holding set that drifts over time."""
+    rnd = np.random.default_rng([day.toordinal(), FUNDS.index(fund), seed])
+    held = SYMBOLS[day.toordinal() % 4:][:9]
+    result = compute_portfolio(held, rnd.uniform(-3, 3, len(held)).round(2), rnd.uniform(1, 10, len(held)).round(2))
+    return {"date": day.isoformat(), "fund": fund, "portfolio_return": snapshot_return(result),
+            "rows": history_rows(result, day, fund)}
+
+
+def day_dicts(dates, seed: int = 0, funds=FUNDS) -> list:
+    """A day dict per fund per date; another seed re-saves the same days with different values."""
+    return [make_day(d, f, seed) for d in dates for f in funds]
+
+
+def nav_rows(days: list) -> list:
+    return [{"date": d["date"], "fund": d["fund"], "mf_return": round(d["portfolio_return"] * 0.9 + 0.05, 2)}
+            for d in days]
+
+
+def save(client, days: list):
+    """save_days() plus the funds' NAV returns for those days."""
+    save_days(client, days)
+    client.table("mf_returns").upsert(nav_rows(days), on_conflict="date,fund").execute()
+
+
+def fake(days=()) -> FakeSupabase:
+    """A FakeSupabase that already holds the given day dicts and their NAV returns."""
+    client = FakeSupabase(stamp_updates=True)
+    tables = {
+        "history": [dict(r) for d in days for r in d["rows"]],
+        "portfolio_snapshots": [{k: d[k] for k in ("date", "fund", "portfolio_return")} for d in days],
+        "mf_returns": nav_rows(days),
+    }
+    for table, rows in tables.items():
+        client.table(table).insert(rows).execute()
+    return client
+
+
+class HistoryEdit(NamedTuple):
+    initial: list   # day dicts saved before the first load
+    steps: list     # [[day dicts]], saved one batch at a time with a load after each
+
+
+@pytest.fixture(params=["new_days", "resaved_last_day", "changed_older_day"])
+def history_edit(request, trading_days) -> HistoryEdit:
+    if request.param == "new_days":
+        return HistoryEdit(day_dicts(trading_days[:-5]), [day_dicts([d]) for d in trading_days[-5:]])
+    if request.param == "resaved_last_day":
+        return HistoryEdit(day_dicts(trading_days), [day_dicts(trading_days[-1:], seed=1)])
+    return HistoryEdit(day_dicts(trading_days), [day_dicts(trading_days[10:11], seed=1)])
+
+
+@pytest.fixture
+def frames(tmp_path):
+    """frames(client) -> (snapshots, history, mf_returns) through the local history mirror."""
+    def load(client):
+        return tuple(load_table(client, t, tmp_path / "history")
+                     for t in ("portfolio_snapshots", "history", "mf_returns"))
+    return load
@@ -1,12 +1,21 @@
 # daily_fetch.py — Supabase version (Fixed % calculation)
 
-import requests, re, time, os
+# Keep module load light: no pandas, and the Supabase client is imported on first use.
+import argparse, json, math, os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import date
-import pandas as pd
-import pandas_market_calendars as mcal
-from bs4 import BeautifulSoup
-from supabase import create_client, Client
+from pathlib import Path
 from dotenv import load_dotenv
+import metrics
+from fetch_engine import fetch_within
+from quote_cache import get_quote, last_quote, refetch_quote
+from nse_calendar import is_nse_trading_day, session_bounds, trading_days_between
+from bhavcopy import quotes_for_holdings
+from funds import MIN_COVERAGE, compute_funds, fund_matrix, fund_of, priced_share, symbol_urls
+from portfolio_calc import history_rows, snapshot_return
+from snapshot_writer import save_days
+from amfi_nav import AMFI_NAV_SOURCE, SCHEMES, ingest_nav
+from period_aggregates import rebuild_aggregates, update_aggregates
 
 # Load .env for local development
 load_dotenv()
@@ -15,114 +24,302 @@ load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-print("DBG URL:", SUPABASE_URL)
-print("DBG KEY:", SUPABASE_KEY[:6] + "..." if SUPABASE_KEY else None)
+# ---------- Fetch budget ----------
+FETCH_DEADLINE = float(os.getenv("FETCH_DEADLINE", "120"))     # seconds for all Screener scrapes
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("❌ Missing SUPABASE_URL or SUPABASE_KEY")
+# ---------- Backfill ----------
+# Historical bhavcopy per day: a path or URL with strftime codes, e.g. bhav/sec_bhavdata_full_%d%m%Y.csv
+BACKFILL_SOURCE = os.getenv("BACKFILL_SOURCE")
+BACKFILL_BATCH = int(os.getenv("BACKFILL_BATCH", "20"))        # days per save_days call
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", "0")) or None   # default: one per CPU
+CHECKPOINT_PATH = os.getenv("BACKFILL_CHECKPOINT", ".cache/backfill_checkpoint.json")
+PAGE_SIZE = 1000   # PostgREST default max-rows
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-# ---------- Helpers ----------
-def fetch_stock_return(url: str) -> float:
-    """Scrape stock % change from screener.in, return 1.23 meaning 1.23%"""
-    try:
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        r = requests.get(url, headers=headers, timeout=10)
-        r.raise_for_status()
+def get_client():
+    print("DBG URL:", SUPABASE_URL)
+    print("DBG KEY:", SUPABASE_KEY[:6] + "..." if SUPABASE_KEY else None)
 
-        text = r.text
-        m = re.search(r"[+-]?[0-9]+\.[0-9]+(?=%)", text)
-        if m:
-            return float(m.group())
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise ValueError("❌ Missing SUPABASE_URL or SUPABASE_KEY")
 
-        m2 = re.search(r"[+-]?[0-9]+(?=\s?%)", text)
-        if m2:
-            return float(m2.group())
+    from supabase import create_client
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
 
-        return 0.0
-    except Exception as e:
-        print(f"Fetch error for {url}: {e}")
-        return 0.0
+# ---------- Helpers ----------
+def load_holdings(supabase) -> list:
+    """Every fund's holdings as (fund, symbol, url, allocation) rows."""
+    with metrics.timed("db"):
+        res = supabase.table("stocks").select("*").execute()
+    return [(fund_of(r), r["symbol"], r["url"], float(r["allocation"])) for r in res.data or []]
+
+def fetch_returns(holdings, deadline: float = FETCH_DEADLINE, day: date = None):
+    """Scrape % change (1.23 meaning 1.23%) for [(symbol, url), ...] within `deadline` seconds.
+
+    Returns ({symbol: pct}, {stale symbols}). A symbol that can't be fetched
+    falls back to its cached quote only if that was fetched during `day`'s
+    session (default today); otherwise it is left out rather than zeroed or
+    given an earlier day's move.
+    """
+    session_open = session_bounds(day or date.today())[0]
+    returns, stale = {}, set()
+    for r in fetch_within(holdings, get_quote, deadline, hedge=refetch_quote,
+                          fallback=lambda url: last_quote(url, since=session_open)):
+        if r.value is None:
+            print(f"Fetch error for {r.key}: {r.error}")
+            continue
+        if r.stale:
+            print(f"Using last cached quote for {r.key} ({r.error})")
+            stale.add(r.key)
+        returns[r.key] = r.value.change_pct
+    return returns, stale
+
+
+# ---------- Backfill ----------
+def recorded_days(supabase, start: date, end: date) -> dict:
+    """{date: {funds with a snapshot}} for [start, end]."""
+    out, offset = {}, 0
+    while True:
+        with metrics.timed("db"):
+            page = (supabase.table("portfolio_snapshots").select("date,fund")
+                    .gte("date", start.isoformat()).lte("date", end.isoformat())
+                    .order("date").order("fund").range(offset, offset + PAGE_SIZE - 1).execute().data or [])
+        for r in page:
+            out.setdefault(date.fromisoformat(r["date"][:10]), set()).add(fund_of(r))
+        if len(page) < PAGE_SIZE:
+            return out
+        offset += PAGE_SIZE
+
+
+def _read_checkpoint(path: str) -> dict:
+    try:
+        return json.loads(Path(path).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_checkpoint(path: str, key: str, done):
+    data = _read_checkpoint(path)
+    if done is None:
+        data.pop(key, None)
+    else:
+        data[key] = sorted(done)
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, indent=1))
+    os.replace(tmp, p)   # never leave a half-written checkpoint behind
+
+
+def backfill_day(day: date, source: str, holdings: list, funds: set):
+    """(day, [day dicts for save_days], [skipped funds]) for one past day, from its bhavcopy.
+
+    Runs in a worker process. Today's holdings and weights are applied to the
+    day's closing prices.
+    """
+    urls = symbol_urls(holdings)
+    quotes = quotes_for_holdings(day.strftime(source), urls.items(), expect_date=day)
+    matrix = fund_matrix(holdings)
+    vector = [quotes[s].change_pct if s in quotes else math.nan for s in matrix.symbols]
+    coverage = dict(zip(matrix.funds.tolist(), priced_share(matrix, vector).tolist()))
+    days, skipped = [], []
+    for fund, result in compute_funds(matrix, vector).items():
+        if fund not in funds:
+            continue
+        if coverage[fund] < MIN_COVERAGE:
+            skipped.append(fund)
+            continue
+        days.append({"date": day, "fund": fund, "portfolio_return": snapshot_return(result),
+                     "rows": history_rows(result, day, fund)})
+    return day, days, skipped
+
+
+def backfill(args, supabase=None):
+    """Compute and save every trading day in [START, END] that is missing a snapshot.
+
+    Days are computed in a process pool and saved BACKFILL_BATCH at a time.
+    Saved days are checkpointed, so re-running the same command after an
+    interruption resumes where it stopped; the checkpoint is cleared once the
+    range completes. Period aggregates overlapping the range are then rebuilt.
+    """
+    start, end = args.backfill
+    if not args.source:
+        raise SystemExit("❌ --backfill needs a historical bhavcopy source (--source or BACKFILL_SOURCE)")
+    supabase = supabase or get_client()
+    holdings = load_holdings(supabase)
+    if not holdings:
+        print("No stocks configured. Exiting.")
+        return
+    funds = {h[0] for h in holdings}
+
+    key = f"{start}:{end}:{'all' if args.overwrite else 'missing'}"
+    done = set(_read_checkpoint(args.checkpoint).get(key, []))
+    recorded = {} if args.overwrite else recorded_days(supabase, start, end)
+    todo = []
+    for day in trading_days_between(start, end):
+        missing = funds - recorded.get(day, set())
+        if day.isoformat() not in done and missing:
+            todo.append((day, missing))
+    print(f"Backfill {start}..{end}: {len(todo)} trading days to compute"
+          + (f" (resuming, {len(done)} already done)" if done else ""))
+
+    pending, failed = [], []
+
+    def flush():
+        days = [d for _, ds in pending for d in ds]
+        if days:
+            save_days(supabase, days)   # idempotent, so a batch re-saved after a crash is harmless
+        done.update(day.isoformat() for day, _ in pending)
+        _write_checkpoint(args.checkpoint, key, done)
+        print(f"  saved {len(days)} snapshots for {len(pending)} days ({len(done)} days done)")
+        pending.clear()
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(backfill_day, day, args.source, holdings, missing): day for day, missing in todo}
+        for fut in as_completed(futures):
+            day = futures[fut]
+            try:
+                _, days, skipped = fut.result()
+            except Exception as e:
+                print(f"❌ {day}: {e}")
+                metrics.inc("backfill_failed")
+                failed.append(day)
+                continue
+            for fund in skipped:
+                print(f"  {day} {fund}: less than {MIN_COVERAGE:.0%} of the allocation priced; not saved")
+            metrics.inc("backfill_days")
+            pending.append((day, days))
+            if len(pending) >= BACKFILL_BATCH:
+                flush()
+        if pending:
+            flush()
+
+    if done:
+        # Days were saved out of order, so rebuild every period the range touched instead of folding
+        try:
+            print(f"Rebuilt {rebuild_aggregates(supabase, start, end)} period aggregate rows")
+        except Exception as e:
+            print(f"Period aggregates not rebuilt ({e}); run `python period_aggregates.py --rebuild {start} {end}`")
+    if failed:
+        raise SystemExit(f"❌ {len(failed)} days failed (e.g. {min(failed)}); re-run the same command to retry them")
+    _write_checkpoint(args.checkpoint, key, None)
+    print(f"✅ Backfill complete for {start}..{end}")
 
 
-def is_nse_trading_day(check_date: date) -> bool:
-    """Check if the day is an NSE trading day."""
+# ---------- Main ----------
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Record today's snapshot for every fund.")
+    ap.add_argument("--bhavcopy", default=os.getenv("BHAVCOPY_SOURCE"),
+                    help="NSE bhavcopy CSV/zip (path or URL); Screener is scraped only for symbols it misses")
+    ap.add_argument("--deadline", type=float, default=FETCH_DEADLINE,
+                    help="wall-clock budget in seconds for all Screener scrapes")
+    ap.add_argument("--nav", default=AMFI_NAV_SOURCE,
+                    help="AMFI NAV file (path or URL) for funds mapped in AMFI_SCHEMES")
+    ap.add_argument("--backfill", nargs=2, type=date.fromisoformat, metavar=("START", "END"),
+                    help="instead of today, fill every trading day in [START, END] missing a snapshot")
+    ap.add_argument("--source", default=BACKFILL_SOURCE,
+                    help="bhavcopy path/URL per day for --backfill, with strftime codes (e.g. bhav/%%Y%%m%%d.csv)")
+    ap.add_argument("--overwrite", action="store_true",
+                    help="with --backfill, recompute days that already have a snapshot (e.g. after adding holdings)")
+    ap.add_argument("--workers", type=int, default=BACKFILL_WORKERS, help="backfill worker processes")
+    ap.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="backfill progress file")
+    ap.add_argument("--metrics-json", default=os.getenv("METRICS_JSON", ".cache/metrics/daily_fetch.json"),
+                    help="where to write the JSON run report")
+    ap.add_argument("--prom-textfile", default=os.getenv("PROM_TEXTFILE"),
+                    help="optional Prometheus textfile (node_exporter textfile collector)")
+    args = ap.parse_args(argv)
     try:
-        cal = mcal.get_calendar("NSE")
-        sched = cal.schedule(start_date=check_date.isoformat(),
-                             end_date=check_date.isoformat())
-        return not sched.empty
-    except Exception as e:
-        print("Calendar lookup failed:", e)
-        return check_date.weekday() < 5   # fallback to Mon–Fri only
+        backfill(args) if args.backfill else run(args)
+    finally:
+        metrics.registry.write_json(args.metrics_json)
+        print(f"Run report written to {args.metrics_json}")
+        if args.prom_textfile:
+            metrics.registry.write_prometheus(args.prom_textfile)
 
 
-# ---------- Main ----------
-def main():
-    today = date.today()
+def run(args, supabase=None, today: date = None):
+    """Scrape live quotes and save them as `today`'s snapshot for every fund.
+
+    Live quotes only describe the current session, so there is no option to
+    record another day; past days go through --backfill. `today` is only for
+    the benchmark, whose stub Screener has no calendar.
+    """
+    today = today or date.today()
 
     if not is_nse_trading_day(today):
         print(f"{today} is NOT a trading day. Exiting.")
         return
+    supabase = supabase or get_client()
+
+    # The funds' own NAVs, to compare the estimates against; never fails the run
+    if SCHEMES and getattr(args, "nav", None):
+        try:
+            print(f"Saved {ingest_nav(supabase, args.nav)} NAV rows from {args.nav}")
+        except Exception as e:
+            print(f"NAV ingest failed: {e}")
 
-    # Load stocks from Supabase
-    res = supabase.table("stocks").select("*").execute()
-    df = pd.DataFrame(res.data)
+    # Load every fund's holdings from Supabase
+    holdings = load_holdings(supabase)
 
-    if df.empty:
+    if not holdings:
         print("No stocks configured. Exiting.")
         return
-
-    total_alloc = df["allocation"].sum()
-    rows = []
-    weighted_total_decimal = 0.0   # decimal internal calc
-
-    for _, row in df.iterrows():
-        sym = row["symbol"]
-        url = row["url"]
-        ret_percent = fetch_stock_return(url)    # example: 1.23
-        alloc_percent = float(row["allocation"])
-
-        norm = alloc_percent / total_alloc if total_alloc > 0 else 0.0
-
-        # Convert ret percent → decimal
-        ret_decimal = ret_percent / 100.0
-
-        # Weighted return in decimal
-        contrib_decimal = ret_decimal * norm
-
-        weighted_total_decimal += contrib_decimal
-
-        rows.append({
-            "date": today.isoformat(),           # Must be string
-            "symbol": sym,
-            "ret": round(ret_percent, 2),        # store as percent
-            "allocation": alloc_percent,
-            "contribution": round(contrib_decimal * 100, 3)  # store as percent
-        })
-
-        print(f"{sym}: ret={ret_percent:+.2f}%  alloc={alloc_percent:.1f}%")
-
-        time.sleep(0.1)
-
-    # Total portfolio return (percent)
-    portfolio_return_percent = round(weighted_total_decimal * 100, 2)
-
-    print(f"\nSaving {len(rows)} history rows to Supabase...")
-    print(f"Portfolio Return Today: {portfolio_return_percent:+.2f}%")
-
-    # Save snapshot (percent)
-    supabase.table("portfolio_snapshots").upsert({
-        "date": today.isoformat(),
-        "portfolio_return": portfolio_return_percent
-    }).execute()
-
-    # Insert history rows
-    supabase.table("history").insert(rows).execute()
-
-    print(f"✅ Snapshot saved for {today}")
-
+    # Each symbol is priced once, however many funds hold it
+    urls = symbol_urls(holdings)
+    matrix = fund_matrix(holdings)
+    print(f"{len(matrix.funds)} funds, {len(holdings)} holdings, {len(urls)} unique symbols")
+
+    bulk = {}
+    if args.bhavcopy:
+        try:
+            bulk = quotes_for_holdings(args.bhavcopy, urls.items(), expect_date=today)
+            print(f"Bhavcopy covered {len(bulk)}/{len(urls)} symbols")
+        except Exception as e:
+            print(f"Bhavcopy load failed, scraping everything: {e}")
+
+    returns = {sym: q.change_pct for sym, q in bulk.items()}
+    scraped, stale = fetch_returns([(s, u) for s, u in urls.items() if s not in bulk], args.deadline, today)
+    returns.update(scraped)
+    if stale:
+        metrics.registry.note("stale_symbols", sorted(stale))
+
+    # Holdings without a quote are left out, never recorded as 0%; a stale quote
+    # (fetched earlier in the session) is saved but doesn't count as priced
+    vector = [returns.get(s, math.nan) for s in matrix.symbols]
+    fresh = [math.nan if s in stale else v for s, v in zip(matrix.symbols, vector)]
+    coverage = dict(zip(matrix.funds.tolist(), priced_share(matrix, fresh).tolist()))
+    results = compute_funds(matrix, vector)
+
+    days, skipped = [], []
+    for fund, result in results.items():
+        if coverage[fund] < MIN_COVERAGE:
+            print(f"❌ {fund}: only {coverage[fund]:.0%} of the allocation could be priced; not saving")
+            skipped.append(fund)
+            continue
+        rows = history_rows(result, today, fund)
+        print(f"\n{fund}:")
+        for r in rows:
+            flag = "  (stale)" if r["symbol"] in stale else ""
+            print(f"  {r['symbol']}: ret={r['ret']:+.2f}%  alloc={r['allocation']:.1f}%{flag}")
+        if coverage[fund] < 1:
+            print(f"  ({coverage[fund]:.0%} of allocation freshly priced; unpriced holdings skipped, stale ones flagged)")
+        # Total portfolio return (percent)
+        portfolio_return_percent = snapshot_return(result)
+        print(f"  Portfolio Return Today: {portfolio_return_percent:+.2f}%")
+        days.append({"date": today, "fund": fund, "portfolio_return": portfolio_return_percent, "rows": rows})
+
+    if days:
+        print(f"\nSaving {sum(len(d['rows']) for d in days)} history rows for {len(days)} funds to Supabase...")
+        # Snapshots + history rows for every fund in one idempotent write (safe to re-run)
+        save_days(supabase, days)
+        print(f"✅ Snapshot saved for {today}")
+        # A failure here never fails the run: the next run sees the gap and recomputes those periods
+        try:
+            print(f"Updated {update_aggregates(supabase, days)} period aggregate rows")
+        except Exception as e:
+            print(f"Period aggregates not updated: {e}")
+    if skipped:
+        raise SystemExit(f"❌ Not saved for {today}: {', '.join(skipped)}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,79 @@
+# fetch_client.py — pooled keep-alive HTTP client for Screener scraping
+
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# ---------- Config ----------
+POOL_SIZE = int(os.getenv("FETCH_POOL_SIZE", "16"))
+TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "10"))
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class MemoryValidatorStore:
+    """Remembers ETag/Last-Modified and the parsed value per URL for this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, url: str):
+        with self._lock:
+            return self._entries.get(url)
+
+    def put(self, url: str, etag, last_modified, value):
+        with self._lock:
+            self._entries[url] = {"etag": etag, "last_modified": last_modified, "value": value}
+
+
+validator_store = MemoryValidatorStore()
+
+
+def get_session(pool_size: int = None) -> requests.Session:
+    """Return the shared session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            size = pool_size or POOL_SIZE
+            s = requests.Session()
+            s.headers.update(HEADERS)
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=size)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _session = s
+        return _session
+
+
+def fetch_parsed(url: str, parse, timeout: float = None, store=None):
+    """GET url and return parse(html).
+
+    Sends If-None-Match / If-Modified-Since when the page was seen before;
+    on 304 the body is never downloaded and the previous parsed value is reused.
+    """
+    store = store or validator_store
+    headers = {}
+    prev = store.get(url)
+    if prev:
+        if prev.get("etag"):
+            headers["If-None-Match"] = prev["etag"]
+        if prev.get("last_modified"):
+            headers["If-Modified-Since"] = prev["last_modified"]
+
+    with metrics.timed("fetch"):
+        r = get_session().get(url, headers=headers, timeout=timeout or TIMEOUT)
+    if r.status_code == 304 and prev:
+        metrics.inc("http_not_modified")
+        store.put(url, prev.get("etag"), prev.get("last_modified"), prev["value"])
+        return prev["value"]
+    r.raise_for_status()
+    metrics.inc("bytes_downloaded", len(r.content))
+    with metrics.timed("parse"):
+        value = parse(r.text)
+    store.put(url, r.headers.get("ETag"), r.headers.get("Last-Modified"), value)
+    return value
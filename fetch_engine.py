@@ -0,0 +1,252 @@
+# fetch_engine.py — concurrent quote fetching shared by the dashboard and the daily job
+#
+# fetch_within() runs concurrent fetches under a total deadline: failed
+# attempts are retried with jittered backoff, attempts that run past the
+# observed tail latency get a hedged duplicate, a per-host circuit breaker
+# stops hammering a failing site, and anything still missing when the budget
+# runs out falls back to its last known value, marked stale.
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+import metrics
+
+# ---------- Config ----------
+MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", "16"))
+MAX_PER_HOST = int(os.getenv("FETCH_MAX_PER_HOST", "6"))
+ATTEMPT_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "10"))
+RETRIES = int(os.getenv("FETCH_RETRIES", "2"))
+BACKOFF = 0.5                      # seconds, doubled per attempt, plus jitter
+HEDGE_AFTER = float(os.getenv("FETCH_HEDGE_AFTER", "2.0"))   # until enough latencies are seen
+HEDGE_MIN = 0.25
+HEDGE_FRACTION = 0.1               # at most ~10% extra requests from hedging
+BREAKER_FAILURES = int(os.getenv("FETCH_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("FETCH_BREAKER_COOLDOWN", "30"))
+
+
+class _HostLimiter:
+    """Caps the number of in-flight requests to any single host."""
+
+    def __init__(self, per_host: int):
+        self.per_host = max(1, per_host)
+        self._lock = threading.Lock()
+        self._sems = {}
+
+    def get(self, url: str) -> threading.Semaphore:
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            sem = self._sems.get(host)
+            if sem is None:
+                sem = self._sems[host] = threading.BoundedSemaphore(self.per_host)
+            return sem
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class DeadlineExceeded(TimeoutError):
+    """The caller's budget ran out; says nothing about the host."""
+
+
+class CircuitBreaker:
+    """Per-host breaker: opens after `threshold` consecutive failures and lets a
+    single trial request through once `cooldown` seconds have passed."""
+
+    def __init__(self, threshold: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._hosts = {}   # host -> [consecutive failures, opened_at, trial in flight]
+
+    def allow(self, url: str) -> bool:
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            state = self._hosts.setdefault(host, [0, 0.0, False])
+            if state[0] < self.threshold:
+                return True
+            if not state[2] and time.monotonic() - state[1] >= self.cooldown:
+                state[2] = True
+                return True
+            return False
+
+    def record(self, url: str, ok: bool):
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            state = self._hosts.setdefault(host, [0, 0.0, False])
+            if ok:
+                state[:] = [0, 0.0, False]
+                return
+            state[0] += 1
+            if state[0] >= self.threshold and (state[2] or state[0] == self.threshold):
+                metrics.inc("breaker_open")
+                state[1] = time.monotonic()
+            state[2] = False
+
+    def release(self, url: str):
+        """End a trial request without a verdict, so the next one may go through."""
+        with self._lock:
+            state = self._hosts.get(urlsplit(url).netloc.lower())
+            if state:
+                state[2] = False
+
+
+class FetchResult(NamedTuple):
+    key: str
+    value: object       # None only when nothing could be fetched or recalled
+    error: Exception    # last error, also set when value is stale
+    stale: bool         # value is the fallback's last known value, not a fresh fetch
+
+
+def _retryable(e: Exception) -> bool:
+    if isinstance(e, DeadlineExceeded):   # an OSError too, but retrying can't help
+        return False
+    resp = getattr(e, "response", None)
+    if resp is not None:
+        return resp.status_code == 429 or resp.status_code >= 500
+    # requests' exceptions and socket timeouts are OSErrors; parse errors are not worth repeating
+    return isinstance(e, OSError)
+
+
+class _LatencyTracker:
+    """Hedge delay: p95 of recent successful attempts, once there are enough of them."""
+
+    def __init__(self, default: float):
+        self.default = default
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=256)
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def hedge_after(self) -> float:
+        with self._lock:
+            if len(self._samples) < 20:
+                return self.default
+            s = sorted(self._samples)
+        return max(HEDGE_MIN, s[int(0.95 * (len(s) - 1))])
+
+
+def fetch_within(items, fetch, deadline: float, hedge=None, fallback=None,
+                 retries: int = RETRIES, hedge_after: float = None,
+                 max_workers: int = None, per_host: int = None, breaker: CircuitBreaker = None):
+    """Fetch every (key, url) pair within `deadline` seconds of wall time.
+
+    fetch(url, timeout) performs one attempt; hedge(url, timeout) is the
+    duplicate sent when an attempt is slower than the tail latency (defaults
+    to fetch); fallback(url) returns the last known value or None. Yields
+    FetchResult in completion order; the generator returns shortly after the
+    deadline even if attempts are still hanging. Pass the same `breaker` to
+    repeated calls (e.g. every poll) so a failing host stays backed off.
+    """
+    items = list(items)
+    if not items:
+        return
+    end = time.monotonic() + deadline
+    hedge = hedge or fetch
+    limiter = _HostLimiter(per_host or MAX_PER_HOST)
+    breaker = breaker or CircuitBreaker()
+    latency = _LatencyTracker(hedge_after if hedge_after is not None else HEDGE_AFTER)
+    workers = max(1, min(max_workers or MAX_WORKERS, len(items)))
+    counts = {"attempts": 0, "hedges": 0}
+    counts_lock = threading.Lock()
+    # Attempts run on their own pool so a worker can wait on (and hedge) them with a budget
+    attempts = ThreadPoolExecutor(max_workers=2 * workers, thread_name_prefix="fetch-attempt")
+
+    def attempt(fn, key, url, timeout):
+        sem = limiter.get(url)
+        if not sem.acquire(timeout=max(0.0, end - time.monotonic())):
+            raise DeadlineExceeded(f"no free connection to {urlsplit(url).netloc} before the deadline")
+        try:
+            with metrics.symbol(key):
+                t0 = time.monotonic()
+                value = fn(url, timeout)
+            latency.add(time.monotonic() - t0)
+            return value
+        finally:
+            sem.release()
+
+    def hedged(key, url):
+        timeout = min(ATTEMPT_TIMEOUT, max(0.1, end - time.monotonic()))
+        with counts_lock:
+            counts["attempts"] += 1
+        pending = {attempts.submit(attempt, fetch, key, url, timeout)}
+        done, pending = wait(pending, timeout=min(latency.hedge_after(), timeout))
+        if not done:
+            with counts_lock:
+                allowed = counts["hedges"] < max(1, HEDGE_FRACTION * counts["attempts"])
+                if allowed:
+                    counts["hedges"] += 1
+            if allowed and end - time.monotonic() > 0.1:
+                metrics.inc("fetch_hedge")
+                pending.add(attempts.submit(attempt, hedge, key, url, min(timeout, end - time.monotonic())))
+        error = None
+        while pending or done:
+            for fut in done:
+                if fut.exception() is None:
+                    return fut.result()
+                error = fut.exception()
+            if not pending:
+                break
+            done, pending = wait(pending, timeout=max(0.0, end - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded("fetch deadline exceeded")
+        raise error
+
+    def one(key, url) -> FetchResult:
+        error = None
+        with metrics.symbol(key), metrics.timed("quote"):
+            for n in range(retries + 1):
+                if end - time.monotonic() <= 0:
+                    error = error or DeadlineExceeded("fetch deadline exceeded")
+                    break
+                if not breaker.allow(url):
+                    error = CircuitOpen(f"circuit open for {urlsplit(url).netloc}")
+                    break
+                if n:
+                    metrics.inc("fetch_retry")
+                try:
+                    value = hedged(key, url)
+                    breaker.record(url, True)
+                    return FetchResult(key, value, None, False)
+                except DeadlineExceeded as e:
+                    error = e   # out of budget: neither a retry nor a strike against the host
+                    breaker.release(url)
+                    break
+                except Exception as e:
+                    error = e
+                    retryable = _retryable(e)
+                    breaker.record(url, not retryable)   # a 404 or parse error says the host is up
+                    if not retryable:
+                        break
+                    delay = BACKOFF * 2 ** n * (1 + random.random())
+                    if time.monotonic() + delay >= end:
+                        break
+                    time.sleep(delay)
+
+            if isinstance(error, DeadlineExceeded):
+                metrics.inc("deadline_exceeded")
+            stale = fallback(url) if fallback else None
+            if stale is not None:
+                metrics.inc("stale_fallback")
+                metrics.fail(key, f"stale: {type(error).__name__}: {error}")
+                return FetchResult(key, stale, error, True)
+            metrics.fail(key, error)
+            return FetchResult(key, None, error, False)
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch")
+    try:
+        futures = {pool.submit(one, key, url): (key, url) for key, url in items}
+        for fut in as_completed(futures):
+            yield fut.result()
+    finally:
+        # Hung attempts are bounded by their timeout (<= remaining budget); don't wait for them
+        pool.shutdown(wait=False, cancel_futures=True)
+        attempts.shutdown(wait=False, cancel_futures=True)
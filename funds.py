@@ -0,0 +1,108 @@
+# funds.py — several portfolios ("funds") over one shared set of quotes
+#
+# Holdings are (fund, symbol, allocation) rows. They are kept as a sparse
+# fund × symbol matrix (one entry per holding, grouped by fund), so quotes are
+# fetched once per unique symbol and priced as one vector. Each fund's result
+# is then compute_portfolio() over its slice of the matrix; a single bincount
+# pass over all holdings was measured and wasn't faster at realistic sizes.
+
+import os
+from operator import itemgetter
+from typing import NamedTuple
+
+import numpy as np
+
+import metrics
+from portfolio_calc import compute_portfolio
+
+DEFAULT_FUND = os.getenv("DEFAULT_FUND", "Motilal Midcap")
+MIN_COVERAGE = float(os.getenv("DAILY_MIN_COVERAGE", "0.9"))   # share of allocation that must be freshly priced to save a day
+
+
+class FundMatrix(NamedTuple):
+    funds: np.ndarray         # (F,) fund names
+    symbols: np.ndarray       # (S,) unique symbols, in first-seen order
+    offsets: np.ndarray       # (F + 1,) fund i's holdings are [offsets[i], offsets[i + 1])
+    cols: np.ndarray          # (H,) symbol index of each holding, ascending within a fund
+    allocations: np.ndarray   # (H,) % allocation of each holding
+
+    @property
+    def rows(self) -> np.ndarray:
+        """(H,) fund index of each holding."""
+        return np.repeat(np.arange(len(self.funds)), np.diff(self.offsets))
+
+
+def fund_of(row: dict) -> str:
+    """Fund of a stocks/history row; rows from before funds existed belong to DEFAULT_FUND."""
+    return row.get("fund") or DEFAULT_FUND
+
+
+def symbol_urls(holdings) -> dict:
+    """{symbol: url} for (fund, symbol, url, allocation) rows — one fetch per unique symbol."""
+    urls = {}
+    for _, sym, url, _ in holdings:
+        urls.setdefault(sym, url)
+    return urls
+
+
+def _first_seen(values, n: int):
+    """(row of each distinct value's first appearance, (n,) index of each value into those rows)."""
+    seen = {}
+    first = np.fromiter(map(seen.setdefault, values, range(n)), dtype=np.intp, count=n)
+    rows = np.flatnonzero(first == np.arange(n))
+    index = np.empty(n, dtype=np.intp)
+    index[rows] = np.arange(len(rows))
+    return rows, index[first]
+
+
+def fund_matrix(holdings) -> FundMatrix:
+    """Build the matrix from (fund, symbol, allocation) or (fund, symbol, url, allocation) rows.
+
+    A (fund, symbol) listed twice keeps its last allocation.
+    """
+    holdings = list(holdings)
+    n = len(holdings)
+    fund_rows, fi = _first_seen(map(itemgetter(0), holdings), n)
+    sym_rows, si = _first_seen(map(itemgetter(1), holdings), n)
+    funds = np.array([holdings[p][0] for p in fund_rows], dtype=object)
+    by_name = np.argsort(funds, kind="stable")
+    fi = np.argsort(by_name)[fi]   # funds in name order
+
+    # One entry per (fund, symbol), ordered by fund then symbol; the last row of a repeated pair wins
+    key = fi * len(sym_rows) + si
+    order = np.argsort(key, kind="stable")
+    key = key[order]
+    keep = order[np.r_[key[1:] != key[:-1], True]] if n else order
+    return FundMatrix(
+        funds=funds[by_name],
+        symbols=np.array([holdings[p][1] for p in sym_rows], dtype=object),
+        offsets=np.r_[0, np.cumsum(np.bincount(fi[keep], minlength=len(funds)))].astype(np.intp),
+        cols=si[keep],
+        allocations=np.fromiter(map(itemgetter(-1), holdings), dtype=np.float64, count=n)[keep],
+    )
+
+
+def priced_share(matrix: FundMatrix, returns) -> np.ndarray:
+    """(F,) share of each fund's allocation that has a quote (returns is NaN where missing)."""
+    priced = ~np.isnan(np.asarray(returns, dtype=np.float64))[matrix.cols]
+    rows, n = matrix.rows, len(matrix.funds)
+    total = np.bincount(rows, matrix.allocations, minlength=n)
+    covered = np.bincount(rows, np.where(priced, matrix.allocations, 0.0), minlength=n)
+    return np.divide(covered, total, out=np.zeros(len(total)), where=total > 0)
+
+
+@metrics.timed("compute")
+def compute_funds(matrix: FundMatrix, returns) -> dict:
+    """{fund: PortfolioResult} from returns aligned to matrix.symbols (% each, NaN if unpriced).
+
+    Unpriced holdings are left out and each fund's weights are renormalised
+    over the holdings it has quotes for.
+    """
+    r = np.asarray(returns, dtype=np.float64)
+    results = {}
+    for i, fund in enumerate(matrix.funds.tolist()):
+        lo, hi = matrix.offsets[i], matrix.offsets[i + 1]
+        priced = ~np.isnan(r[matrix.cols[lo:hi]])
+        cols = matrix.cols[lo:hi][priced]
+        results[fund] = compute_portfolio(matrix.symbols[cols], r[cols], matrix.allocations[lo:hi][priced])
+    return results
@@ -0,0 +1,161 @@
+# history_store.py — incremental loader for the history / portfolio_snapshots / mf_returns tables
+#
+# Each table is mirrored into a local Parquet file. Later loads only ask
+# Supabase for rows changed since the mirror's high-water mark. With an
+# `updated_at` column (see readme) that is the newest write, so backfilled
+# and re-saved older days are picked up. Without one it is the newest date:
+# the last day is re-read because it may have been re-saved. When a load
+# brings in no new rows, the mirror's row count is checked against the table's,
+# and a mismatch (older rows added or rows removed) rebuilds it. The first load pages through the whole
+# table with parallel ranged requests, since PostgREST caps every response at
+# 1,000 rows.
+
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+import metrics
+from funds import DEFAULT_FUND
+
+# ---------- Config ----------
+CACHE_DIR = os.getenv("HISTORY_CACHE_DIR", ".cache/history")
+PAGE_SIZE = 1000          # PostgREST default max-rows
+BACKFILL_WORKERS = 4
+
+TABLES = {
+    # table: (unique key, pagination order)
+    "history": (["date", "fund", "symbol"], ["date", "fund", "symbol"]),
+    "portfolio_snapshots": (["date", "fund"], ["date", "fund"]),
+    "mf_returns": (["date", "fund"], ["date", "fund"]),
+}
+
+
+WATERMARK = "updated_at"   # optional column stamped on every insert/update
+WATERMARK_LAG = pd.Timedelta(minutes=5)   # writes that commit after a later-stamped one are still seen
+
+
+def _query(client, table, order_cols, since=None, since_col="date"):
+    q = client.table(table).select("*")
+    if since is not None:
+        q = q.gte(since_col, since)
+    for c in order_cols:
+        q = q.order(c)
+    return q
+
+
+def _fetch_page(client, table, order_cols, start, since=None, since_col="date") -> list:
+    q = _query(client, table, order_cols, since, since_col)
+    return q.range(start, start + PAGE_SIZE - 1).execute().data or []
+
+
+def _count(client, table) -> int:
+    return client.table(table).select("*", count="exact").limit(1).execute().count or 0
+
+
+def _backfill(client, table, order_cols) -> list:
+    total = _count(client, table)
+    if total == 0:
+        return []
+    starts = range(0, total, PAGE_SIZE)
+    with ThreadPoolExecutor(max_workers=BACKFILL_WORKERS) as pool:
+        pages = pool.map(lambda s: _fetch_page(client, table, order_cols, s), starts)
+        rows = [r for page in pages for r in page]
+    # Rows written while we were paging land past `total`; pick them up sequentially
+    start = starts[-1] + PAGE_SIZE
+    while True:
+        page = _fetch_page(client, table, order_cols, start)
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+
+def _fetch_since(client, table, order_cols, since: str, since_col: str = "date") -> list:
+    rows, start = [], 0
+    while True:
+        page = _fetch_page(client, table, order_cols, start, since, since_col)
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+
+def _normalise(df: pd.DataFrame, key_cols, order_cols) -> pd.DataFrame:
+    if df.empty:
+        return df
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    if WATERMARK in df:
+        df[WATERMARK] = pd.to_datetime(df[WATERMARK], errors="coerce", utc=True, format="ISO8601")
+    if "fund" not in df:
+        df["fund"] = DEFAULT_FUND   # table not migrated to funds yet
+    df["fund"] = df["fund"].fillna(DEFAULT_FUND)
+    df = df.dropna(subset=["date"])
+    df = df.drop_duplicates(subset=key_cols, keep="last")
+    return df.sort_values(order_cols).reset_index(drop=True)
+
+
+def _watermark(cached: pd.DataFrame) -> tuple:
+    """(column, value) later loads fetch from: the newest write if stamped, else the newest date."""
+    if WATERMARK in cached and cached[WATERMARK].notna().all():
+        return WATERMARK, (cached[WATERMARK].max() - WATERMARK_LAG).isoformat()
+    return "date", cached["date"].max().date().isoformat()
+
+
+def _save(df: pd.DataFrame, path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # A temp file per writer: sessions and the daily job can save the same table at once
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.stem, suffix=".tmp", delete=False) as f:
+        tmp = Path(f.name)
+    try:
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+@metrics.timed("db_history")
+def load_table(client, table: str, cache_dir: str = CACHE_DIR) -> pd.DataFrame:
+    """Return the whole table as a DataFrame with typed, sorted dates, fetching only changed rows."""
+    key_cols, order_cols = TABLES[table]
+    path = Path(cache_dir) / f"{table}.parquet"
+    cached = pd.read_parquet(path) if path.exists() else pd.DataFrame()
+    if not cached.empty and not set(key_cols) <= set(cached.columns):
+        cached = pd.DataFrame()   # written before a key column existed; rebuild
+
+    rebuilt = cached.empty
+    if not rebuilt:
+        col, since = _watermark(cached)
+        fresh = _fetch_since(client, table, order_cols, since, col)
+        if fresh and WATERMARK in fresh[0] and WATERMARK not in cached:
+            rebuilt = True   # the table gained updated_at; rebuild to start using it
+    if rebuilt:
+        cached, fresh = pd.DataFrame(), _backfill(client, table, order_cols)
+    df = _normalise(pd.concat([cached, pd.DataFrame(fresh)], ignore_index=True), key_cols, order_cols) \
+        if fresh else cached
+
+    # Older rows added without an updated_at stamp, or rows deleted, leave the counts apart.
+    # Only checked when nothing new came in (the lag window or last day re-read), which is
+    # most loads; a load that adds rows leaves the check to the next one.
+    if not rebuilt and len(df) == len(cached) and _count(client, table) != len(df):
+        metrics.inc("history_mirror_rebuild")
+        df = _normalise(pd.DataFrame(_backfill(client, table, order_cols)), key_cols, order_cols)
+    elif not fresh:
+        return df
+    _save(df, path)
+    return df
+
+
+def load_history(client) -> pd.DataFrame:
+    return load_table(client, "history")
+
+
+def load_snapshots(client) -> pd.DataFrame:
+    return load_table(client, "portfolio_snapshots")
+
+
+def load_mf_returns(client) -> pd.DataFrame:
+    return load_table(client, "mf_returns")
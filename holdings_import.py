@@ -0,0 +1,332 @@
+# holdings_import.py — bulk-load a fund's holdings from an AMC portfolio disclosure
+#
+#   python holdings_import.py DISCLOSURE.xlsx --fund "Motilal Midcap" [--sheet NAME]
+#                             [--master EQUITY_L.csv] [--apply]
+#
+# The monthly portfolio disclosure (Excel or CSV) is stream-read and its equity
+# lines are mapped to NSE symbols by ISIN, or by company name when the ISIN is
+# unknown, through NSE's security master (EQUITY_L.csv). The result is diffed
+# against the fund's rows in `stocks` and applied as one `apply_holdings` RPC —
+# inserts, updates and deletes in a single transaction (see readme for the SQL).
+# Without the function it falls back to one batched upsert plus one batched
+# delete. Without --apply the CLI only prints the diff.
+
+import argparse
+import csv
+import io
+import os
+import re
+from typing import NamedTuple
+
+import metrics
+from bhavcopy import load_security_master, normalise_name
+from snapshot_writer import rpc_missing, with_retries
+
+# ---------- Config ----------
+SECURITY_MASTER = os.getenv("NSE_SECURITY_MASTER", "https://nsearchives.nseindia.com/content/equities/EQUITY_L.csv")
+SCREENER_URL = "https://www.screener.in/company/{}/"
+RPC_NAME = "apply_holdings"
+ALLOCATION_TOLERANCE = 0.005   # % points; smaller moves are not worth a write
+_HEADER_SCAN_ROWS = 50         # disclosures open with a title block before the table
+
+# Header keywords, most specific first
+_NAME_HEADERS = ("name of the instrument", "name of instrument", "instrument", "company", "issuer", "security", "name")
+_WEIGHT_HEADERS = ("% to nav", "% of nav", "% to net assets", "% of net assets", "% to aum", "% of aum",
+                   "weight", "allocation", "%")
+_SYMBOL_HEADERS = ("nse symbol", "symbol", "ticker")
+# Indian equity shares: INE + issuer code + security type "01" + serial + check digit
+_EQUITY_ISIN_RE = re.compile(r"^INE[A-Z0-9]{4}01[A-Z0-9]{2}[0-9]$")
+
+
+class Line(NamedTuple):
+    name: str
+    isin: str
+    symbol: str     # from the file's own symbol column, else ""
+    weight: float   # % of NAV
+
+
+class HoldingsDiff(NamedTuple):
+    inserts: list   # new {symbol, url, allocation} rows
+    updates: list   # (current row, new row) pairs
+    deletes: list   # current rows no longer in the disclosure
+    unchanged: int
+    kept: list = []   # current rows not in the mapped lines, held back while unmapped lines might be them
+
+    @property
+    def empty(self) -> bool:
+        return not (self.inserts or self.updates or self.deletes)
+
+
+# ---------- Reading ----------
+def _is_excel(name: str) -> bool:
+    return name.lower().endswith((".xlsx", ".xlsm"))
+
+
+def sheet_names(source, name: str = None) -> list:
+    """Worksheet names of an Excel disclosure; [] for CSV."""
+    name = name or str(source)
+    if not _is_excel(name):
+        return []
+    from openpyxl import load_workbook
+    wb = load_workbook(source, read_only=True)
+    try:
+        return list(wb.sheetnames)
+    finally:
+        wb.close()
+
+
+def _csv_rows(source):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, encoding="utf-8-sig", newline="") as f:
+            yield from csv.reader(f)
+    else:
+        text = io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+        try:
+            yield from csv.reader(text)
+        finally:
+            text.detach()   # leave the caller's file (e.g. an upload) open
+
+
+def _excel_rows(source, sheet: str = None):
+    from openpyxl import load_workbook
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        if sheet:
+            yield from wb[sheet].iter_rows(values_only=True)
+            return
+        # No sheet given: the first one that has a holdings table
+        for ws in wb.worksheets:
+            rows = ws.iter_rows(values_only=True)
+            head = [r for _, r in zip(range(_HEADER_SCAN_ROWS), rows)]
+            if any(_header_columns(r) for r in head):
+                yield from head
+                yield from rows
+                return
+    finally:
+        wb.close()
+
+
+def _find(header: list, needles) -> int:
+    for needle in needles:
+        for i, h in enumerate(header):
+            if needle in h:
+                return i
+    return None
+
+
+def _header_columns(row) -> dict:
+    """Column indexes if `row` is the holdings table header, else None."""
+    header = [str(c).strip().lower() if c is not None else "" for c in row]
+    isin = next((i for i, h in enumerate(header) if "isin" in h), None)
+    if isin is None:
+        return None
+    col = {"isin": isin, "name": _find(header, _NAME_HEADERS),
+           "weight": _find(header, _WEIGHT_HEADERS), "symbol": _find(header, _SYMBOL_HEADERS)}
+    return col if col["weight"] is not None else None
+
+
+def _weight(cell) -> float:
+    if isinstance(cell, (int, float)):
+        return float(cell)
+    try:
+        return float(str(cell).replace("%", "").replace(",", "").strip())
+    except ValueError:
+        return None
+
+
+def _cell(row, i) -> str:
+    return str(row[i]).strip() if i is not None and i < len(row) and row[i] is not None else ""
+
+
+def read_disclosure(source, name: str = None, sheet: str = None) -> list:
+    """Equity lines of a portfolio disclosure, one per ISIN, weights in % of NAV.
+
+    `source` is a path or a binary file object (then `name` gives the file
+    name, for the format). Debt, cash and derivative lines are skipped.
+    """
+    name = name or str(source)
+    if name.lower().endswith(".xls"):
+        raise ValueError("Legacy .xls files are not supported; save the disclosure as .xlsx or .csv")
+    rows = _excel_rows(source, sheet) if _is_excel(name) else _csv_rows(source)
+
+    col = None
+    for n, row in enumerate(rows):
+        col = _header_columns(row)
+        if col or n >= _HEADER_SCAN_ROWS:
+            break
+    if not col:
+        raise ValueError("No holdings table found (expected a header row with ISIN and % to NAV columns)")
+
+    lines = {}
+    for row in rows:
+        isin = _cell(row, col["isin"]).upper()
+        if not _EQUITY_ISIN_RE.match(isin):
+            continue
+        w = _weight(row[col["weight"]]) if col["weight"] < len(row) else None
+        if w is None:
+            continue
+        prev = lines.get(isin)
+        if prev:   # the same stock listed twice (e.g. partly paid shares) is one holding
+            lines[isin] = prev._replace(weight=prev.weight + w)
+        else:
+            lines[isin] = Line(_cell(row, col["name"]), isin, _cell(row, col["symbol"]).upper(), w)
+
+    out = list(lines.values())
+    # Some AMCs write 0.0523 for 5.23%
+    if out and sum(l.weight for l in out) <= 1.5:
+        out = [l._replace(weight=round(l.weight * 100, 4)) for l in out]
+    return out
+
+
+# ---------- Mapping ----------
+def _held_matches(line: Line, held: dict) -> list:
+    """Held symbols an unmapped line may be: same ISIN, or the same company name give or take a suffix."""
+    name = normalise_name(line.name or "")
+    out = []
+    for sym, (isin, held_name) in held.items():
+        if line.isin and isin == line.isin:
+            return [sym]
+        if name and held_name and (name == held_name or name.startswith(held_name + " ")
+                                   or held_name.startswith(name + " ")):
+            out.append(sym)
+        elif name and name == normalise_name(sym):
+            out.append(sym)
+    return out
+
+
+def _held(master, current) -> dict:
+    """{held symbol: (ISIN, normalised name)} from the security master (None where it doesn't list it)."""
+    by_isin, by_name = master
+    isin_of = {sym: isin for isin, sym in by_isin.items()}
+    name_of = {sym: name for name, sym in by_name.items()}
+    return {r["symbol"]: (isin_of.get(r["symbol"]), name_of.get(r["symbol"])) for r in current}
+
+
+def map_lines(lines, master, current=()):
+    """Resolve lines to ({symbol: {symbol, url, allocation}}, [unmapped lines]).
+
+    master is load_security_master()'s (by_isin, by_name). A symbol the fund
+    already holds keeps its current Screener URL (it may point at /consolidated/).
+    A line the master can't resolve is matched against the fund's current
+    holdings by ISIN or company name before it is reported as unmapped.
+    """
+    by_isin, by_name = master
+    urls = {r["symbol"]: r["url"] for r in current}
+    held = _held(master, current)
+    mapped, unmapped = {}, []
+    for l in lines:
+        sym = by_isin.get(l.isin) or l.symbol or by_name.get(normalise_name(l.name))
+        if not sym:
+            matches = _held_matches(l, held)
+            sym = matches[0] if len(matches) == 1 else None
+        if not sym:
+            unmapped.append(l)
+            continue
+        row = mapped.get(sym)
+        alloc = round(l.weight + (row["allocation"] if row else 0.0), 4)
+        mapped[sym] = {"symbol": sym, "url": urls.get(sym) or SCREENER_URL.format(sym), "allocation": alloc}
+    return mapped, unmapped
+
+
+def diff_holdings(current, new: dict, unmapped=(), master=({}, {})) -> HoldingsDiff:
+    """Diff the fund's current stocks rows against {symbol: new row}.
+
+    A current row missing from `new` is only deleted if none of the `unmapped`
+    lines could be it. It could be when the line has no ISIN, or the master
+    doesn't know the held symbol's ISIN (so they can't be told apart), or
+    their names match. Such rows are returned in `kept` until the line is
+    resolved.
+    """
+    held = _held(master, current)
+    current = {r["symbol"]: r for r in current}
+    inserts, updates, unchanged = [], [], 0
+    for sym, row in new.items():
+        old = current.get(sym)
+        if old is None:
+            inserts.append(row)
+        elif old["url"] != row["url"] or abs(float(old["allocation"]) - row["allocation"]) > ALLOCATION_TOLERANCE:
+            updates.append((old, row))
+        else:
+            unchanged += 1
+    deletes, kept = [], []
+    for sym, r in current.items():
+        if sym in new:
+            continue
+        isin = held[sym][0]
+        maybe = any(not l.isin or not isin or sym in _held_matches(l, {sym: held[sym]}) for l in unmapped)
+        (kept if maybe else deletes).append(r)
+    return HoldingsDiff(inserts, updates, deletes, unchanged, kept)
+
+
+# ---------- Writing ----------
+@metrics.timed("db_write")
+def apply_diff(client, fund: str, diff: HoldingsDiff):
+    """Apply the diff to `stocks` as one transaction (batched upsert + delete without the RPC)."""
+    if diff.empty:
+        return
+    upserts = [{"fund": fund, **r} for r in diff.inserts + [new for _, new in diff.updates]]
+    deletes = [r["symbol"] for r in diff.deletes]
+    try:
+        with_retries(lambda: client.rpc(RPC_NAME, {
+            "p_fund": fund, "p_upserts": upserts, "p_deletes": deletes}).execute())
+        return
+    except Exception as e:
+        if not rpc_missing(e):
+            raise
+        print(f"RPC {RPC_NAME} not installed; using a batched upsert and delete")
+    if upserts:
+        with_retries(lambda: client.table("stocks").upsert(upserts, on_conflict="fund,symbol").execute())
+    if deletes:
+        with_retries(lambda: client.table("stocks").delete().eq("fund", fund).in_("symbol", deletes).execute())
+
+
+def current_rows(client, fund: str) -> list:
+    from funds import fund_of
+    res = client.table("stocks").select("*").execute()
+    return [r for r in res.data or [] if fund_of(r) == fund]
+
+
+# ---------- CLI ----------
+def _print_diff(diff: HoldingsDiff, unmapped: list):
+    for r in diff.inserts:
+        print(f"  + {r['symbol']:<12} {r['allocation']:>6.2f}%  {r['url']}")
+    for old, new in diff.updates:
+        print(f"  ~ {new['symbol']:<12} {float(old['allocation']):>6.2f}% -> {new['allocation']:.2f}%")
+    for r in diff.deletes:
+        print(f"  - {r['symbol']:<12} {float(r['allocation']):>6.2f}%")
+    for r in diff.kept:
+        print(f"  = {r['symbol']:<12} {float(r['allocation']):>6.2f}%  kept: may be an unmapped line below")
+    print(f"{len(diff.inserts)} to add, {len(diff.updates)} to update, "
+          f"{len(diff.deletes)} to remove, {len(diff.kept)} kept, {diff.unchanged} unchanged")
+    for l in unmapped:
+        print(f"  ? no NSE symbol for {l.name or l.isin} ({l.isin}, {l.weight:.2f}%)")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Import a fund's holdings from an AMC portfolio disclosure.")
+    ap.add_argument("file", help="disclosure .xlsx or .csv")
+    ap.add_argument("--fund", required=True, help="fund to replace the holdings of")
+    ap.add_argument("--sheet", help="worksheet (default: the first with a holdings table)")
+    ap.add_argument("--master", default=SECURITY_MASTER,
+                    help="NSE EQUITY_L.csv or UDiFF bhavcopy (path or URL) for ISIN -> symbol")
+    ap.add_argument("--apply", action="store_true", help="write the changes (default: print the diff only)")
+    args = ap.parse_args(argv)
+
+    from daily_fetch import get_client
+    client = get_client()
+    lines = read_disclosure(args.file, sheet=args.sheet)
+    current = current_rows(client, args.fund)
+    master = load_security_master(args.master)
+    mapped, unmapped = map_lines(lines, master, current)
+    diff = diff_holdings(current, mapped, unmapped, master)
+    print(f"{args.fund}: {len(lines)} equity lines in {args.file}")
+    _print_diff(diff, unmapped)
+    if not args.apply:
+        print("Dry run; pass --apply to write.")
+        return
+    apply_diff(client, args.fund, diff)
+    print("✅ Holdings updated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# holdings_table.py — the Portfolio tab holdings grid as a single HTML payload
+#
+# Styles live in CSS classes defined once per payload instead of ~1 KB of
+# inline styles per row, and every cell is formatted column-wise, so the whole
+# grid is one st.markdown delta regardless of the number of holdings.
+
+import html
+
+import numpy as np
+import pandas as pd
+
+TABLE_CSS = """
+<style>
+    .holdings {
+        background: rgba(26, 31, 58, 0.4);
+        border-radius: 16px;
+        border: 1px solid rgba(0, 229, 255, 0.2);
+        padding: 1rem;
+        margin: 1rem 0;
+    }
+    .holdings .hrow {
+        display: grid;
+        grid-template-columns: 2fr 1.5fr 1.5fr 1.5fr;
+        gap: 1rem;
+        padding: 0.75rem 1rem;
+        border-radius: 8px;
+        margin-bottom: 0.25rem;
+        transition: all 0.2s ease;
+        color: rgba(255, 255, 255, 0.9);
+    }
+    .holdings .hrow > div:not(:first-child) { text-align: right; }
+    .holdings .hrow > div:first-child { color: rgba(255, 255, 255, 0.95); font-weight: 500; }
+    .holdings .hbody .hrow:nth-child(odd) { background: rgba(26, 31, 58, 0.3); }
+    .holdings .hbody .hrow:nth-child(even) { background: rgba(26, 31, 58, 0.5); }
+    .holdings .hbody .hrow:hover { background: rgba(0, 229, 255, 0.08); transform: scale(1.005); }
+    .holdings .hhead {
+        background: linear-gradient(135deg, rgba(0, 229, 255, 0.2) 0%, rgba(0, 184, 212, 0.15) 100%);
+        margin-bottom: 0.5rem;
+    }
+    .holdings .hhead > div {
+        color: #00e5ff !important;
+        font-weight: 600 !important;
+        text-transform: uppercase;
+        letter-spacing: 0.5px;
+        font-size: 0.85rem;
+    }
+    .holdings .pos { color: #00e5ff; font-weight: 600; }
+    .holdings .neg { color: #ff5252; font-weight: 600; }
+</style>
+"""
+
+_HEADER = (
+    '<div class="hrow hhead"><div>Stock</div><div>Return</div>'
+    '<div>Weight</div><div>Contribution</div></div>'
+)
+
+
+def render_holdings_html(df: pd.DataFrame) -> str:
+    """One HTML string for a frame indexed by stock with Return / Weight / Contribution."""
+    ret = df["Return"].to_numpy(dtype=np.float64)
+    stock = pd.Series(df.index.astype(str), dtype=object).map(html.escape)
+    cls = pd.Series(np.where(ret > 0, "pos", "neg"), dtype=object)
+    ret_s = pd.Series(np.char.mod("%+.2f%%", ret), dtype=object)
+    weight_s = pd.Series(np.char.mod("%.2f%%", df["Weight"].to_numpy(dtype=np.float64)), dtype=object)
+    contrib_s = pd.Series(np.char.mod("%+.3f%%", df["Contribution"].to_numpy(dtype=np.float64)), dtype=object)
+
+    rows = (
+        '<div class="hrow"><div>' + stock
+        + '</div><div class="' + cls + '">' + ret_s
+        + '</div><div>' + weight_s
+        + '</div><div>' + contrib_s + '</div></div>'
+    )
+    return (
+        TABLE_CSS
+        + '<div class="holdings">' + _HEADER
+        + '<div class="hbody">' + "".join(rows.tolist()) + "</div></div>"
+    )
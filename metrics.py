@@ -0,0 +1,164 @@
+# metrics.py — process-wide hot-path metrics for fetch, parse, compute and DB calls
+#
+# Stages record latency into fixed-bucket histograms (plus a bounded window of
+# raw samples for percentiles), counters track bytes and cache hits/misses, and
+# each symbol keeps its own timing breakdown and last failure reason. The
+# registry can be dumped as a JSON run report or a Prometheus textfile.
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+SAMPLE_WINDOW = 2048
+PROM_PREFIX = "mft"
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)   # last slot is +Inf
+        self.sum_ms = 0.0
+        self.count = 0
+        self.samples = deque(maxlen=SAMPLE_WINDOW)
+
+    def observe(self, ms: float):
+        i = next((i for i, b in enumerate(BUCKETS_MS) if ms <= b), len(BUCKETS_MS))
+        self.counts[i] += 1
+        self.sum_ms += ms
+        self.count += 1
+        self.samples.append(ms)
+
+    def summary(self) -> dict:
+        s = sorted(self.samples)
+
+        def pct(p):
+            return round(s[min(len(s) - 1, int(p / 100 * len(s)))], 2) if s else None
+
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum_ms / self.count, 2) if self.count else None,
+            "p50_ms": pct(50), "p95_ms": pct(95), "p99_ms": pct(99),
+            "max_ms": round(s[-1], 2) if s else None,
+            "buckets_ms": dict(zip([str(b) for b in BUCKETS_MS] + ["+Inf"], self.counts)),
+        }
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.histograms = {}
+            self.counters = {}
+            self.symbols = {}
+            self.notes = {}
+
+    # ---------- Recording ----------
+    @contextmanager
+    def symbol(self, sym: str):
+        """Attribute stages timed in this thread to `sym`."""
+        prev = getattr(self._local, "symbol", None)
+        self._local.symbol = sym
+        try:
+            yield
+        finally:
+            self._local.symbol = prev
+
+    def observe(self, stage: str, ms: float, symbol: str = None):
+        symbol = symbol or getattr(self._local, "symbol", None)
+        with self._lock:
+            self.histograms.setdefault(stage, Histogram()).observe(ms)
+            if symbol:
+                timings = self.symbols.setdefault(symbol, {})
+                timings[stage + "_ms"] = round(timings.get(stage + "_ms", 0.0) + ms, 2)
+
+    @contextmanager
+    def timed(self, stage: str, symbol: str = None):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, (time.perf_counter() - t0) * 1e3, symbol)
+
+    def inc(self, name: str, n: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def fail(self, symbol: str, error):
+        reason = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+        with self._lock:
+            self.symbols.setdefault(symbol, {})["error"] = reason[:200]
+            self.counters["symbol_failures"] = self.counters.get("symbol_failures", 0) + 1
+
+    def note(self, name: str, value):
+        """Attach a JSON-serialisable value to the run report (e.g. symbols saved from stale quotes)."""
+        with self._lock:
+            self.notes[name] = value
+
+    # ---------- Export ----------
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                "started": self.started,
+                "elapsed_s": round(time.time() - self.started, 3),
+                "stages": {k: h.summary() for k, h in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+                "symbols": {k: dict(v) for k, v in sorted(self.symbols.items())},
+                "notes": dict(self.notes),
+            }
+
+    def write_json(self, path: str):
+        _atomic_write(path, json.dumps(self.report(), indent=2, default=str))
+
+    def prometheus_text(self) -> str:
+        def esc(v):
+            return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+        lines = [f"# HELP {PROM_PREFIX}_stage_latency_seconds Hot-path stage latency.",
+                 f"# TYPE {PROM_PREFIX}_stage_latency_seconds histogram"]
+        with self._lock:
+            for stage, h in sorted(self.histograms.items()):
+                cum = 0
+                for b, c in zip(list(BUCKETS_MS) + ["+Inf"], h.counts):
+                    cum += c
+                    le = "+Inf" if b == "+Inf" else f"{b / 1000:g}"
+                    lines.append(f'{PROM_PREFIX}_stage_latency_seconds_bucket{{stage="{stage}",le="{le}"}} {cum}')
+                lines.append(f'{PROM_PREFIX}_stage_latency_seconds_sum{{stage="{stage}"}} {h.sum_ms / 1000:.6f}')
+                lines.append(f'{PROM_PREFIX}_stage_latency_seconds_count{{stage="{stage}"}} {h.count}')
+            lines += [f"# HELP {PROM_PREFIX}_events_total Counters (bytes, cache hits/misses, failures).",
+                      f"# TYPE {PROM_PREFIX}_events_total counter"]
+            for name, v in sorted(self.counters.items()):
+                lines.append(f'{PROM_PREFIX}_events_total{{event="{name}"}} {v}')
+            lines += [f"# HELP {PROM_PREFIX}_symbol_failure Symbols whose last fetch failed.",
+                      f"# TYPE {PROM_PREFIX}_symbol_failure gauge"]
+            for sym, info in sorted(self.symbols.items()):
+                if "error" in info:
+                    lines.append(f'{PROM_PREFIX}_symbol_failure{{symbol="{esc(sym)}",reason="{esc(info["error"])}"}} 1')
+            lines.append(f"{PROM_PREFIX}_last_run_timestamp_seconds {time.time():.0f}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        _atomic_write(path, self.prometheus_text())
+
+
+def _atomic_write(path: str, text: str):
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_name(p.name + ".tmp")
+    tmp.write_text(text)
+    os.replace(tmp, p)
+
+
+registry = Registry()
+timed = registry.timed
+inc = registry.inc
+fail = registry.fail
+symbol = registry.symbol
@@ -0,0 +1,165 @@
+# nse_calendar.py — NSE trading calendar helpers shared by the dashboard and the daily job
+#
+# The calendar is a sorted array of trading-day ordinals built once from
+# pandas_market_calendars, persisted to disk and loaded lazily, so lookups are
+# O(1) (membership) or O(log n) (bisect) and the calendar stack is only
+# imported when the index has to be (re)built.
+
+import bisect
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+IST = timezone(timedelta(hours=5, minutes=30))
+OPEN_TIME = (9, 15)
+CLOSE_TIME = (15, 30)
+
+# ---------- Config ----------
+INDEX_PATH = os.getenv("NSE_CALENDAR_INDEX", ".cache/nse_trading_days.json")
+INDEX_START = date.fromisoformat(os.getenv("NSE_CALENDAR_START", "2015-01-01"))
+INTRADAY_TTL = float(os.getenv("QUOTE_TTL", "300"))
+# Screener keeps moving for a few minutes after the bell; keep refreshing until it settles
+SETTLE_SECONDS = float(os.getenv("QUOTE_SETTLE", "1200"))
+
+
+class TradingDayIndex:
+    def __init__(self, days, start: date, end: date):
+        self.days = list(days)            # sorted ordinals
+        self._set = frozenset(self.days)
+        self.start, self.end = start, end
+
+    def covers(self, d: date) -> bool:
+        return self.start <= d <= self.end
+
+    def is_trading_day(self, d: date) -> bool:
+        return d.toordinal() in self._set
+
+    def previous_trading_day(self, d: date):
+        """Last trading day strictly before d, or None."""
+        i = bisect.bisect_left(self.days, d.toordinal())
+        return date.fromordinal(self.days[i - 1]) if i else None
+
+    def next_trading_day(self, d: date):
+        """First trading day on or after d, or None."""
+        i = bisect.bisect_left(self.days, d.toordinal())
+        return date.fromordinal(self.days[i]) if i < len(self.days) else None
+
+    def trading_days_between(self, start: date, end: date) -> list:
+        """Trading days in [start, end], inclusive."""
+        lo = bisect.bisect_left(self.days, start.toordinal())
+        hi = bisect.bisect_right(self.days, end.toordinal())
+        return [date.fromordinal(o) for o in self.days[lo:hi]]
+
+
+def _build(start: date, end: date):
+    """Return (ordinals, persist). Falls back to Mon–Fri when the calendar is unavailable."""
+    try:
+        import pandas_market_calendars as mcal
+        days = mcal.get_calendar("NSE").valid_days(start_date=start.isoformat(),
+                                                   end_date=end.isoformat())
+        return sorted({d.date().toordinal() for d in days}), True
+    except Exception as e:
+        print("Calendar lookup failed:", e)
+        return [o for o in range(start.toordinal(), end.toordinal() + 1)
+                if date.fromordinal(o).weekday() < 5], False
+
+
+def _load_or_build(path: str, lo: date, hi: date) -> TradingDayIndex:
+    p = Path(path)
+    if p.exists():
+        try:
+            raw = json.loads(p.read_text())
+            idx = TradingDayIndex(raw["days"], date.fromisoformat(raw["start"]),
+                                  date.fromisoformat(raw["end"]))
+            if idx.covers(lo) and idx.covers(hi):
+                return idx
+        except (ValueError, KeyError) as e:
+            print("Ignoring unreadable calendar index:", e)
+
+    start = min(INDEX_START, lo)
+    end = date(max(hi.year, date.today().year) + 1, 12, 31)
+    days, persist = _build(start, end)
+    if persist:
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"start": start.isoformat(), "end": end.isoformat(), "days": days}))
+        os.replace(tmp, p)
+    return TradingDayIndex(days, start, end)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index(lo: date = None, hi: date = None) -> TradingDayIndex:
+    """Process-wide index, loaded on first use and rebuilt if [lo, hi] falls outside it."""
+    global _index
+    lo = lo or date.today()
+    hi = hi or lo
+    with _index_lock:
+        if _index is None or not (_index.covers(lo) and _index.covers(hi)):
+            _index = _load_or_build(INDEX_PATH, lo, hi)
+        return _index
+
+
+# ---------- Lookups ----------
+def is_nse_trading_day(check_date: date) -> bool:
+    """Check if the day is an NSE trading day."""
+    return get_index(check_date).is_trading_day(check_date)
+
+
+def previous_trading_day(d: date):
+    return get_index(d).previous_trading_day(d)
+
+
+def trading_days_between(start: date, end: date) -> list:
+    return get_index(start, end).trading_days_between(start, end)
+
+
+def session_bounds(d: date) -> tuple:
+    """(open_ts, close_ts) epoch seconds of the regular session on d."""
+    o = datetime(d.year, d.month, d.day, *OPEN_TIME, tzinfo=IST)
+    c = datetime(d.year, d.month, d.day, *CLOSE_TIME, tzinfo=IST)
+    return o.timestamp(), c.timestamp()
+
+
+def in_session(now: float = None) -> bool:
+    """True between the open and the end of the post-close settle window on a trading day."""
+    now = time.time() if now is None else now
+    today = datetime.fromtimestamp(now, IST).date()
+    if not is_nse_trading_day(today):
+        return False
+    open_ts, close_ts = session_bounds(today)
+    return open_ts <= now < close_ts + SETTLE_SECONDS
+
+
+def next_open(now: float = None) -> float:
+    """Epoch time of the next session open strictly after `now`."""
+    now = time.time() if now is None else now
+    d = datetime.fromtimestamp(now, IST).date()
+    while True:
+        idx = get_index(d)
+        nxt = idx.next_trading_day(d)
+        if nxt is None:   # ran off the end of the index; the next lookup extends it
+            d = idx.end + timedelta(days=1)
+            continue
+        open_ts = session_bounds(nxt)[0]
+        if open_ts > now:
+            return open_ts
+        d = nxt + timedelta(days=1)
+
+
+def quote_expiry(now: float = None, ttl: float = INTRADAY_TTL) -> float:
+    """Epoch time until which a quote fetched at `now` stays valid.
+
+    During a session (and the settle window after the close) quotes live for
+    `ttl` seconds; anything fetched after that is final until the next open.
+    """
+    now = time.time() if now is None else now
+    if in_session(now):
+        close_ts = session_bounds(datetime.fromtimestamp(now, IST).date())[1]
+        return min(now + ttl, close_ts + SETTLE_SECONDS)
+    return next_open(now)
@@ -0,0 +1,244 @@
+# period_aggregates.py — month / quarter / year aggregates kept in `period_aggregates`
+#
+# One row per (fund, period, period_start, symbol); an empty symbol is the whole
+# portfolio. Each row holds the period-to-date compounded return, the summed
+# daily contribution (stock rows), the trading days counted and the best and
+# worst day, so a period view is a single keyed select.
+# After each save the daily job folds the day it just wrote into the current
+# month, quarter and year rows. It folds only when a row runs through the
+# previous trading day. Otherwise (first save, a re-run, a late or skipped
+# day, an earlier failed update) that period is recomputed from
+# portfolio_snapshots and history instead. A day that opens a period also
+# checks the period before it, so a missed update on a period's last day is
+# caught. A backfill rebuilds every period it
+# touched. Kept free of pandas so the daily job stays light.
+#
+#   python period_aggregates.py --rebuild START END [--fund NAME]
+
+import argparse
+from datetime import date, timedelta
+
+import metrics
+from funds import fund_of
+from nse_calendar import previous_trading_day
+from snapshot_writer import with_retries
+
+TABLE = "period_aggregates"
+KEY = ("fund", "period", "period_start", "symbol")
+PERIODS = ("month", "quarter", "year")
+PORTFOLIO = ""      # symbol of a fund's whole-portfolio rows
+PAGE_SIZE = 1000    # PostgREST default max-rows; also the upsert batch size
+
+
+# ---------- Periods ----------
+def _day(d) -> date:
+    return d if isinstance(d, date) else date.fromisoformat(str(d)[:10])
+
+
+def period_start(day: date, period: str) -> date:
+    if period == "month":
+        return day.replace(day=1)
+    if period == "quarter":
+        return date(day.year, 3 * ((day.month - 1) // 3) + 1, 1)
+    return date(day.year, 1, 1)
+
+
+def period_end(day: date, period: str) -> date:
+    """Last calendar day of the period containing `day`."""
+    start = period_start(day, period)
+    months = {"month": 1, "quarter": 3, "year": 12}[period]
+    m = start.month - 1 + months
+    return date(start.year + m // 12, m % 12 + 1, 1) - timedelta(days=1)
+
+
+# ---------- Folding ----------
+def _empty(fund: str, period: str, start: date, symbol: str) -> dict:
+    return {"fund": fund, "period": period, "period_start": start.isoformat(), "symbol": symbol,
+            "through": None, "days": 0, "ret": 0.0, "contribution": None if symbol == PORTFOLIO else 0.0,
+            "best_day": None, "best_ret": None, "worst_day": None, "worst_ret": None}
+
+
+def fold(row: dict, day: date, ret: float, contribution: float = None) -> dict:
+    """Fold one trading day's return (%) and contribution (pp) into a period row, in place."""
+    d = day.isoformat()
+    row["ret"] = ((1 + row["ret"] / 100) * (1 + ret / 100) - 1) * 100
+    row["days"] += 1
+    row["through"] = d
+    if contribution is not None and row["symbol"] != PORTFOLIO:
+        row["contribution"] = (row["contribution"] or 0.0) + contribution
+    if row["best_ret"] is None or ret > row["best_ret"]:
+        row["best_day"], row["best_ret"] = d, ret
+    if row["worst_ret"] is None or ret < row["worst_ret"]:
+        row["worst_day"], row["worst_ret"] = d, ret
+    return row
+
+
+def build(snapshots, history, periods=PERIODS) -> dict:
+    """{(fund, period, period_start, symbol): row} from snapshot and history rows, in date order."""
+    out = {}
+
+    def add(fund, symbol, day, ret, contribution=None):
+        for period in periods:
+            start = period_start(day, period)
+            key = (fund, period, start.isoformat(), symbol)
+            row = out.get(key) or out.setdefault(key, _empty(fund, period, start, symbol))
+            fold(row, day, ret, contribution)
+
+    for r in sorted(snapshots, key=lambda r: str(r["date"])):
+        add(fund_of(r), PORTFOLIO, _day(r["date"]), float(r["portfolio_return"]))
+    for r in sorted(history, key=lambda r: str(r["date"])):
+        add(fund_of(r), r["symbol"], _day(r["date"]), float(r["ret"]), float(r.get("contribution") or 0.0))
+    return out
+
+
+# ---------- Supabase ----------
+def _paged(query) -> list:
+    """Every row of query() (a fresh, ordered select per call), PAGE_SIZE at a time."""
+    out, offset = [], 0
+    while True:
+        with metrics.timed("db"):
+            page = query().range(offset, offset + PAGE_SIZE - 1).execute().data or []
+        out += page
+        if len(page) < PAGE_SIZE:
+            return out
+        offset += PAGE_SIZE
+
+
+def _fetch(client, table: str, columns: str, start: date, end: date, funds=None) -> list:
+    """Every row of `table` dated within [start, end] (for `funds`, if given)."""
+    def query():
+        q = client.table(table).select(columns).gte("date", start.isoformat()).lte("date", end.isoformat())
+        if funds is not None:
+            q = q.in_("fund", sorted(funds))
+        q = q.order("date").order("fund")
+        return q.order("symbol") if table == "history" else q
+    return _paged(query)
+
+
+def _source_rows(client, start: date, end: date, funds=None) -> tuple:
+    snapshots = _fetch(client, "portfolio_snapshots", "date,fund,portfolio_return", start, end, funds)
+    history = _fetch(client, "history", "date,fund,symbol,ret,contribution", start, end, funds)
+    return snapshots, history
+
+
+def _write(client, rows: list):
+    for i in range(0, len(rows), PAGE_SIZE):
+        batch = rows[i:i + PAGE_SIZE]
+        with_retries(lambda: client.table(TABLE).upsert(batch, on_conflict=",".join(KEY)).execute())
+
+
+def _recompute(client, fund: str, keys: set) -> list:
+    """Fresh rows for the fund's (period, period_start) keys, replacing whatever is stored."""
+    lo = min(date.fromisoformat(s) for _, s in keys)
+    hi = max(period_end(date.fromisoformat(s), p) for p, s in keys)
+    snapshots, history = _source_rows(client, lo, hi, {fund})
+    periods = tuple(sorted({p for p, _ in keys}))
+    rows = [r for (_, p, s, _), r in build(snapshots, history, periods).items() if (p, s) in keys]
+    for period, start in keys:
+        # Symbols the fund no longer has a history row for would otherwise linger
+        with_retries(lambda: client.table(TABLE).delete().eq("fund", fund).eq("period", period)
+                     .eq("period_start", start).execute())
+    metrics.inc("aggregates_recomputed", len(keys))
+    return rows
+
+
+@metrics.timed("aggregates")
+def update_aggregates(client, days: list) -> int:
+    """Fold just-saved days ([{date, fund, portfolio_return, rows}, ...]) into the aggregates.
+
+    Returns the number of rows written.
+    """
+    if not days:
+        return 0
+    days = sorted(days, key=lambda d: (fund_of(d), _day(d["date"])))
+    funds = sorted({fund_of(d) for d in days})
+    prevs = [previous_trading_day(_day(d["date"])) for d in days]
+    starts = sorted({period_start(day, p).isoformat() for day in [_day(d["date"]) for d in days] + prevs
+                     if day is not None for p in PERIODS})
+    stored = _paged(lambda: client.table(TABLE).select("*").in_("fund", funds).in_("period_start", starts)
+                    .order("fund").order("period").order("period_start").order("symbol"))
+    current = {tuple(str(r[k])[:10] if k == "period_start" else r[k] for k in KEY): r for r in stored}
+
+    changed, recompute = {}, {}
+    for d in days:
+        fund, day = fund_of(d), _day(d["date"])
+        prev = previous_trading_day(day)
+        for period in PERIODS:
+            start = period_start(day, period)
+            pkey = (period, start.isoformat())
+            if prev is not None and prev < start:
+                # The day opens a period: the one before must run through its last trading day
+                before = (fund, period, period_start(prev, period).isoformat(), PORTFOLIO)
+                row = changed.get(before) or current.get(before)
+                if row is None or _day(row["through"]) != prev:
+                    recompute.setdefault(fund, set()).add(before[1:3])
+            if pkey in recompute.get(fund, ()):
+                continue
+            key = (fund, period, start.isoformat(), PORTFOLIO)
+            row = changed.get(key) or current.get(key)
+            through = _day(row["through"]) if row else None
+            if row is None and prev is not None and prev >= start:
+                recompute.setdefault(fund, set()).add(pkey)   # earlier days of the period aren't folded in
+                continue
+            if row is not None and through != prev:
+                recompute.setdefault(fund, set()).add(pkey)   # re-run, late/skipped day or a missed update
+                continue
+            for symbol, ret, contrib in [(PORTFOLIO, d["portfolio_return"], None)] + [
+                    (r["symbol"], r["ret"], r.get("contribution")) for r in d["rows"]]:
+                k = (fund, period, start.isoformat(), symbol)
+                if k not in changed:
+                    changed[k] = dict(current[k]) if k in current else _empty(fund, period, start, symbol)
+                fold(changed[k], day, float(ret), None if contrib is None else float(contrib))
+
+    rows = [r for k, r in changed.items() if (k[1], k[2]) not in recompute.get(k[0], ())]
+    for fund, keys in recompute.items():
+        rows += _recompute(client, fund, keys)
+    _write(client, rows)
+    metrics.inc("aggregates_rows", len(rows))
+    return len(rows)
+
+
+@metrics.timed("aggregates")
+def rebuild_aggregates(client, start: date, end: date, funds=None) -> int:
+    """Recompute every period overlapping [start, end] from the source tables (e.g. after a backfill)."""
+    lo, hi = period_start(start, "year"), period_end(end, "year")
+    snapshots, history = _source_rows(client, lo, hi, funds)
+    rows = list(build(snapshots, history).values())
+    q = client.table(TABLE).delete().gte("period_start", lo.isoformat()).lte("period_start", hi.isoformat())
+    if funds is not None:
+        q = q.in_("fund", sorted(funds))
+    with_retries(q.execute)
+    _write(client, rows)
+    return len(rows)
+
+
+# ---------- Lookups ----------
+def load_periods(client, fund: str, period: str) -> list:
+    """The fund's whole-portfolio rows for every stored period, oldest first."""
+    with metrics.timed("db"):
+        return (client.table(TABLE).select("*").eq("fund", fund).eq("period", period).eq("symbol", PORTFOLIO)
+                .order("period_start").execute().data or [])
+
+
+def load_period_stocks(client, fund: str, period: str, start) -> list:
+    """Per-stock rows of one period, largest contribution first."""
+    start = start.isoformat() if hasattr(start, "isoformat") else start
+    with metrics.timed("db"):
+        return (client.table(TABLE).select("*").eq("fund", fund).eq("period", period).eq("period_start", start)
+                .neq("symbol", PORTFOLIO).order("contribution", desc=True).execute().data or [])
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Rebuild month/quarter/year aggregates from saved snapshots.")
+    ap.add_argument("--rebuild", nargs=2, type=date.fromisoformat, metavar=("START", "END"), required=True,
+                    help="recompute every period overlapping [START, END]")
+    ap.add_argument("--fund", action="append", help="only this fund (repeatable; default all)")
+    args = ap.parse_args(argv)
+
+    from daily_fetch import get_client
+    n = rebuild_aggregates(get_client(), *args.rebuild, funds=args.fund)
+    print(f"✅ {n} aggregate rows rebuilt for {args.rebuild[0]}..{args.rebuild[1]}")
+
+
+if __name__ == "__main__":
+    main()
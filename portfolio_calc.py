@@ -0,0 +1,70 @@
+# portfolio_calc.py — vectorized portfolio return computation shared by the dashboard and the daily job
+#
+# Everything is in percent: a return of 1.23 means 1.23%, and contributions are
+# percentage points of portfolio return. Rounding happens only when rows are
+# written (history_rows / snapshot_return), so both entry points agree.
+
+from typing import NamedTuple
+
+import numpy as np
+
+
+class PortfolioResult(NamedTuple):
+    symbols: np.ndarray        # object array of symbols
+    returns: np.ndarray        # % per holding
+    allocations: np.ndarray    # % allocation as configured
+    weights: np.ndarray        # allocation normalised to sum to 1
+    contributions: np.ndarray  # percentage points of portfolio return
+    total: float               # portfolio return, %
+    green_count: int
+    best: tuple                # (symbol, return %)
+    worst: tuple
+
+
+def compute_portfolio(symbols, returns, allocations) -> PortfolioResult:
+    symbols = np.asarray(symbols, dtype=object)
+    returns = np.asarray(returns, dtype=np.float64)
+    allocations = np.asarray(allocations, dtype=np.float64)
+
+    total_alloc = allocations.sum()
+    weights = allocations / total_alloc if total_alloc > 0 else np.zeros_like(allocations)
+    contributions = returns * weights
+
+    if len(returns):
+        hi, lo = int(returns.argmax()), int(returns.argmin())
+        best = (symbols[hi], float(returns[hi]))
+        worst = (symbols[lo], float(returns[lo]))
+    else:
+        best = worst = (None, 0.0)
+
+    return PortfolioResult(
+        symbols=symbols,
+        returns=returns,
+        allocations=allocations,
+        weights=weights,
+        contributions=contributions,
+        total=float(contributions.sum()),
+        green_count=int((returns > 0).sum()),
+        best=best,
+        worst=worst,
+    )
+
+
+def snapshot_return(result: PortfolioResult) -> float:
+    return round(result.total, 2)
+
+
+def history_rows(result: PortfolioResult, day, fund: str = None) -> list:
+    """Rows for the `history` table, rounded the way they are stored."""
+    day = day.isoformat() if hasattr(day, "isoformat") else day
+    ret = np.round(result.returns, 2).tolist()
+    contrib = np.round(result.contributions, 3).tolist()
+    alloc = result.allocations.tolist()
+    rows = [
+        {"date": day, "symbol": s, "ret": r, "allocation": a, "contribution": c}
+        for s, r, a, c in zip(result.symbols.tolist(), ret, alloc, contrib)
+    ]
+    if fund is not None:
+        for row in rows:
+            row["fund"] = fund
+    return rows
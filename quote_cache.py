@@ -0,0 +1,184 @@
+# quote_cache.py — persistent quote cache shared by the dashboard and the daily job
+#
+# SQLite (WAL) file keyed by URL. Every process on the host reads through the
+# same file, and a short lease on each row makes sure only one of them scrapes
+# a given URL while the others wait for its result. Expiry follows the NSE
+# session schedule (nse_calendar.quote_expiry), so off-hours reads never scrape.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import metrics
+from fetch_client import fetch_parsed
+from quote_extract import Quote, extract_quote
+from nse_calendar import quote_expiry
+
+# ---------- Config ----------
+CACHE_PATH = os.getenv("QUOTE_CACHE_DB", ".cache/quote_cache.db")
+MAX_ENTRIES = int(os.getenv("QUOTE_CACHE_MAX", "2000"))
+LEASE_SECONDS = 15.0   # longer than the fetch timeout
+
+_SCHEMA = """
+create table if not exists quotes (
+    url text primary key,
+    value text,
+    etag text,
+    last_modified text,
+    fetched_at real,
+    expires_at real,
+    last_access real,
+    lease_until real default 0
+)
+"""
+
+
+class QuoteCache:
+    def __init__(self, path: str = CACHE_PATH, expiry=quote_expiry,
+                 max_entries: int = MAX_ENTRIES):
+        self.path = path
+        self.expiry = expiry   # fetched_at -> expires_at, both epoch seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn().execute(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("pragma journal_mode=wal")
+            conn.execute("pragma synchronous=normal")
+            self._local.conn = conn
+        return conn
+
+    # ---------- fetch_client validator-store protocol ----------
+    def get(self, url: str):
+        """Last stored entry for url regardless of age, or None."""
+        row = self._conn().execute(
+            "select value, etag, last_modified, fetched_at from quotes where url = ? and value is not null",
+            (url,)).fetchone()
+        if not row:
+            return None
+        return {"value": Quote(*json.loads(row[0])), "etag": row[1], "last_modified": row[2], "fetched_at": row[3]}
+
+    def put(self, url: str, etag, last_modified, value):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("begin immediate")
+        try:
+            conn.execute(
+                """insert into quotes (url, value, etag, last_modified, fetched_at, expires_at, last_access, lease_until)
+                   values (?, ?, ?, ?, ?, ?, ?, 0)
+                   on conflict(url) do update set
+                     value = excluded.value, etag = excluded.etag,
+                     last_modified = excluded.last_modified, fetched_at = excluded.fetched_at,
+                     expires_at = excluded.expires_at, last_access = excluded.last_access,
+                     lease_until = 0""",
+                (url, json.dumps(list(value)), etag, last_modified, now, self.expiry(now), now))
+            conn.execute(
+                """delete from quotes where url in (
+                     select url from quotes order by last_access desc limit -1 offset ?)""",
+                (self.max_entries,))
+            conn.execute("commit")
+        except Exception:
+            conn.execute("rollback")
+            raise
+
+    # ---------- Read-through ----------
+    def fresh(self, url: str):
+        """Unexpired quote for url, or None."""
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "select value from quotes where url = ? and value is not null and expires_at > ?",
+            (url, now)).fetchone()
+        if not row:
+            return None
+        conn.execute("update quotes set last_access = ? where url = ?", (now, url))
+        return Quote(*json.loads(row[0]))
+
+    def _claim(self, url: str):
+        """Take the scrape lease for url.
+
+        Returns (True, None) when claimed, (False, quote) if another process
+        stored a fresh quote meanwhile, and (False, None) if it holds the lease.
+        """
+        now = time.time()
+        conn = self._conn()
+        conn.execute("begin immediate")
+        try:
+            row = conn.execute(
+                "select value, expires_at, lease_until from quotes where url = ?", (url,)).fetchone()
+            if row and row[0] is not None and row[1] > now:
+                conn.execute("commit")
+                return False, Quote(*json.loads(row[0]))
+            if row and row[2] and row[2] > now:
+                conn.execute("commit")
+                return False, None
+            conn.execute(
+                """insert into quotes (url, last_access, lease_until) values (?, ?, ?)
+                   on conflict(url) do update set lease_until = excluded.lease_until""",
+                (url, now, now + LEASE_SECONDS))
+            conn.execute("commit")
+            return True, None
+        except Exception:
+            conn.execute("rollback")
+            raise
+
+    def _release(self, url: str):
+        self._conn().execute("update quotes set lease_until = 0 where url = ?", (url,))
+
+    def get_or_fetch(self, url: str, timeout: float = None) -> Quote:
+        """Return a fresh quote, scraping at most once per expiry window across processes."""
+        q = self.fresh(url)
+        if q is not None:
+            metrics.inc("quote_cache_hit")
+            return q
+        metrics.inc("quote_cache_miss")
+        while True:
+            claimed, q = self._claim(url)
+            if q is not None:
+                return q
+            if claimed:
+                break
+            time.sleep(0.1)   # another process is scraping; a dead holder's lease lapses
+
+        try:
+            return fetch_parsed(url, extract_quote, timeout=timeout, store=self)
+        except Exception:
+            self._release(url)
+            raise
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_cache() -> QuoteCache:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = QuoteCache()
+        return _default
+
+
+def get_quote(url: str, timeout: float = None) -> Quote:
+    return get_cache().get_or_fetch(url, timeout=timeout)
+
+
+def refetch_quote(url: str, timeout: float = None) -> Quote:
+    """Scrape url now, skipping the lease (used for hedged requests); the result is still cached."""
+    return fetch_parsed(url, extract_quote, timeout=timeout, store=get_cache())
+
+
+def last_quote(url: str, since: float = None):
+    """Last cached quote for url, or None; only one fetched at or after `since` (epoch seconds) if given."""
+    entry = get_cache().get(url)
+    if not entry or (since is not None and (entry["fetched_at"] or 0) < since):
+        return None
+    return entry["value"]
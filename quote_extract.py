@@ -0,0 +1,50 @@
+# quote_extract.py — pull price / % change out of a Screener company page
+
+import re
+from typing import NamedTuple, Optional
+
+
+class Quote(NamedTuple):
+    price: Optional[float]
+    prev_close: Optional[float]
+    change_pct: float
+    fallback: bool = False   # True when the anchored scan missed and the heuristic was used
+
+
+# Screener renders the top-of-page quote as:
+#   <span>₹ 1,416</span>
+#   <span class="font-size-12 down margin-left-4">
+#     <i class="icon-circle-down"></i>
+#     -0.49%
+#   </span>
+# re.search stops at the first match, so only the page head is scanned.
+_QUOTE_RE = re.compile(
+    r"<span>\s*₹\s*([0-9][0-9,]*(?:\.[0-9]+)?)\s*</span>\s*"
+    r"<span class=\"font-size-12 (up|down)[^\"]*\">\s*(?:<i[^>]*>\s*</i>)?\s*"
+    r"([+-]?[0-9]+(?:\.[0-9]+)?)\s*%"
+)
+_TAG_RE = re.compile(r"<[^>]+>")
+_PCT_RE = re.compile(r"[+-]?[0-9]+\.[0-9]+(?=%)")
+_PCT_INT_RE = re.compile(r"[+-]?[0-9]+(?=\s?%)")
+
+
+def _fallback(html: str) -> Quote:
+    # Old heuristic: first "%" number in the visible text
+    text = _TAG_RE.sub("", html)
+    m = _PCT_RE.search(text) or _PCT_INT_RE.search(text)
+    if not m:
+        raise ValueError("no price change found on page")
+    return Quote(None, None, float(m.group()), True)
+
+
+def extract_quote(html: str) -> Quote:
+    """Return the quote from a Screener company page; pct is 1.23 meaning 1.23%."""
+    m = _QUOTE_RE.search(html)
+    if not m:
+        return _fallback(html)
+    price = float(m.group(1).replace(",", ""))
+    pct = float(m.group(3))
+    if m.group(2) == "down" and pct > 0:
+        pct = -pct
+    prev_close = round(price / (1 + pct / 100), 2) if pct > -100 else None
+    return Quote(price, prev_close, pct)
@@ -0,0 +1,128 @@
+# quote_poller.py — one background poller per server process for live portfolio quotes
+#
+# The poller refreshes every unique symbol across all funds on a schedule during
+# market hours and publishes an immutable LiveSnapshot with each fund's result. Browser sessions only read the latest
+# snapshot (no I/O), so page-open cost doesn't depend on the number of viewers.
+
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from types import MappingProxyType
+
+from fetch_engine import CircuitBreaker, fetch_within
+from nse_calendar import IST, in_session, is_nse_trading_day, next_open, previous_trading_day, session_bounds
+from funds import compute_funds, fund_matrix, priced_share, symbol_urls
+from portfolio_calc import PortfolioResult
+from quote_cache import get_quote, last_quote, refetch_quote
+
+# ---------- Config ----------
+POLL_SECONDS = float(os.getenv("LIVE_POLL_SECONDS", "60"))
+
+
+@dataclass(frozen=True)
+class LiveSnapshot:
+    at: float                  # epoch seconds the quotes were collected
+    results: MappingProxyType  # fund -> PortfolioResult (arrays are read-only)
+    urls: MappingProxyType     # symbol -> Screener URL
+    errors: MappingProxyType   # symbol -> fetch error message (stale or missing quote)
+    stale: frozenset           # symbols showing a quote cached earlier in the session
+    coverage: MappingProxyType # fund -> share of its allocation with a fresh quote
+
+    @property
+    def empty(self) -> bool:
+        return not self.results
+
+
+def _freeze(result: PortfolioResult) -> PortfolioResult:
+    for arr in (result.symbols, result.returns, result.allocations, result.weights, result.contributions):
+        arr.setflags(write=False)
+    return result
+
+
+def session_open(now: float) -> float:
+    """Open of the session a poll at `now` belongs to: today's once it has opened, else the last one."""
+    day = datetime.fromtimestamp(now, IST).date()
+    open_ts = session_bounds(day)[0]
+    if not is_nse_trading_day(day) or now < open_ts:
+        open_ts = session_bounds(previous_trading_day(day))[0]
+    return open_ts
+
+
+class QuotePoller(threading.Thread):
+    def __init__(self, load_holdings, interval: float = POLL_SECONDS, fetch=get_quote,
+                 hedge=refetch_quote, fallback=last_quote):
+        """load_holdings() -> [(fund, symbol, url, allocation), ...]; fetch(url, timeout) -> Quote;
+        fallback(url, since) -> the last Quote cached at or after `since`, or None"""
+        super().__init__(name="quote-poller", daemon=True)
+        self.load_holdings = load_holdings
+        self.interval = interval
+        self.fetch = fetch
+        self.hedge = hedge
+        self.fallback = fallback
+        self.breaker = CircuitBreaker()   # kept across polls so a failing host stays backed off
+        self._snapshot = None
+        self._wake = threading.Event()
+        self._published = threading.Condition()
+
+    # ---------- Readers ----------
+    def snapshot(self):
+        """Latest LiveSnapshot, or None before the first poll completes."""
+        return self._snapshot
+
+    def wait_for_snapshot(self, timeout: float):
+        with self._published:
+            self._published.wait_for(lambda: self._snapshot is not None, timeout)
+        return self._snapshot
+
+    def refresh_now(self):
+        """Poll immediately (e.g. after a Refresh click or a holdings change)."""
+        self._wake.set()
+
+    # ---------- Poll loop ----------
+    def poll(self) -> LiveSnapshot:
+        holdings = list(self.load_holdings())
+        urls = symbol_urls(holdings)
+        returns, errors, stale = {}, {}, set()
+        # A cached quote stands in only if it was fetched this session, never an earlier day's move
+        opened = session_open(time.time())
+        fallback = lambda url: self.fallback(url, since=opened)
+        # Each poll must finish before the next one is due
+        for r in fetch_within(urls.items(), self.fetch, self.interval, hedge=self.hedge, fallback=fallback,
+                              breaker=self.breaker):
+            if r.value is None:
+                errors[r.key] = str(r.error)   # left out of the result rather than shown as 0%
+                continue
+            if r.stale:
+                errors[r.key] = f"showing last cached quote ({r.error})"
+                stale.add(r.key)
+            returns[r.key] = r.value.change_pct
+        matrix = fund_matrix(holdings)
+        vector = [returns.get(s, math.nan) for s in matrix.symbols]
+        fresh = [math.nan if s in stale else v for s, v in zip(matrix.symbols, vector)]
+        coverage = dict(zip(matrix.funds.tolist(), priced_share(matrix, fresh).tolist()))
+        results = compute_funds(matrix, vector)
+        results = MappingProxyType({f: _freeze(r) for f, r in results.items()})
+        snap = LiveSnapshot(time.time(), results, MappingProxyType(urls), MappingProxyType(errors),
+                            frozenset(stale), MappingProxyType(coverage))
+        with self._published:
+            self._snapshot = snap
+            self._published.notify_all()
+        return snap
+
+    def _sleep_seconds(self) -> float:
+        now = time.time()
+        if in_session(now):
+            return self.interval
+        return max(self.interval, next_open(now) - now)
+
+    def run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Quote poll failed: {e}")
+            self._wake.wait(self._sleep_seconds())
+            self._wake.clear()
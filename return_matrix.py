@@ -0,0 +1,199 @@
+# return_matrix.py — trading day × symbol matrices of stock returns and weights
+#
+# The long-format `history` table is folded into two dense float32 arrays per
+# fund: daily return (%) and portfolio weight (fraction of the day's
+# allocation), NaN where the fund didn't hold the stock. They live in .npy
+# files under the history cache, opened memory-mapped, so a day's row or a
+# stock's column is a view rather than a pivot of the whole table. New days are
+# appended in place. The files carry spare capacity and are only rewritten
+# when they fill up, or when older history changes (e.g. after a backfill).
+
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from history_store import CACHE_DIR
+
+MATRIX_DIR = os.getenv("RETURN_MATRIX_DIR", os.path.join(CACHE_DIR, "matrix"))
+_MIN_ROWS, _MIN_COLS = 256, 64
+
+_lock = threading.Lock()
+
+
+class ReturnMatrix:
+    """Read-only views over a fund's return and weight matrices (rows: dates, columns: symbols)."""
+
+    def __init__(self, dates, symbols, returns, weights):
+        self.dates = dates        # (D,) datetime64[D], ascending
+        self.symbols = symbols    # (S,) object
+        self.returns = returns    # (D, S) float32 %, NaN where not held
+        self.weights = weights    # (D, S) float32 share of the day's allocation
+        self._col = {s: i for i, s in enumerate(symbols.tolist())}
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def window(self, start=None, end=None) -> "ReturnMatrix":
+        """Rows with start <= date <= end (either may be None); views, no copy."""
+        lo = np.searchsorted(self.dates, np.datetime64(start, "D")) if start is not None else 0
+        hi = np.searchsorted(self.dates, np.datetime64(end, "D"), side="right") if end is not None else len(self)
+        return ReturnMatrix(self.dates[lo:hi], self.symbols, self.returns[lo:hi], self.weights[lo:hi])
+
+    def row(self, day):
+        """(returns, weights) of one trading day, or None if it isn't stored."""
+        i = np.searchsorted(self.dates, np.datetime64(day, "D"))
+        if i == len(self) or self.dates[i] != np.datetime64(day, "D"):
+            return None
+        return self.returns[i], self.weights[i]
+
+    def column(self, symbol):
+        """(returns, weights) of one stock over every stored day."""
+        j = self._col[symbol]
+        return self.returns[:, j], self.weights[:, j]
+
+    def cumulative(self, symbol) -> np.ndarray:
+        """Compounded return (%) of one stock over the window; days it wasn't held count as flat."""
+        r = np.nan_to_num(self.returns[:, self._col[symbol]].astype(np.float64))
+        return (np.cumprod(1 + r / 100) - 1) * 100
+
+    def contributions(self) -> np.ndarray:
+        """(S,) summed daily contribution (percentage points) of each stock over the window."""
+        return np.nansum(self.returns.astype(np.float64) * self.weights, axis=0)
+
+    def ranking(self, n: int = 5):
+        """([(symbol, pp)] top n contributors, [(symbol, pp)] bottom n) over the window."""
+        held = ~np.isnan(self.returns).all(axis=0)
+        contrib = self.contributions()[held]
+        syms = self.symbols[held]
+        order = np.argsort(contrib)
+        top = [(syms[i], float(contrib[i])) for i in order[::-1][:n]]
+        bottom = [(syms[i], float(contrib[i])) for i in order[:n]]
+        return top, bottom
+
+
+def _fund_dir(cache_dir: str, fund: str) -> Path:
+    """Readable, but names differing only in punctuation must not share a directory."""
+    name = re.sub(r"[^A-Za-z0-9]+", "_", fund).strip("_") or "fund"
+    return Path(cache_dir) / f"{name}-{hashlib.sha1(fund.encode()).hexdigest()[:8]}"
+
+
+def _read_index(d: Path, fund: str) -> dict:
+    try:
+        index = json.loads((d / "index.json").read_text())
+    except (OSError, ValueError):
+        return {}
+    return index if index.get("fund") == fund else {}
+
+
+def _open(d: Path, index: dict) -> ReturnMatrix:
+    n, s = len(index.get("dates", [])), len(index.get("symbols", []))
+    if not n:
+        empty = np.empty((0, 0), dtype=np.float32)
+        return ReturnMatrix(np.array([], dtype="datetime64[D]"), np.array([], dtype=object), empty, empty)
+    returns = np.load(d / "returns.npy", mmap_mode="r")
+    weights = np.load(d / "weights.npy", mmap_mode="r")
+    return ReturnMatrix(np.array(index["dates"], dtype="datetime64[D]"), np.array(index["symbols"], dtype=object),
+                        returns[:n, :s], weights[:n, :s])
+
+
+def _reserve(d: Path, rows: int, cols: int, used: tuple):
+    """Open both arrays read-write with room for rows × cols, growing (copying `used`) if needed."""
+    out = []
+    for name in ("returns", "weights"):
+        path = d / f"{name}.npy"
+        arr = np.lib.format.open_memmap(path, mode="r+") if path.exists() and any(used) else None
+        if arr is None or arr.shape[0] < rows or arr.shape[1] < cols:
+            shape = (max(_MIN_ROWS, 1 << (rows - 1).bit_length()), max(_MIN_COLS, 1 << (cols - 1).bit_length()))
+            tmp = d / f"{name}.tmp.npy"
+            grown = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=shape)
+            grown[:] = np.nan
+            if arr is not None:
+                grown[:used[0], :used[1]] = arr[:used[0], :used[1]]
+                del arr
+            grown.flush()
+            del grown
+            os.replace(tmp, path)
+            metrics.inc("matrix_grow")
+            arr = np.lib.format.open_memmap(path, mode="r+")
+        out.append(arr)
+    return out
+
+
+def _settled(h: pd.DataFrame, last) -> list:
+    """[row count, sums of ret / allocation / contribution] of history rows before `last` — a cheap fingerprint."""
+    before = h["date"].values < np.datetime64(last)
+    sums = [round(float(np.nansum(pd.to_numeric(h[c], errors="coerce").to_numpy(np.float64)[before])), 6)
+            if c in h else None for c in ("ret", "allocation", "contribution")]
+    return [int(before.sum())] + sums
+
+
+@metrics.timed("matrix")
+def update_matrix(history: pd.DataFrame, fund: str, cache_dir: str = MATRIX_DIR) -> ReturnMatrix:
+    """Fold any new `history` rows for the fund into its matrices and return read-only views."""
+    d = _fund_dir(cache_dir, fund)
+    h = history[history["fund"].values == fund] if not history.empty else history
+    with _lock:
+        index = _read_index(d, fund)
+        dates = [np.datetime64(x, "D") for x in index.get("dates", [])]
+        if dates and _settled(h, pd.Timestamp(dates[-1])) != index.get("settled"):
+            metrics.inc("matrix_rebuild")   # older history was added or re-saved
+            index, dates = {}, []
+        if h.empty:
+            return _open(d, index)
+
+        # The last stored day is re-read: it may have been re-saved since
+        new = h[h["date"] >= pd.Timestamp(dates[-1])] if dates else h
+        if new.empty:
+            metrics.inc("matrix_rebuild")   # the last stored day was removed
+            index, dates, new = {}, [], h
+        new_days = np.unique(new["date"].values.astype("datetime64[D]"))
+        first = len(dates) - 1 if dates and new_days[0] == dates[-1] else len(dates)
+
+        symbols = list(index.get("symbols", []))
+        col = {s: i for i, s in enumerate(symbols)}
+        for s in new["symbol"].unique().tolist():
+            if s not in col:
+                col[s] = len(symbols)
+                symbols.append(s)
+
+        ri = first + np.searchsorted(new_days, new["date"].values.astype("datetime64[D]"))
+        ci = np.array([col[s] for s in new["symbol"].tolist()], dtype=np.intp)
+        ret = new["ret"].to_numpy(np.float32)
+        alloc = new["allocation"].to_numpy(np.float64)
+        day_total = np.bincount(ri - first, weights=alloc)[ri - first]
+        weight = np.divide(alloc, day_total, out=np.zeros_like(alloc), where=day_total > 0).astype(np.float32)
+
+        if first == len(dates) - 1 and len(new_days) == 1 and len(symbols) == len(index["symbols"]):
+            current = _open(d, index)
+            r_row = np.full(len(symbols), np.nan, dtype=np.float32)
+            w_row = r_row.copy()
+            r_row[ci], w_row[ci] = ret, weight
+            if (np.array_equal(current.returns[first], r_row, equal_nan=True)
+                    and np.array_equal(current.weights[first], w_row, equal_nan=True)):
+                return current   # nothing new since the last update
+
+        d.mkdir(parents=True, exist_ok=True)
+        rows = first + len(new_days)
+        returns, weights = _reserve(d, rows, len(symbols), (first if dates else 0, len(index.get("symbols", []))))
+        returns[first:rows] = np.nan
+        weights[first:rows] = np.nan
+        returns[ri, ci] = ret
+        weights[ri, ci] = weight
+        returns.flush()
+        weights.flush()
+        del returns, weights
+
+        all_dates = dates[:first] + list(new_days)
+        index = {"fund": fund, "dates": [str(x) for x in all_dates], "symbols": symbols,
+                 "settled": _settled(h, pd.Timestamp(all_dates[-1]))}
+        tmp = d / "index.tmp"
+        tmp.write_text(json.dumps(index))
+        os.replace(tmp, d / "index.json")
+        return _open(d, index)
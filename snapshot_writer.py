@@ -0,0 +1,127 @@
+# snapshot_writer.py — idempotent, batched writes of daily snapshots to Supabase
+#
+# Each fund's day is written through one `save_daily_snapshots` RPC (see readme
+# for the SQL): history rows are upserted on (date, fund, symbol), the snapshot
+# on (date, fund), and rows for symbols the fund no longer held that day are
+# removed. All funds and days go in the same call. Without the function the
+# writer falls back to one delete per fund and day for the dropped symbols and
+# one batched upsert per table. Either way, saving the same day twice leaves
+# the tables unchanged and retries are safe.
+
+import random
+import time
+
+import metrics
+from funds import DEFAULT_FUND
+
+RPC_NAME = "save_daily_snapshots"
+RETRIES = 3
+
+_rpc_available = True
+
+
+def _network_errors() -> tuple:
+    """Connection and timeout errors of the HTTP clients supabase-py may be using."""
+    errors = [ConnectionError, TimeoutError]
+    try:
+        import httpx
+        errors += [httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError]
+    except ImportError:
+        pass
+    try:
+        import requests
+        errors += [requests.ConnectionError, requests.Timeout]
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+def _is_transient(e: Exception) -> bool:
+    """Worth retrying: network failures, HTTP 429/5xx, and Postgres errors a retry can clear."""
+    if isinstance(e, _network_errors()):
+        return True
+    response = getattr(e, "response", None)
+    status = getattr(response, "status_code", None)
+    code = getattr(e, "code", None)
+    if status is None and (isinstance(code, int) or (isinstance(code, str) and len(code) == 3 and code.isdigit())):
+        status = int(code)   # PostgREST error without a JSON body carries the HTTP status, not a SQLSTATE
+    if status is not None:
+        return status == 429 or status >= 500
+    # Connection failures, serialization/deadlock rollbacks, insufficient resources, admin shutdown
+    return code is not None and str(code)[:2] in ("08", "40", "53", "57")
+
+
+def with_retries(fn, retries: int = RETRIES):
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == retries or not _is_transient(e):
+                raise
+            delay = 0.5 * 2 ** attempt * (1 + random.random())
+            print(f"Write failed ({e}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def rpc_missing(e: Exception) -> bool:
+    """The database doesn't have the function (PostgREST PGRST202)."""
+    return getattr(e, "code", None) == "PGRST202" or "PGRST202" in str(e)
+
+
+def _iso(d):
+    return d.isoformat() if hasattr(d, "isoformat") else d
+
+
+def _payload(days) -> list:
+    out = []
+    for d in days:
+        fund = d.get("fund") or DEFAULT_FUND
+        out.append({
+            "date": _iso(d["date"]),
+            "fund": fund,
+            "portfolio_return": round(float(d["portfolio_return"]), 2),
+            "rows": [{**r, "date": _iso(r["date"]), "fund": fund} for r in d["rows"]],
+        })
+    return out
+
+
+def _drop_unheld(client, d: dict):
+    """Delete d's history rows for symbols the fund no longer held that day."""
+    q = client.table("history").delete().eq("date", d["date"]).eq("fund", d["fund"])
+    held = [r["symbol"] for r in d["rows"]]
+    if held:
+        q = q.not_.in_("symbol", held)
+    q.execute()
+
+
+def _fallback(client, days: list):
+    for d in days:
+        with_retries(lambda: _drop_unheld(client, d))
+    history = [r for d in days for r in d["rows"]]
+    if history:
+        with_retries(lambda: client.table("history").upsert(
+            history, on_conflict="date,fund,symbol").execute())
+    # Snapshot last: its presence marks the day as complete
+    snapshots = [{"date": d["date"], "fund": d["fund"], "portfolio_return": d["portfolio_return"]}
+                 for d in days]
+    with_retries(lambda: client.table("portfolio_snapshots").upsert(
+        snapshots, on_conflict="date,fund").execute())
+
+
+@metrics.timed("db_write")
+def save_days(client, days: list):
+    """Write [{date, fund, portfolio_return, rows}, ...] in a constant number of round trips."""
+    global _rpc_available
+    days = _payload(days)
+    if not days:
+        return
+    if _rpc_available:
+        try:
+            with_retries(lambda: client.rpc(RPC_NAME, {"p_days": days}).execute())
+            return
+        except Exception as e:
+            if not rpc_missing(e):
+                raise
+            print(f"RPC {RPC_NAME} not installed; using batched upserts")
+            _rpc_available = False
+    _fallback(client, days)
@@ -0,0 +1,61 @@
+# test_analytics.py — incrementally updated analytics must equal a rebuild from scratch
+
+import pandas as pd
+
+import metrics
+from analytics import update_analytics
+from conftest import FUNDS, day_dicts, fake, save
+
+
+def _update(client, frames, cache):
+    snaps, history, _ = frames(client)
+    return update_analytics(snaps, history, cache)
+
+
+def _assert_same(got, want):
+    pd.testing.assert_frame_equal(got.series, want.series, rtol=1e-9)
+    by_key = lambda df: df.sort_values(["fund", "symbol"]).reset_index(drop=True)
+    pd.testing.assert_frame_equal(by_key(got.contributions), by_key(want.contributions), rtol=1e-9)
+
+
+def test_incremental_matches_rebuild(history_edit, frames, tmp_path):
+    client = fake(history_edit.initial)
+    _update(client, frames, tmp_path / "a")
+    rebuilds = metrics.registry.counters.get("analytics_rebuild", 0)
+    for days in history_edit.steps:
+        save(client, days)
+        got = _update(client, frames, tmp_path / "a")
+    assert got.series["ret_250"].notna().any()
+    _assert_same(got, _update(client, frames, tmp_path / "rebuild"))
+    # Only an older day's change forces a rebuild; a new or re-saved last day is folded in
+    older = history_edit.steps[0][0]["date"] < history_edit.initial[-1]["date"]
+    assert metrics.registry.counters.get("analytics_rebuild", 0) - rebuilds == (len(FUNDS) if older else 0)
+
+
+def test_unchanged_reload_keeps_the_files(trading_days, frames, tmp_path):
+    client = fake(day_dicts(trading_days[:30]))
+    _update(client, frames, tmp_path / "a")
+    state = tmp_path / "a" / "analytics_state.json"
+    before = state.stat().st_mtime_ns
+    _update(client, frames, tmp_path / "a")
+    assert state.stat().st_mtime_ns == before
+
+
+def test_removed_last_day(trading_days, frames, tmp_path):
+    client = fake(day_dicts(trading_days[:30]))
+    _update(client, frames, tmp_path / "a")
+    last = trading_days[29].isoformat()
+    for table in ("history", "portfolio_snapshots"):
+        client.table(table).delete().eq("date", last).execute()
+    got = _update(client, frames, tmp_path / "a")
+    assert got.series["date"].max() == pd.Timestamp(trading_days[28])
+    _assert_same(got, _update(client, frames, tmp_path / "rebuild"))
+
+
+def test_fund_added_later(trading_days, frames, tmp_path):
+    client = fake(day_dicts(trading_days[:30], funds=FUNDS[:1]))
+    _update(client, frames, tmp_path / "a")
+    save(client, day_dicts(trading_days[:31], funds=FUNDS[1:]))
+    got = _update(client, frames, tmp_path / "a")
+    assert set(got.series["fund"]) == set(FUNDS)
+    _assert_same(got, _update(client, frames, tmp_path / "rebuild"))
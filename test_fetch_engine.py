@@ -0,0 +1,127 @@
+# test_fetch_engine.py — fetch_within() deadline, retry, circuit-breaker and stale-fallback behaviour
+
+import threading
+import time
+
+import pytest
+
+import fetch_engine
+from fetch_engine import CircuitBreaker, CircuitOpen, DeadlineExceeded, fetch_within
+
+
+@pytest.fixture
+def hang():
+    """An event hung fetches wait on; released at teardown so no thread outlives the test."""
+    release = threading.Event()
+    yield release
+    release.set()
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(fetch_engine, "BACKOFF", 0.01)
+
+
+def _urls(*keys) -> list:
+    return [(k, f"https://example.test/{k}") for k in keys]
+
+
+def test_returns_shortly_after_deadline(hang):
+    def fetch(url, timeout):
+        if url.endswith("SLOW"):
+            hang.wait(30)
+        return url.rsplit("/", 1)[1].lower()
+
+    t0 = time.monotonic()
+    results = {r.key: r for r in fetch_within(_urls("A", "B", "SLOW"), fetch, deadline=0.5, hedge_after=0.1)}
+    assert time.monotonic() - t0 < 2
+    assert results["A"] == ("A", "a", None, False)
+    assert results["B"].value == "b"
+    assert results["SLOW"].value is None and not results["SLOW"].stale
+    assert isinstance(results["SLOW"].error, DeadlineExceeded)
+
+
+def test_missing_value_falls_back_to_stale(hang):
+    def fetch(url, timeout):
+        if url.endswith("SLOW"):
+            hang.wait(30)
+        if url.endswith("BAD"):
+            raise ValueError("no quote on the page")
+        return "fresh"
+
+    fallback = {"https://example.test/SLOW": "cached", "https://example.test/BAD": "cached"}.get
+    results = {r.key: r for r in fetch_within(_urls("OK", "SLOW", "BAD", "NONE"), fetch, deadline=0.5,
+                                              fallback=fallback, hedge_after=0.1)}
+    assert results["OK"] == ("OK", "fresh", None, False)
+    assert results["SLOW"].value == "cached" and results["SLOW"].stale
+    assert isinstance(results["SLOW"].error, DeadlineExceeded)
+    assert results["BAD"].value == "cached" and results["BAD"].stale
+    assert isinstance(results["BAD"].error, ValueError)
+    assert results["NONE"].value == "fresh"
+
+
+def test_transient_errors_are_retried_and_others_are_not():
+    calls = {}
+
+    def fetch(url, timeout):
+        key = url.rsplit("/", 1)[1]
+        calls[key] = calls.get(key, 0) + 1
+        if key == "FLAKY" and calls[key] == 1:
+            raise ConnectionError("reset by peer")
+        if key == "BROKEN":
+            raise ValueError("no quote on the page")
+        return key
+
+    results = {r.key: r for r in fetch_within(_urls("FLAKY", "BROKEN"), fetch, deadline=5, retries=2)}
+    assert results["FLAKY"] == ("FLAKY", "FLAKY", None, False)
+    assert calls == {"FLAKY": 2, "BROKEN": 1}
+    assert results["BROKEN"].value is None and isinstance(results["BROKEN"].error, ValueError)
+
+
+def test_host_timeouts_are_retried():
+    calls = []
+
+    def fetch(url, timeout):
+        calls.append(url)
+        if len(calls) == 1:
+            raise TimeoutError("read timed out")   # the socket's, not the budget's
+        return "ok"
+
+    [result] = fetch_within(_urls("A"), fetch, deadline=5, retries=1)
+    assert result == ("A", "ok", None, False)
+    assert len(calls) == 2
+
+
+def test_breaker_stays_open_across_calls():
+    calls = []
+
+    def fetch(url, timeout):
+        calls.append(url)
+        raise ConnectionError("refused")
+
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    list(fetch_within(_urls("A", "B"), fetch, deadline=5, retries=0, breaker=breaker))
+    assert len(calls) == 2
+    [result] = fetch_within(_urls("C"), fetch, deadline=5, retries=0, breaker=breaker)
+    assert isinstance(result.error, CircuitOpen)
+    assert len(calls) == 2
+
+
+def test_running_out_of_budget_is_no_verdict_on_the_host(hang):
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    breaker.record("https://example.test/A", False)
+    fetch = lambda url, timeout: hang.wait(30)
+    [result] = fetch_within(_urls("SLOW"), fetch, deadline=0.3, hedge_after=5, breaker=breaker)
+    assert isinstance(result.error, DeadlineExceeded)
+    assert breaker.allow("https://example.test/A")       # not counted as a failure...
+    breaker.record("https://example.test/A", False)
+    assert not breaker.allow("https://example.test/A")   # ...nor as a success that resets the count
+
+
+def test_trial_request_cut_by_the_deadline_frees_the_trial(hang):
+    breaker = CircuitBreaker(threshold=1, cooldown=0)
+    breaker.record("https://example.test/A", False)   # open; the next request is a trial
+    fetch = lambda url, timeout: hang.wait(30)
+    [result] = fetch_within(_urls("A"), fetch, deadline=0.3, hedge_after=5, breaker=breaker)
+    assert isinstance(result.error, DeadlineExceeded)
+    assert breaker.allow("https://example.test/A")
@@ -0,0 +1,59 @@
+# test_history_store.py — the local Parquet mirror: count reconciliation and concurrent saves
+
+import threading
+
+import pandas as pd
+
+import history_store
+import metrics
+from conftest import day_dicts, fake, save
+from history_store import _save, load_table
+
+
+def _counted(monkeypatch) -> list:
+    calls = []
+    count = history_store._count
+    monkeypatch.setattr(history_store, "_count", lambda client, table: calls.append(table) or count(client, table))
+    return calls
+
+
+def test_new_rows_skip_the_count(trading_days, tmp_path, monkeypatch):
+    client = fake(day_dicts(trading_days[:10]))
+    load_table(client, "history", tmp_path)
+    calls = _counted(monkeypatch)
+    save(client, day_dicts(trading_days[10:11]))
+    assert len(load_table(client, "history", tmp_path)) == len(client.tables["history"])
+    assert calls == []
+
+
+def test_removed_rows_are_caught_on_a_quiet_load(trading_days, tmp_path):
+    client = fake(day_dicts(trading_days[:10]))
+    load_table(client, "history", tmp_path)
+    client.table("history").delete().eq("date", trading_days[3].isoformat()).execute()
+    rebuilds = metrics.registry.counters.get("history_mirror_rebuild", 0)
+    df = load_table(client, "history", tmp_path)
+    assert metrics.registry.counters.get("history_mirror_rebuild", 0) == rebuilds + 1
+    assert pd.Timestamp(trading_days[3]) not in set(df["date"])
+    assert len(df) == len(client.tables["history"])
+
+
+def test_concurrent_saves_of_one_table(tmp_path):
+    path = tmp_path / "history.parquet"
+    frames = [pd.DataFrame({"n": range(i * 100)}) for i in range(1, 9)]
+    errors = []
+
+    def write(df):
+        try:
+            for _ in range(5):
+                _save(df, path)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(df,)) for df in frames]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert len(pd.read_parquet(path)) in {len(df) for df in frames}
+    assert [p.name for p in tmp_path.iterdir()] == ["history.parquet"]
@@ -0,0 +1,86 @@
+# test_period_aggregates.py — aggregates folded day by day must equal a rebuild from the source tables
+
+from datetime import date
+
+import pytest
+
+import metrics
+from benchmarks.fake_supabase import FakeSupabase
+from conftest import FUNDS, day_dicts, fake
+from period_aggregates import KEY, TABLE, period_end, period_start, rebuild_aggregates, update_aggregates
+from snapshot_writer import save_days
+
+
+def _rows(client) -> list:
+    rows = sorted(client.tables.get(TABLE, []), key=lambda r: tuple(r[k] for k in KEY))
+    return [{k: v for k, v in r.items() if k != "updated_at"} for r in rows]
+
+
+def _assert_matches_rebuild(client):
+    fresh = FakeSupabase({t: [dict(r) for r in client.tables[t]] for t in ("history", "portfolio_snapshots")})
+    days = sorted(date.fromisoformat(r["date"]) for r in fresh.tables["portfolio_snapshots"])
+    rebuild_aggregates(fresh, days[0], days[-1])
+    got, want = _rows(client), _rows(fresh)
+    assert [tuple(r[k] for k in KEY) for r in got] == [tuple(r[k] for k in KEY) for r in want]
+    for g, w in zip(got, want):
+        assert g == pytest.approx(w, rel=1e-9), g["symbol"]
+
+
+def _daily(client, days):
+    """What the daily job does after a scrape: save, then fold the saved days in."""
+    save_days(client, days)
+    return update_aggregates(client, days)
+
+
+def _live(days) -> FakeSupabase:
+    """A client holding `days` with its aggregates rebuilt over them."""
+    client = fake(days)
+    dates = sorted(date.fromisoformat(d["date"]) for d in days)
+    rebuild_aggregates(client, dates[0], dates[-1])
+    return client
+
+
+def test_incremental_matches_rebuild(history_edit):
+    client = _live(history_edit.initial)
+    for days in history_edit.steps:
+        _daily(client, days)
+    _assert_matches_rebuild(client)
+
+
+def test_consecutive_days_are_folded_not_recomputed(trading_days):
+    client = _live(day_dicts(trading_days[:40]))
+    recomputed = metrics.registry.counters.get("aggregates_recomputed", 0)
+    for day in trading_days[40:45]:
+        _daily(client, day_dicts([day]))
+    assert metrics.registry.counters.get("aggregates_recomputed", 0) == recomputed
+    _assert_matches_rebuild(client)
+
+
+def test_skipped_day_recomputes_the_period(trading_days):
+    client = _live(day_dicts(trading_days[:40]))
+    save_days(client, day_dicts(trading_days[40:41]))   # saved, but the update failed
+    recomputed = metrics.registry.counters.get("aggregates_recomputed", 0)
+    _daily(client, day_dicts(trading_days[41:42]))
+    assert metrics.registry.counters.get("aggregates_recomputed", 0) > recomputed
+    _assert_matches_rebuild(client)
+
+
+def test_first_save_of_a_new_fund(trading_days):
+    client = _live(day_dicts(trading_days[:40], funds=FUNDS[:1]))
+    for day in trading_days[40:43]:
+        _daily(client, day_dicts([day], funds=FUNDS))
+    _assert_matches_rebuild(client)
+
+
+def test_nothing_to_fold():
+    assert update_aggregates(FakeSupabase(), []) == 0
+
+
+@pytest.mark.parametrize("day, period, start, end", [
+    (date(2024, 2, 29), "month", date(2024, 2, 1), date(2024, 2, 29)),
+    (date(2024, 5, 15), "quarter", date(2024, 4, 1), date(2024, 6, 30)),
+    (date(2023, 12, 31), "quarter", date(2023, 10, 1), date(2023, 12, 31)),
+    (date(2024, 7, 1), "year", date(2024, 1, 1), date(2024, 12, 31)),
+])
+def test_period_bounds(day, period, start, end):
+    assert (period_start(day, period), period_end(day, period)) == (start, end)
@@ -0,0 +1,73 @@
+# test_quote_poller.py — live snapshots: stale-quote cutoff and fresh coverage per fund
+
+import time
+from datetime import date, datetime
+
+import pytest
+
+import quote_cache
+from nse_calendar import IST, session_bounds
+from quote_cache import QuoteCache
+from quote_extract import Quote
+from quote_poller import QuotePoller, session_open
+
+HOLDINGS = [("Alpha Fund", "FRESH", "https://example.test/fresh", 60.0),
+            ("Alpha Fund", "CACHED", "https://example.test/cached", 40.0),
+            ("Beta Fund", "FRESH", "https://example.test/fresh", 100.0)]
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = QuoteCache(str(tmp_path / "quotes.db"))
+    monkeypatch.setattr(quote_cache, "_default", cache)
+    return cache
+
+
+def _fetch(url, timeout):
+    if url.endswith("cached"):
+        raise ValueError("no quote on the page")
+    return Quote(100.0, 99.0, 1.0)
+
+
+def _cache_quote(cache, url, change_pct, fetched_at):
+    cache.put(url, None, None, Quote(None, None, change_pct))
+    cache._conn().execute("update quotes set fetched_at = ? where url = ?", (fetched_at, url))
+
+
+def _poll(cache):
+    return QuotePoller(lambda: HOLDINGS, interval=2.0, fetch=_fetch, hedge=_fetch).poll()
+
+
+def test_quote_from_an_earlier_session_is_left_out(cache):
+    _cache_quote(cache, HOLDINGS[1][2], -5.0, session_open(time.time()) - 60)
+    snap = _poll(cache)
+    alpha = snap.results["Alpha Fund"]
+    assert alpha.symbols.tolist() == ["FRESH"]
+    assert alpha.total == pytest.approx(1.0)
+    assert "CACHED" in snap.errors and not snap.stale
+    assert snap.coverage["Alpha Fund"] == pytest.approx(0.6)
+
+
+def test_quote_from_this_session_is_shown_but_not_counted_as_priced(cache):
+    _cache_quote(cache, HOLDINGS[1][2], -5.0, time.time())
+    snap = _poll(cache)
+    alpha = snap.results["Alpha Fund"]
+    assert alpha.symbols.tolist() == ["FRESH", "CACHED"]
+    assert alpha.total == pytest.approx(0.6 * 1.0 + 0.4 * -5.0)
+    assert snap.stale == {"CACHED"}
+    assert dict(snap.coverage) == pytest.approx({"Alpha Fund": 0.6, "Beta Fund": 1.0})
+
+
+def _at(day: date, hh: int, mm: int) -> float:
+    return datetime(day.year, day.month, day.day, hh, mm, tzinfo=IST).timestamp()
+
+
+@pytest.mark.parametrize("now, day", [
+    (_at(date(2024, 3, 14), 11, 0), date(2024, 3, 14)),    # in session
+    (_at(date(2024, 3, 14), 17, 0), date(2024, 3, 14)),    # after the close
+    (_at(date(2024, 3, 14), 8, 0), date(2024, 3, 13)),     # before the open
+    (_at(date(2024, 3, 16), 11, 0), date(2024, 3, 15)),    # Saturday
+    (_at(date(2024, 3, 25), 11, 0), date(2024, 3, 22)),    # Holi
+])
+def test_session_open(now, day):
+    assert session_open(now) == session_bounds(day)[0]
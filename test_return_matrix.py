@@ -0,0 +1,70 @@
+# test_return_matrix.py — matrices appended day by day must equal ones built from scratch
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from conftest import FUNDS, day_dicts, fake, save
+from return_matrix import update_matrix
+
+
+def _frames(m) -> tuple:
+    as_frame = lambda v: pd.DataFrame(np.asarray(v), index=m.dates, columns=m.symbols.tolist()).sort_index(axis=1)
+    return as_frame(m.returns), as_frame(m.weights)
+
+
+def _update(client, frames, cache, funds=FUNDS):
+    _, history, _ = frames(client)
+    return {fund: update_matrix(history, fund, cache) for fund in funds}
+
+
+def _assert_matches_rebuild(got, client, frames, tmp_path, funds=FUNDS):
+    want = _update(client, frames, tmp_path / "rebuild", funds)
+    for fund in funds:
+        for g, w in zip(_frames(got[fund]), _frames(want[fund])):
+            pd.testing.assert_frame_equal(g, w)
+
+
+def test_incremental_matches_rebuild(history_edit, frames, tmp_path):
+    client = fake(history_edit.initial)
+    _update(client, frames, tmp_path / "a")
+    for days in history_edit.steps:
+        save(client, days)
+        got = _update(client, frames, tmp_path / "a")
+    _assert_matches_rebuild(got, client, frames, tmp_path)
+
+
+def test_removed_last_day(trading_days, frames, tmp_path):
+    client = fake(day_dicts(trading_days[:20]))
+    _update(client, frames, tmp_path / "a")
+    client.table("history").delete().eq("date", trading_days[19].isoformat()).execute()
+    got = _update(client, frames, tmp_path / "a")
+    assert got[FUNDS[0]].dates[-1] == np.datetime64(trading_days[18])
+    _assert_matches_rebuild(got, client, frames, tmp_path)
+
+
+def test_older_allocation_change_is_picked_up(trading_days, frames, tmp_path):
+    client = fake(day_dicts(trading_days[:20]))
+    _update(client, frames, tmp_path / "a")
+    day = trading_days[5].isoformat()
+    row = next(r for r in client.tables["history"] if r["date"] == day and r["fund"] == FUNDS[0])
+    client.table("history").upsert({**row, "allocation": row["allocation"] * 3},   # same returns, new weights
+                                    on_conflict="date,fund,symbol").execute()
+    got = _update(client, frames, tmp_path / "a")
+    _assert_matches_rebuild(got, client, frames, tmp_path)
+
+
+def _as_fund(days, fund) -> list:
+    return [{**d, "fund": fund, "rows": [{**r, "fund": fund} for r in d["rows"]]} for d in days]
+
+
+def test_funds_with_similar_names_keep_separate_matrices(trading_days, frames, tmp_path):
+    names = ("Alpha/Fund", "Alpha Fund")   # the same once punctuation is stripped
+    client = fake(_as_fund(day_dicts(trading_days[:10], funds=FUNDS[:1]), names[0])
+                  + _as_fund(day_dicts(trading_days[:12], seed=1, funds=FUNDS[:1]), names[1]))
+    got = _update(client, frames, tmp_path / "a", names)
+    assert (len(got[names[0]]), len(got[names[1]])) == (10, 12)
+    rebuilds = metrics.registry.counters.get("matrix_rebuild", 0)
+    _update(client, frames, tmp_path / "a", names)
+    assert metrics.registry.counters.get("matrix_rebuild", 0) == rebuilds
+    _assert_matches_rebuild(got, client, frames, tmp_path, names)
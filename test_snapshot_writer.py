@@ -0,0 +1,48 @@
+# test_snapshot_writer.py — save_days through the RPC and through the batched-upsert fallback
+
+import pytest
+
+import snapshot_writer
+from benchmarks.fake_supabase import FakeSupabase
+from conftest import FUNDS, make_day
+from snapshot_writer import save_days
+
+
+@pytest.fixture(params=[True, False], ids=["rpc", "fallback"])
+def client(request, monkeypatch):
+    monkeypatch.setattr(snapshot_writer, "_rpc_available", True)
+    return FakeSupabase(with_rpc=request.param)
+
+
+def _held(client, day, fund) -> set:
+    return {r["symbol"] for r in client.tables["history"] if r["date"] == day["date"] and r["fund"] == fund}
+
+
+def _without(day: dict, symbols) -> dict:
+    return {**day, "rows": [r for r in day["rows"] if r["symbol"] not in symbols]}
+
+
+def test_resave_drops_symbols_no_longer_held(client, trading_days):
+    first, second = trading_days[:2]
+    days = [make_day(d, f) for d in (first, second) for f in FUNDS]
+    save_days(client, days)
+    sold = [r["symbol"] for r in days[0]["rows"][:2]]
+    save_days(client, [_without(days[0], sold)])
+    assert _held(client, days[0], FUNDS[0]) == {r["symbol"] for r in days[0]["rows"]} - set(sold)
+    for d in days[1:]:   # the other fund and the other day are untouched
+        assert _held(client, d, d["fund"]) == {r["symbol"] for r in d["rows"]}
+
+
+def test_saving_twice_changes_nothing(client, trading_days):
+    days = [make_day(trading_days[0], f) for f in FUNDS]
+    save_days(client, days)
+    before = {t: sorted(map(sorted, (r.items() for r in rows))) for t, rows in client.tables.items()}
+    save_days(client, days)
+    assert {t: sorted(map(sorted, (r.items() for r in rows))) for t, rows in client.tables.items()} == before
+
+
+def test_a_fund_with_no_holdings_left_is_cleared(client, trading_days):
+    day = make_day(trading_days[0], FUNDS[0])
+    save_days(client, [day])
+    save_days(client, [_without(day, {r["symbol"] for r in day["rows"]})])
+    assert _held(client, day, FUNDS[0]) == set()
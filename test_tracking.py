@@ -0,0 +1,47 @@
+# test_tracking.py — tracking series refreshed from the cache must equal a full recompute
+
+import pandas as pd
+
+from conftest import FUNDS, day_dicts, fake, save
+from tracking import align, update_tracking
+
+
+def _update(client, frames, cache):
+    snaps, _, mf_returns = frames(client)
+    return update_tracking(snaps, mf_returns, cache)
+
+
+def test_incremental_matches_rebuild(history_edit, frames, tmp_path):
+    client = fake(history_edit.initial)
+    _update(client, frames, tmp_path / "a")
+    for days in history_edit.steps:
+        save(client, days)
+        got = _update(client, frames, tmp_path / "a")
+    assert got["te_60"].notna().any()
+    pd.testing.assert_frame_equal(got, _update(client, frames, tmp_path / "rebuild"), rtol=1e-9)
+
+
+def test_removed_nav_rows_recompute_the_fund(trading_days, frames, tmp_path):
+    client = fake(day_dicts(trading_days[:80]))
+    _update(client, frames, tmp_path / "a")
+    client.table("mf_returns").delete().eq("fund", FUNDS[0]).gte("date", trading_days[70].isoformat()).execute()
+    got = _update(client, frames, tmp_path / "a")
+    assert got[got["fund"] == FUNDS[0]]["date"].max() == pd.Timestamp(trading_days[69])
+    pd.testing.assert_frame_equal(got, _update(client, frames, tmp_path / "rebuild"), rtol=1e-9)
+
+
+def test_only_days_with_both_returns_are_aligned(trading_days, frames):
+    client = fake(day_dicts(trading_days[:10]))
+    client.table("mf_returns").delete().eq("date", trading_days[4].isoformat()).execute()
+    client.table("mf_returns").delete().eq("fund", FUNDS[1]).execute()
+    snaps, _, mf_returns = frames(client)
+    aligned = align(snaps, mf_returns)
+    assert set(aligned["fund"]) == {FUNDS[0]}
+    assert pd.Timestamp(trading_days[4]) not in set(aligned["date"])
+    assert len(aligned) == 9
+
+
+def test_no_nav_data(trading_days, frames, tmp_path):
+    client = fake(day_dicts(trading_days[:10]))
+    client.tables["mf_returns"].clear()
+    assert _update(client, frames, tmp_path / "a").empty
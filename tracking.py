@@ -0,0 +1,104 @@
+# tracking.py — how closely the holdings-based estimate tracks the fund's actual NAV
+#
+# portfolio_snapshots (our estimate) and mf_returns (the fund's NAV move) are
+# aligned on the trading days both have. From that come the daily and cumulative
+# tracking difference, annualised rolling tracking error and rolling
+# correlation, all as vectorized pandas series. The result is cached in the
+# history cache directory. A refresh recomputes only from the first aligned day
+# that changed, plus enough earlier rows to fill the rolling windows.
+
+import math
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from history_store import CACHE_DIR
+
+WINDOWS = (20, 60)
+TRADING_DAYS = 252
+INPUTS = ["est", "actual"]
+
+_lock = threading.Lock()
+
+
+def align(snapshots: pd.DataFrame, mf_returns: pd.DataFrame) -> pd.DataFrame:
+    """date, fund, est, actual (% each) for every day with both a snapshot and a NAV return."""
+    if snapshots.empty or mf_returns.empty or "mf_return" not in mf_returns:
+        return pd.DataFrame(columns=["date", "fund"] + INPUTS)
+    est = snapshots[["date", "fund", "portfolio_return"]].rename(columns={"portfolio_return": "est"})
+    actual = mf_returns[["date", "fund", "mf_return"]].rename(columns={"mf_return": "actual"})
+    out = est.merge(actual, on=["date", "fund"], how="inner").dropna(subset=INPUTS)
+    out[INPUTS] = out[INPUTS].astype(float)
+    return out.sort_values(["fund", "date"]).reset_index(drop=True)
+
+
+def tracking_series(aligned: pd.DataFrame, growth=(1.0, 1.0)) -> pd.DataFrame:
+    """Tracking columns for one fund's aligned rows.
+
+    growth is the compounded (estimate, actual) value of 1 before the first
+    row, so a recomputed tail continues the cached cumulative series.
+    """
+    out = aligned.copy()
+    est, actual = out["est"], out["actual"]
+    out["diff"] = est - actual
+    g_est = growth[0] * (1 + est / 100).cumprod()
+    g_act = growth[1] * (1 + actual / 100).cumprod()
+    out["cum_est"] = (g_est - 1) * 100
+    out["cum_actual"] = (g_act - 1) * 100
+    out["cum_diff"] = out["cum_est"] - out["cum_actual"]
+    for w in WINDOWS:
+        out[f"te_{w}"] = out["diff"].rolling(w).std() * math.sqrt(TRADING_DAYS)
+        out[f"corr_{w}"] = est.rolling(w).corr(actual)
+    return out
+
+
+def _first_change(cached: pd.DataFrame, fresh: pd.DataFrame) -> int:
+    """Index of the first row where fresh differs from cached inputs (len(fresh) if none)."""
+    n = min(len(cached), len(fresh))
+    same = (cached["date"].values[:n] == fresh["date"].values[:n]) & np.isclose(
+        cached[INPUTS].values[:n], fresh[INPUTS].values[:n]).all(axis=1)
+    bad = np.flatnonzero(~same)
+    if len(bad):
+        return int(bad[0])
+    return n if len(cached) <= len(fresh) else 0   # rows disappeared: recompute everything
+
+
+def _update_fund(cached: pd.DataFrame, fresh: pd.DataFrame):
+    """Tracking rows for fresh, reusing cached ones up to the first change; None when unchanged."""
+    i0 = _first_change(cached, fresh)
+    if i0 == len(fresh) == len(cached):
+        return None
+    if i0 == 0:
+        return tracking_series(fresh)
+    start = max(0, i0 - (max(WINDOWS) - 1))   # rows the rolling windows at i0 look back over
+    prev = cached.iloc[start - 1] if start else None
+    growth = (1 + prev["cum_est"] / 100, 1 + prev["cum_actual"] / 100) if prev is not None else (1.0, 1.0)
+    tail = tracking_series(fresh.iloc[start:], growth).iloc[i0 - start:]
+    return pd.concat([cached.iloc[:i0], tail], ignore_index=True)
+
+
+@metrics.timed("tracking")
+def update_tracking(snapshots: pd.DataFrame, mf_returns: pd.DataFrame, cache_dir: str = CACHE_DIR) -> pd.DataFrame:
+    """Tracking series for every fund with NAV data, refreshed incrementally from the cache."""
+    path = Path(cache_dir) / "tracking.parquet"
+    aligned = align(snapshots, mf_returns)
+    with _lock:
+        cached = pd.read_parquet(path) if path.exists() else pd.DataFrame(columns=["date", "fund"] + INPUTS)
+        parts, changed = [], False
+        for fund, fresh in aligned.groupby("fund", sort=True):
+            old = cached[cached["fund"] == fund].reset_index(drop=True)
+            new = _update_fund(old, fresh.reset_index(drop=True))
+            changed |= new is not None
+            parts.append(old if new is None else new)
+        changed |= set(cached["fund"]) != set(aligned["fund"])
+        result = pd.concat(parts, ignore_index=True) if parts else tracking_series(aligned)
+        if changed:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            result.to_parquet(tmp, index=False)
+            os.replace(tmp, path)
+        return result